@@ -1,25 +1,95 @@
 from django.contrib import admin
-from .models import Actor, Director, CastCrew, Movie, User, WatchHistory, WrappedSummary
+from django.db import connection
+from django.db.models import Q
+from . import catalog, fulltext, jobs
+from .changelists import EstimatedCountPaginator, indexed_dates
+from .models import (
+    Actor, CastCrew, Director, Movie, MovieActor, MovieDirector, SummaryJob, User, WatchHistory, WrappedSummary,
+)
+from .search import search_movies
+
+class CatalogAdmin(admin.ModelAdmin):
+    """Drops edited or deleted rows from the catalog cache."""
+
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        catalog.invalidate(self.model, [obj.pk])
+
+    def delete_model(self, request, obj):
+        pk = obj.pk
+        super().delete_model(request, obj)
+        catalog.invalidate(self.model, [pk])
+
+    def delete_queryset(self, request, queryset):
+        pks = list(queryset.values_list('pk', flat=True))
+        super().delete_queryset(request, queryset)
+        catalog.invalidate(self.model, pks)
+
+class FullTextSearchAdmin(admin.ModelAdmin):
+    """Also matches the search term against a generated tsvector column on Postgres."""
+
+    search_vector = None
+
+    def get_search_results(self, request, queryset, search_term):
+        results, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        if search_term.strip() and connection.vendor == 'postgresql':
+            results |= queryset.filter(fulltext.matches(self.search_vector, search_term))
+        return results, may_have_duplicates
+
+class IdSearchAdmin(admin.ModelAdmin):
+    """Matches each search term exactly against the integer columns in search_fields.
+
+    The stock '=' search compares such columns as text, which their indexes
+    cannot serve. Terms that are not ids match nothing.
+    """
+
+    def get_search_results(self, request, queryset, search_term):
+        for term in search_term.split():
+            if not term.isdigit() or len(term) > 18:
+                return queryset.none(), False
+            condition = Q()
+            for field in self.search_fields:
+                condition |= Q(**{field: int(term)})
+            queryset = queryset.filter(condition)
+        return queryset, False
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Changelist for tables with millions of rows: estimated counts and an indexed date hierarchy."""
+
+    paginator = EstimatedCountPaginator
+    # The "(N total)" link would run an exact COUNT(*) on every page
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return indexed_dates(super().get_queryset(request))
 
 @admin.register(Actor)
-class ActorAdmin(admin.ModelAdmin):
+class ActorAdmin(CatalogAdmin):
     list_display = ('actor_id', 'name', 'birth_year')
     search_fields = ('name',)
     list_filter = ('birth_year',)
 
 @admin.register(Director)
-class DirectorAdmin(admin.ModelAdmin):
+class DirectorAdmin(CatalogAdmin):
     list_display = ('director_id', 'name', 'birth_year')
     search_fields = ('name',)
     list_filter = ('birth_year',)
 
-@admin.register(CastCrew)
-class CastCrewAdmin(admin.ModelAdmin):
-    list_display = ('movie_cast_id', 'movie_id', 'actor_id', 'director_id')
-    search_fields = ('movie_id', 'actor_id', 'director_id')
+@admin.register(MovieActor)
+class MovieActorAdmin(IdSearchAdmin):
+    list_display = ('id', 'movie_id', 'actor_id')
+    search_fields = ('movie_id', 'actor_id')
+    raw_id_fields = ('movie', 'actor')
+
+@admin.register(MovieDirector)
+class MovieDirectorAdmin(IdSearchAdmin):
+    list_display = ('id', 'movie_id', 'director_id')
+    search_fields = ('movie_id', 'director_id')
+    raw_id_fields = ('movie', 'director')
 
 @admin.register(Movie)
-class MovieAdmin(admin.ModelAdmin):
+class MovieAdmin(FullTextSearchAdmin, CatalogAdmin):
+    search_vector = 'search_vector'
     list_display = ('movie_id', 'title', 'release_year', 'runtime')
     search_fields = ('title',)
     list_filter = ('release_year',)
@@ -32,13 +102,77 @@ class UserAdmin(admin.ModelAdmin):
 
 
 @admin.register(WatchHistory)
-class WatchHistoryAdmin(admin.ModelAdmin):
-    list_display = ('watched_id', 'user_id', 'movie_id', 'watch_date', 'rating')
-    search_fields = ('user_id', 'movie_id')
+class WatchHistoryAdmin(LargeTableAdmin, FullTextSearchAdmin):
+    search_vector = 'review_vector'
+    list_display = ('watched_id', 'user', 'movie', 'watch_date', 'rating')
+    list_select_related = ('user', 'movie')
+    # Only columns an index can return in order
+    sortable_by = ('watched_id', 'user', 'watch_date')
+    ordering = ('-watched_id',)
+    # Exact user ids only, compared as they are stored: a substring or
+    # case-insensitive ('=') match cannot use an index
+    search_fields = ('user__user_id__exact',)
     list_filter = ('watch_date',)
+    date_hierarchy = 'watch_date'
+    raw_id_fields = ('user', 'movie')
+
+    def get_search_results(self, request, queryset, search_term):
+        results, may_have_duplicates = super().get_search_results(request, queryset, search_term)
+        # Entries for the movies the title picker offers, found by movie_id;
+        # a join on movies.title would scan every entry
+        movie_ids = [movie['id'] for movie in search_movies(search_term)]
+        if movie_ids:
+            results |= queryset.filter(movie_id__in=movie_ids)
+        return results, may_have_duplicates
+
+@admin.register(CastCrew)
+class CastCrewAdmin(LargeTableAdmin):
+    """Read-only; credits are edited through MovieActor and MovieDirector."""
+
+    list_display = ('movie_cast_id', 'movie', 'actor', 'director')
+    list_select_related = ('movie', 'actor', 'director')
+    sortable_by = ()
+    ordering = ('movie', 'actor', 'director')
+    raw_id_fields = ('movie', 'actor', 'director')
+
+    def get_object(self, request, object_id, from_field=None):
+        # movie_cast_id is computed by the view; its high 32 bits are the
+        # MovieActor id and its low ones the MovieDirector id (0 for a movie
+        # credited on one side only), whose movie narrows the lookup to
+        # indexed credits
+        try:
+            object_id = int(object_id)
+            if object_id >> 32:
+                credit = MovieActor.objects.filter(pk=object_id >> 32)
+            else:
+                credit = MovieDirector.objects.filter(pk=object_id)
+            movie_id = credit.values_list('movie_id', flat=True).get()
+            return self.get_queryset(request).get(movie_id=movie_id, pk=object_id)
+        except (ValueError, MovieActor.DoesNotExist, MovieDirector.DoesNotExist, CastCrew.DoesNotExist):
+            return None
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
 
 @admin.register(WrappedSummary)
 class WrappedSummaryAdmin(admin.ModelAdmin):
     list_display = ('summary_id', 'user_id', 'avg_rating', 'highest_rated_movie', 'top_actor', 'total_movies_watched')
     search_fields = ('user_id', 'top_actor', 'highest_rated_movie')
-    list_filter = ('top_actor',)
\ No newline at end of file
+    list_filter = ('top_actor',)
+
+@admin.register(SummaryJob)
+class SummaryJobAdmin(admin.ModelAdmin):
+    list_display = ('user_id', 'requested_at', 'claimed_at', 'attempts')
+    search_fields = ('user_id',)
+    readonly_fields = ('token', 'last_error')
+    actions = ['retry_jobs']
+
+    @admin.action(description="Retry selected jobs")
+    def retry_jobs(self, request, queryset):
+        self.message_user(request, f"Retrying {jobs.retry_failed_summary_jobs(queryset)} jobs.")
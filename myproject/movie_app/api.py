@@ -0,0 +1,155 @@
+"""Versioned JSON API (/api/v1/) for the mobile client.
+
+Responses carry strong ETags and answer If-None-Match with 304 Not Modified.
+ETags are derived from what the database holds, never from per-process
+state, so every worker agrees on them. Watch history ETags come from the
+user's history write counter (WrappedSummary.history_writes, one indexed
+lookup), which every write to their entries bumps in the same transaction,
+so a 304 is answered before the page is read. Movie details in the page come
+from the catalog, which is treated as read-only. Wrapped ETags are derived
+from the summary values themselves (one indexed lookup, or the year's
+monthly rollups), so they also follow queued recomputes and materialized
+view refreshes, and answer 304 before any serialization happens. Search
+ETags hash the (cached) results.
+
+Bodies are gzipped when the client accepts it. Brotli is not offered: it
+would need a third-party codec and middleware, where gzip_page ships with
+Django.
+"""
+import hashlib
+import json
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_safe
+
+from . import rollups
+from .history import ahistory_page, ahistory_writes
+from .search import search_movies
+from .summary import aget_wrapped_summary
+from .timing import query_budget
+
+
+def _etag(*parts):
+    digest = hashlib.md5(':'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+    return f'"{digest}"'
+
+
+def _not_modified(request, etag):
+    """Return a 304 response if the client already has this ETag, else None."""
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        _finish(response, etag)
+    return response
+
+
+def _finish(response, etag):
+    response.headers['ETag'] = etag
+    # Per-user data: clients may keep it, but must revalidate every time
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ('Cookie',))
+    return response
+
+
+def api_login_required(view):
+    """Like login_required, but answers 401 JSON instead of redirecting."""
+    @wraps(view)
+    async def inner(request, *args, **kwargs):
+        user = await request.auser()
+        if not user.is_authenticated:
+            return JsonResponse({'error': 'Authentication required.'}, status=401)
+        request.user = user
+        return await view(request, *args, **kwargs)
+    return inner
+
+
+def _entry_json(entry):
+    movie = entry.movie
+    return {
+        'id': entry.watched_id,
+        'movie': {'id': movie.movie_id, 'title': movie.title, 'release_year': movie.release_year},
+        'watch_date': entry.watch_date.isoformat(),
+        'rating': entry.rating,
+        'review': entry.review,
+    }
+
+
+def _page_size(request):
+    try:
+        page_size = int(request.GET.get('page_size', settings.WATCH_HISTORY_PAGE_SIZE))
+    except ValueError:
+        page_size = settings.WATCH_HISTORY_PAGE_SIZE
+    return max(1, min(page_size, settings.API_MAX_PAGE_SIZE))
+
+
+@query_budget(5)
+@gzip_page
+@require_safe
+@api_login_required
+async def watch_history(request):
+    """One keyset page of the user's watch history, newest first"""
+    username = request.user.username
+    cursor = request.GET.get('cursor')
+    page_size = _page_size(request)
+    # Read before the page: a write landing in between changes the counter,
+    # so at worst the next request gets a fresh 200
+    writes = await ahistory_writes(username)
+    etag = _etag('history', username, writes, cursor, page_size)
+    response = _not_modified(request, etag)
+    if response is None:
+        entries, next_cursor = await ahistory_page(username, cursor, page_size)
+        response = JsonResponse({
+            'results': [_entry_json(entry) for entry in entries],
+            'next_cursor': next_cursor,
+        })
+    return _finish(response, etag)
+
+
+def _lifetime_summary(wrapped):
+    if wrapped is None or not wrapped.total_movies_watched:
+        return None
+    return {
+        'total_movies_watched': wrapped.total_movies_watched,
+        'avg_rating': float(wrapped.avg_rating) if wrapped.avg_rating is not None else None,
+        'highest_rated_movie': wrapped.highest_rated_movie,
+        'top_actor': wrapped.top_actor,
+    }
+
+
+@query_budget(10)
+@gzip_page
+@require_safe
+@api_login_required
+async def wrapped_summary(request):
+    """The user's Wrapped summary, lifetime or for one ?year=; null if empty"""
+    username = request.user.username
+    year = rollups.parse_year(request.GET.get('year'))
+    if year is not None:
+        # Added up from at most 12 monthly rollups
+        summary = await rollups.awindow_summary(username, *rollups.year_window(year))
+    else:
+        summary = _lifetime_summary(await aget_wrapped_summary(username))
+    etag = _etag('wrapped', username, year, *(summary or {}).values())
+    response = _not_modified(request, etag)
+    if response is None:
+        response = JsonResponse({'year': year, 'summary': summary})
+    return _finish(response, etag)
+
+
+@query_budget(4)
+@gzip_page
+@require_safe
+@api_login_required
+async def movie_search(request):
+    """Catalog search by title"""
+    results = await sync_to_async(search_movies)(request.GET.get('q', ''))
+    body = json.dumps({'results': results})
+    etag = _etag('search', body)
+    response = _not_modified(request, etag)
+    if response is None:
+        response = HttpResponse(body, content_type='application/json')
+    return _finish(response, etag)
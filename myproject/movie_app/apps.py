@@ -1,4 +1,6 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save, pre_save
 
 
 class MovieAppConfig(AppConfig):
@@ -6,25 +8,29 @@ class MovieAppConfig(AppConfig):
     name = 'movie_app'
     
     def ready(self):
-        """Reset PostgreSQL sequences on app startup to prevent duplicate key errors"""
-        from django.db import connection
-        
-        try:
-            cursor = connection.cursor()
-            
-            # Reset watch_history sequence
-            cursor.execute(
-                "SELECT setval('watch_history_watched_id_seq', "
-                "(SELECT MAX(watched_id) FROM watch_history) + 1)"
-            )
-            
-            # Reset wrapped_summary sequence
-            cursor.execute(
-                "SELECT setval('wrapped_summary_summary_id_seq', "
-                "(SELECT MAX(summary_id) FROM wrapped_summary) + 1)"
-            )
-            
-            cursor.close()
-        except Exception as e:
-            # Silently fail if sequences don't exist yet (fresh database)
-            pass
\ No newline at end of file
+        """Connect signal receivers; startup makes no database queries.
+
+        The first insert into each serial-keyed table in the process
+        catches that table's sequence up (`manage.py repair_sequences`
+        repairs them all), WatchHistory writes update the
+        owner's summaries and caches (movie_app.signals), deleted profiles
+        drop their cached existence flag (movie_app.identity), and every
+        connection reports its queries to the request timings
+        (movie_app.timing).
+        """
+        from .identity import forget_profile
+        from .models import User as CustomUser, WatchHistory
+        from .sequences import ensure_sequences, serial_columns
+        from .signals import watch_deleted, watch_saved, watch_saving
+        from .timing import install_query_recorder
+
+        connection_created.connect(install_query_recorder, dispatch_uid='install_query_recorder')
+
+        pre_save.connect(watch_saving, sender=WatchHistory, dispatch_uid='watch_history_saving')
+        post_save.connect(watch_saved, sender=WatchHistory, dispatch_uid='watch_history_saved')
+        post_delete.connect(watch_deleted, sender=WatchHistory, dispatch_uid='watch_history_deleted')
+        post_delete.connect(forget_profile, sender=CustomUser, dispatch_uid='forget_profile')
+
+        for model, _, _ in serial_columns():
+            if model._meta.pk.get_internal_type() != 'IntegerField':
+                pre_save.connect(ensure_sequences, sender=model, dispatch_uid=f'ensure_sequences_{model._meta.label}')
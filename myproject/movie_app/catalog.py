@@ -0,0 +1,82 @@
+"""Read-through cache for catalog rows (movies, actors, directors).
+
+Catalog rows are effectively read-only, so instead of joining them into every
+query they are looked up by primary key here: one get_many against the
+'catalog' cache for a whole page of ids, and one in_bulk query for whatever
+was missing. The backend is whatever CACHES['catalog'] configures, e.g. the
+in-process LRU (LocMemCache with MAX_ENTRIES), FileBasedCache, or a local
+Redis. Admin edits invalidate entries via invalidate(); with a per-process
+backend other processes only see the edit once their entry times out.
+"""
+from django.core.cache import caches
+
+from .models import Actor, Movie
+
+
+def _cache():
+    return caches['catalog']
+
+
+def _key(model, pk):
+    return f'movie_app:catalog:{model._meta.model_name}:{pk}'
+
+
+def get_many(model, pks):
+    """Return {pk: instance} for the given primary keys; unknown keys are left out."""
+    pks = set(pks)
+    if not pks:
+        return {}
+    keys = {_key(model, pk): pk for pk in pks}
+    found = {keys[key]: obj for key, obj in _cache().get_many(keys).items()}
+    missing = pks - found.keys()
+    if missing:
+        loaded = model.objects.in_bulk(missing)
+        _cache().set_many({_key(model, pk): obj for pk, obj in loaded.items()})
+        found.update(loaded)
+    return found
+
+
+async def aget_many(model, pks):
+    """Async version of get_many()."""
+    pks = set(pks)
+    if not pks:
+        return {}
+    keys = {_key(model, pk): pk for pk in pks}
+    found = {keys[key]: obj for key, obj in (await _cache().aget_many(keys)).items()}
+    missing = pks - found.keys()
+    if missing:
+        loaded = await model.objects.ain_bulk(missing)
+        await _cache().aset_many({_key(model, pk): obj for pk, obj in loaded.items()})
+        found.update(loaded)
+    return found
+
+
+def get_movie(pk):
+    return get_many(Movie, [pk]).get(pk)
+
+
+def get_actor(pk):
+    return get_many(Actor, [pk]).get(pk)
+
+
+def _attach(entries, movies):
+    for entry in entries:
+        movie = movies.get(entry.movie_id)
+        if movie is not None:
+            entry.movie = movie
+    return entries
+
+
+def attach_movies(entries):
+    """Fill entry.movie on WatchHistory rows from the catalog cache."""
+    return _attach(entries, get_many(Movie, (entry.movie_id for entry in entries)))
+
+
+async def aattach_movies(entries):
+    """Async version of attach_movies()."""
+    return _attach(entries, await aget_many(Movie, (entry.movie_id for entry in entries)))
+
+
+def invalidate(model, pks):
+    """Drop catalog entries, e.g. after an admin edit or delete."""
+    _cache().delete_many([_key(model, pk) for pk in pks])
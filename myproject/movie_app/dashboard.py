@@ -0,0 +1,77 @@
+"""Cached data layer for the dashboard page.
+
+The dashboard needs the user's row, their watch count and average rating, and
+their five most recent entries. That takes one query for the user, one
+aggregate for the stats, one slice for the recent entries, whose movies come
+from the catalog cache, and one index scan for the precomputed
+recommendations, all four issued together. The result is cached per user, and
+writes to the user's watch history invalidate it through
+invalidate_dashboard(), which reaches other processes only when the default
+cache is shared between them.
+"""
+import asyncio
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Avg, Count
+
+from .catalog import aattach_movies
+from .models import User as CustomUser, WatchHistory
+from .recommendations import arecommended_movies
+
+
+RECENT_ENTRIES = 5
+RECOMMENDED_MOVIES = 5
+
+
+def _cache_key(username):
+    return f'movie_app:dashboard:{username}'
+
+
+def _recent_entries(username):
+    return (
+        WatchHistory.objects
+        .filter(user_id=username)
+        .order_by('-watch_date', '-watched_id')[:RECENT_ENTRIES]
+    )
+
+
+def _dashboard_context(custom_user, watch_count, avg_rating, recent, recommended):
+    return {
+        'custom_user': custom_user,
+        'watch_history': recent if watch_count else [],
+        'watch_count': watch_count or 0,
+        'avg_rating': round(avg_rating, 2) if avg_rating else 0,
+        'recommended': recommended,
+    }
+
+
+async def _aload_dashboard_data(username):
+    async def recent():
+        return await aattach_movies([entry async for entry in _recent_entries(username)])
+
+    custom_user, stats, entries, recommended = await asyncio.gather(
+        CustomUser.objects.filter(user_id=username).afirst(),
+        WatchHistory.objects.filter(user_id=username).aaggregate(
+            watch_count=Count('watched_id'), avg_rating=Avg('rating'),
+        ),
+        recent(),
+        arecommended_movies(username, RECOMMENDED_MOVIES),
+    )
+    return _dashboard_context(custom_user, stats['watch_count'], stats['avg_rating'], entries, recommended)
+
+
+async def aget_dashboard_data(username):
+    """Return the dashboard template context for a user, from cache if possible."""
+    key = _cache_key(username)
+    data = await cache.aget(key)
+    if data is None:
+        data = await _aload_dashboard_data(username)
+        await cache.aset(key, data, getattr(settings, 'DASHBOARD_CACHE_TIMEOUT', 300))
+    return data
+
+
+def invalidate_dashboard(username):
+    """Drop a user's cached dashboard once the current transaction commits."""
+    transaction.on_commit(lambda: cache.delete(_cache_key(username)))
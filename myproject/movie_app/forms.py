@@ -1,6 +1,11 @@
 from django import forms
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.urls import reverse
+from .bulk import column_max_length
+from .catalog import get_many, get_movie
 from .models import WatchHistory, Movie
+from .search import MIN_QUERY_LENGTH
 
 
 class UserRegistrationForm(forms.ModelForm):
@@ -12,6 +17,14 @@ class UserRegistrationForm(forms.ModelForm):
         model = User
         fields = ['username', 'email', 'first_name', 'last_name', 'password']
     
+    def clean_username(self):
+        username = self.cleaned_data['username']
+        # The username is also the profile's key, which the legacy users table keeps short
+        max_length = column_max_length('users', 'user_id')
+        if max_length and len(username) > max_length:
+            raise forms.ValidationError(f"Usernames can be at most {max_length} characters long.")
+        return username
+    
     def clean(self):
         cleaned_data = super().clean()
         password = cleaned_data.get('password')
@@ -28,7 +41,66 @@ class UserLoginForm(forms.Form):
     password = forms.CharField(widget=forms.PasswordInput)
 
 
-class AddMovieForm(forms.ModelForm):
+class MovieSearchWidget(forms.Widget):
+    """Typeahead picker that posts a single movie_id.
+
+    Unlike a Select it never iterates the field's choices, so rendering does
+    not load the catalog. Only the currently selected movie is looked up to
+    show its label.
+    """
+    template_name = 'widgets/movie_search.html'
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        label = ''
+        if value not in (None, ''):
+            try:
+                movie = get_movie(int(value))
+            except (TypeError, ValueError):
+                movie = None
+            label = str(movie) if movie else ''
+        context['widget'].update({
+            'search_url': reverse('movie_search'),
+            'selected_label': label,
+            'min_length': MIN_QUERY_LENGTH,
+        })
+        return context
+
+
+class CatalogMovieField(forms.ModelChoiceField):
+    """ModelChoiceField that resolves the submitted id through the catalog cache."""
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            movie = get_movie(int(value))
+        except (TypeError, ValueError):
+            movie = None
+        if movie is None:
+            raise forms.ValidationError(
+                self.error_messages['invalid_choice'],
+                code='invalid_choice',
+                params={'value': value},
+            )
+        return movie
+
+
+class WatchEntryForm(forms.Form):
+    """The fields of one watch history entry, without a model instance.
+
+    The batch formset uses it directly, which skips the model-level foreign
+    key check that would cost one query per entry.
+    """
+    # Only the submitted id is looked up, usually from the catalog cache, so
+    # validation never scans or sorts the catalog.
+    movie = CatalogMovieField(
+        queryset=Movie.objects.all(),
+        widget=MovieSearchWidget,
+        label="Select Movie",
+        help_text="Search for a movie in the database",
+        empty_label=None,
+    )
     watch_date = forms.DateField(widget=forms.DateInput(attrs={'type': 'date'}))
     rating = forms.FloatField(min_value=0.1, max_value=10, label="Your Rating (0.1-10)")
     review = forms.CharField(
@@ -36,17 +108,36 @@ class AddMovieForm(forms.ModelForm):
         label="Review",
         required=False
     )
-    
+
+
+class AddMovieForm(WatchEntryForm, forms.ModelForm):
     class Meta:
         model = WatchHistory
         fields = ['movie', 'watch_date', 'rating', 'review']
-    
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        # Dynamically populate movie queryset at form initialization
-        self.fields['movie'] = forms.ModelChoiceField(
-            queryset=Movie.objects.all().order_by('title'),
-            label="Select Movie",
-            help_text="Choose a movie from the database",
-            empty_label="-- Select a Movie --"
-        )
\ No newline at end of file
+
+
+class BaseAddMoviesFormSet(forms.BaseFormSet):
+    def full_clean(self):
+        # Load every submitted movie into the catalog cache with one query,
+        # so each form validates its movie from the cache
+        if self.is_bound:
+            movie_ids = set()
+            for form in self.forms:
+                try:
+                    movie_ids.add(int(form.data.get(form.add_prefix('movie'))))
+                except (TypeError, ValueError):
+                    pass
+            get_many(Movie, movie_ids)
+        super().full_clean()
+
+
+AddMoviesFormSet = forms.formset_factory(
+    WatchEntryForm,
+    formset=BaseAddMoviesFormSet,
+    extra=9,
+    min_num=1,
+    validate_min=True,
+    max_num=settings.WATCH_BATCH_MAX_ENTRIES,
+    validate_max=True,
+    absolute_max=settings.WATCH_BATCH_MAX_ENTRIES,
+)
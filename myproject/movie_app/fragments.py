@@ -0,0 +1,57 @@
+"""Per-user version counters for cached template fragments.
+
+Fragments such as the watch history rows are cached with the {% cache %}
+tag under a key that includes the user's history version. Any write to the
+user's WatchHistory bumps the version, so stale fragments are never read
+again and simply age out of the cache. If the counter itself is evicted it
+restarts from the current time, which cannot collide with an older version.
+
+The counters live in the default cache, which must be shared by every
+process that serves or writes a user's history (see CACHES in settings):
+a bump in one process's LocMemCache is invisible to the others.
+"""
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+
+def _version_key(username):
+    return f'movie_app:history_version:{username}'
+
+
+def _new_version():
+    return time.time_ns() // 1000
+
+
+def history_version(username):
+    """Return the user's current history version, creating it if needed."""
+    key = _version_key(username)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), None)
+        version = cache.get(key)
+    return version
+
+
+async def ahistory_version(username):
+    """Async version of history_version()."""
+    key = _version_key(username)
+    version = await cache.aget(key)
+    if version is None:
+        await cache.aadd(key, _new_version(), None)
+        version = await cache.aget(key)
+    return version
+
+
+def _bump(username):
+    try:
+        cache.incr(_version_key(username))
+    except ValueError:
+        cache.set(_version_key(username), _new_version(), None)
+
+
+def bump_history_version(username):
+    """Invalidate the user's cached fragments once the current transaction commits."""
+    transaction.on_commit(lambda: _bump(username))
+
@@ -0,0 +1,163 @@
+"""Ranked full-text search over movie plots and the user's own reviews.
+
+On Postgres, migration 0017 keeps stored tsvector columns with GIN indexes
+on movies (title weighted above plot) and watch_history (review). The
+columns are not model fields, so queries refer to them through Document.
+A search matches with websearch_to_tsquery, so quoted phrases, OR and
+-exclusions work. Only the first FULLTEXT_MAX_CANDIDATES matches are ranked,
+which keeps latency flat for very common terms. Snippets come from
+ts_headline, for the returned rows only. Other backends fall back to
+unranked substring matches.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Q
+from django.db.models import Field
+from django.db.models.expressions import Col, Expression
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .catalog import attach_movies
+from .models import Movie, WatchHistory
+
+
+SEARCH_CONFIG = 'english'
+MIN_QUERY_LENGTH = 2
+# ts_headline markers, swapped for <mark> after the text is escaped
+START_SEL, STOP_SEL = '\x02', '\x03'
+
+
+def _normalize(query):
+    return ' '.join((query or '').split())
+
+
+def _is_postgres():
+    return connection.vendor == 'postgresql'
+
+
+class Document(Expression):
+    """One of the generated tsvector columns, on the query's base table.
+
+    Resolves to a column reference that follows the table's alias, so it
+    stays correct inside subqueries and combined querysets.
+    """
+
+    def __init__(self, column):
+        super().__init__()
+        self.column = column
+
+    def resolve_expression(self, query=None, allow_joins=True, reuse=None, summarize=False, for_save=False):
+        from django.contrib.postgres.search import SearchVectorField
+
+        target = Field()
+        target.set_attributes_from_name(self.column)
+        return Col(query.get_initial_alias(), target, output_field=SearchVectorField())
+
+
+def _tsquery(query):
+    from django.contrib.postgres.search import SearchQuery
+
+    return SearchQuery(query, config=SEARCH_CONFIG, search_type='websearch')
+
+
+def matches(column, query):
+    """Filter expression for rows whose tsvector column matches query, e.g. in a Q()."""
+    from django.contrib.postgres.search import SearchVectorExact
+
+    return SearchVectorExact(Document(column), _tsquery(query))
+
+
+def _ranked(queryset, model, column, query, text_field):
+    """Rank the first candidates of queryset matching query, with a snippet of text_field."""
+    from django.contrib.postgres.search import SearchHeadline, SearchRank
+
+    tsquery = _tsquery(query)
+    pk = model._meta.pk.name
+    candidates = queryset.order_by().filter(matches(column, query)).values(pk)[:settings.FULLTEXT_MAX_CANDIDATES]
+    return (
+        model.objects
+        .filter(**{f'{pk}__in': candidates})
+        .annotate(
+            # Normalization 1 divides by the document length's log, so long plots don't dominate
+            rank=SearchRank(Document(column), tsquery, normalization=1),
+            snippet=SearchHeadline(
+                text_field, tsquery, config=SEARCH_CONFIG, start_sel=START_SEL, stop_sel=STOP_SEL,
+                max_words=35, min_words=15,
+            ),
+        )
+    )
+
+
+def highlight(snippet):
+    """Escape a ts_headline snippet and mark its matches up with <mark>."""
+    return mark_safe(escape(snippet).replace(START_SEL, '<mark>').replace(STOP_SEL, '</mark>'))
+
+
+def _cache_key(query, limit):
+    digest = hashlib.md5(query.lower().encode('utf-8')).hexdigest()
+    return f'movie_app:fulltext_movies:{limit}:{digest}'
+
+
+def search_movie_text(query, limit=None):
+    """Movies whose title or plot match query, best first, as dicts. Cached per query."""
+    limit = limit or settings.MOVIE_SEARCH_LIMIT
+    query = _normalize(query)
+    if len(query) < MIN_QUERY_LENGTH:
+        return []
+
+    key = _cache_key(query, limit)
+    results = cache.get(key)
+    if results is None:
+        if _is_postgres():
+            movies = (
+                _ranked(Movie.objects.all(), Movie, 'search_vector', query, 'plot')
+                .order_by('-rank', 'movie_id')
+                .values('movie_id', 'title', 'release_year', 'snippet')[:limit]
+            )
+        else:
+            movies = (
+                Movie.objects
+                .filter(Q(title__icontains=query) | Q(plot__icontains=query))
+                .order_by('title', 'movie_id')
+                .values('movie_id', 'title', 'release_year', 'plot')[:limit]
+            )
+        results = [
+            {
+                'id': movie['movie_id'],
+                'title': movie['title'],
+                'release_year': movie['release_year'],
+                'snippet': movie.get('snippet', movie.get('plot', '')),
+            }
+            for movie in movies
+        ]
+        cache.set(key, results, settings.MOVIE_SEARCH_CACHE_TIMEOUT)
+    return results
+
+
+def search_reviews(username, query, limit=None):
+    """The user's watch history entries whose review matches query, best first.
+
+    Entries come with their movie attached and a `snippet` of the review.
+    """
+    limit = limit or settings.MOVIE_SEARCH_LIMIT
+    query = _normalize(query)
+    if len(query) < MIN_QUERY_LENGTH:
+        return []
+
+    own = WatchHistory.objects.filter(user_id=username)
+    if _is_postgres():
+        entries = (
+            _ranked(own, WatchHistory, 'review_vector', query, 'review')
+            .order_by('-rank', '-watch_date', '-watched_id')
+            .only('watched_id', 'user_id', 'movie_id', 'watch_date', 'rating')[:limit]
+        )
+    else:
+        entries = own.filter(review__icontains=query).order_by('-watch_date', '-watched_id')[:limit]
+    entries = list(entries)
+    for entry in entries:
+        if not hasattr(entry, 'snippet'):
+            entry.snippet = entry.review
+    return attach_movies(entries)
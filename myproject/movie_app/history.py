@@ -0,0 +1,139 @@
+"""Keyset pagination and streaming for a user's watch history.
+
+Pages are ordered by (watch_date, watched_id) descending. Each page resumes
+after the last row of the previous one, so every page costs the same index
+range scan however deep into the history it is, and movies come from the
+catalog cache rather than a join. The opaque cursor is
+"<watch_date>.<watched_id>" of the last row shown. The a-prefixed functions
+are the async ORM equivalents for async views.
+"""
+from datetime import date
+
+from django.conf import settings
+from django.db.models import F, Q
+
+from .catalog import aattach_movies, attach_movies
+from .models import WatchHistory, WrappedSummary
+
+
+def encode_cursor(entry):
+    return f'{entry.watch_date.isoformat()}.{entry.watched_id}'
+
+
+def decode_cursor(cursor):
+    """Return (watch_date, watched_id) for a cursor, or None if it is invalid."""
+    try:
+        watch_date, watched_id = cursor.split('.', 1)
+        return date.fromisoformat(watch_date), int(watched_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+def history_queryset(username):
+    return (
+        WatchHistory.objects
+        .filter(user_id=username)
+        .order_by('-watch_date', '-watched_id')
+    )
+
+
+def _page_queryset(username, cursor, page_size):
+    qs = history_queryset(username)
+    position = decode_cursor(cursor) if cursor else None
+    if position:
+        watch_date, watched_id = position
+        qs = qs.filter(Q(watch_date__lt=watch_date) | Q(watch_date=watch_date, watched_id__lt=watched_id))
+    return qs[:page_size + 1]
+
+
+def _split_page(entries, page_size):
+    next_cursor = None
+    if len(entries) > page_size:
+        entries = entries[:page_size]
+        next_cursor = encode_cursor(entries[-1])
+    return entries, next_cursor
+
+
+def history_page(username, cursor=None, page_size=None):
+    """Return (entries, next_cursor) for one page of a user's history."""
+    page_size = page_size or settings.WATCH_HISTORY_PAGE_SIZE
+    entries = list(_page_queryset(username, cursor, page_size))
+    entries, next_cursor = _split_page(entries, page_size)
+    return attach_movies(entries), next_cursor
+
+
+async def ahistory_page(username, cursor=None, page_size=None):
+    """Async version of history_page()."""
+    page_size = page_size or settings.WATCH_HISTORY_PAGE_SIZE
+    entries = [entry async for entry in _page_queryset(username, cursor, page_size)]
+    entries, next_cursor = _split_page(entries, page_size)
+    return await aattach_movies(entries), next_cursor
+
+
+def iter_history_chunks(username, chunk_size=None):
+    """Yield lists of entries, chunk_size at a time, over the whole history.
+
+    Chunks are fetched as keyset pages rather than from one server-side
+    cursor, so a slow client never pins a connection or an open transaction,
+    which also keeps streaming safe behind a transaction-mode pooler.
+    """
+    chunk_size = chunk_size or settings.WATCH_HISTORY_STREAM_CHUNK_SIZE
+    cursor = None
+    while True:
+        chunk, cursor = history_page(username, cursor, chunk_size)
+        if chunk:
+            yield chunk
+        if cursor is None:
+            break
+
+
+async def aiter_history_chunks(username, chunk_size=None):
+    """Async version of iter_history_chunks()."""
+    chunk_size = chunk_size or settings.WATCH_HISTORY_STREAM_CHUNK_SIZE
+    cursor = None
+    while True:
+        chunk, cursor = await ahistory_page(username, cursor, chunk_size)
+        if chunk:
+            yield chunk
+        if cursor is None:
+            break
+
+
+def _summary_total(username):
+    return (
+        WrappedSummary.objects
+        .filter(user_id=username)
+        .values_list('total_movies_watched', flat=True)
+    )
+
+
+def count_history_writes(user_ids):
+    """Bump the users' history write counters, in the current transaction."""
+    WrappedSummary.objects.filter(user_id__in=user_ids).update(history_writes=F('history_writes') + 1)
+
+
+async def ahistory_writes(username):
+    """The user's history write counter, or None if they have no summary row."""
+    return await (
+        WrappedSummary.objects
+        .filter(user_id=username)
+        .values_list('history_writes', flat=True)
+        .afirst()
+    )
+
+
+async def ahas_entries(username):
+    """Whether the user has logged anything, from the history itself.
+
+    The summary's total lags behind writes when SUMMARY_UPDATES = 'queue',
+    so it must not decide whether the page shows the empty state.
+    """
+    return await WatchHistory.objects.filter(user_id=username).aexists()
+
+
+async def atotal_watched(username):
+    """Number of entries in a user's history, read from their summary row."""
+    total = await _summary_total(username).afirst()
+    if total is None:
+        total = await WatchHistory.objects.filter(user_id=username).acount()
+    return total
@@ -0,0 +1,84 @@
+"""Map authenticated users to their row in the legacy users table.
+
+auth_user holds credentials; users holds the profile that watch history and
+summaries point at. users.user_id is the auth username, so a reference to
+the profile is just CustomUser(user_id=username) and never needs a query.
+Profiles are written once, at registration (or by migration 0014 for older
+accounts); the cached flag below only covers accounts created elsewhere,
+such as with createsuperuser, so they get a profile on their first write.
+Deleting a profile drops its flag (forget_profile), so the next write
+recreates it instead of pointing at a missing row.
+"""
+from datetime import date
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import User as CustomUser, WrappedSummary
+
+
+# Stored in users.password: the credentials live in auth_user, and a
+# leading '!' is what Django uses for "no usable password"
+UNUSABLE_PASSWORD = '!'
+
+
+def _profile_key(username):
+    return f'movie_app:profile:{username}'
+
+
+def _create_summary(custom_user):
+    """The summary of an empty history, which writes then apply deltas to."""
+    WrappedSummary.objects.create(
+        user=custom_user,
+        top_actor='N/A',
+        total_movies_watched=0,
+        avg_rating=None,
+        highest_rated_movie=None,
+        incremental_ready=True
+    )
+
+
+def create_profile(user, birthday):
+    """Write the profile and an empty summary for a newly registered user."""
+    custom_user = CustomUser.objects.create(
+        user_id=user.username,
+        name=user.first_name or user.username,
+        birthday=birthday,
+        password=UNUSABLE_PASSWORD,
+        profile_picture=''
+    )
+    _create_summary(custom_user)
+    cache.set(_profile_key(user.username), True, None)
+    return custom_user
+
+
+def profile_ref(user):
+    """Return a CustomUser reference for FK assignment, without loading the row.
+
+    The profile's existence is remembered in the cache, so only an account's
+    first write (per cache) touches the users table.
+    """
+    key = _profile_key(user.username)
+    if not cache.get(key):
+        custom_user, created = CustomUser.objects.get_or_create(
+            user_id=user.username,
+            defaults={
+                'name': user.first_name or user.username,
+                'birthday': date(2000, 1, 1),
+                'password': UNUSABLE_PASSWORD,
+                'profile_picture': ''
+            }
+        )
+        # Every profile has a summary row, which holds its history write
+        # counter; with SUMMARY_UPDATES = 'queue' nothing else creates it
+        # before the user's first write commits
+        if created:
+            _create_summary(custom_user)
+        cache.set(key, True, None)
+    return CustomUser(user_id=user.username)
+
+
+def forget_profile(sender, instance, **kwargs):
+    """post_delete receiver for CustomUser: drop the cached existence flag."""
+    username = instance.user_id
+    transaction.on_commit(lambda: cache.delete(_profile_key(username)))
@@ -0,0 +1,94 @@
+"""Database-backed queue for WrappedSummary recomputes.
+
+With SUMMARY_UPDATES = 'queue', views only call enqueue_summary_job() and
+`manage.py run_summary_worker` does the recompute out of band. Jobs are
+keyed by user, so any number of writes before a worker gets to them cost one
+rebuild. Workers claim jobs with SELECT ... FOR UPDATE SKIP LOCKED, which lets
+several processes drain the queue without waiting on each other. A job that
+fails SUMMARY_JOB_MAX_ATTEMPTS times stops being claimed; the worker reports
+those, and its --retry-failed option or the admin puts them back in line.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import SummaryJob, User as CustomUser
+from .summary import rebuild_wrapped_summary
+
+
+logger = logging.getLogger('movie_app.jobs')
+
+
+def enqueue_summary_job(username):
+    """Request a summary recompute for a user, coalescing with any pending one."""
+    SummaryJob.objects.bulk_create(
+        [SummaryJob(user_id=username)],
+        update_conflicts=True,
+        unique_fields=['user'],
+        # requested_at is kept so busy users do not starve the queue, and
+        # claimed_at so a job being recomputed is not claimed twice; the
+        # new token makes its worker release it for another run instead
+        update_fields=['token', 'attempts'],
+    )
+
+
+def claim_summary_jobs(limit):
+    """Claim up to `limit` runnable jobs, oldest first, and return them.
+
+    A claim that is older than SUMMARY_JOB_CLAIM_TIMEOUT seconds is treated
+    as abandoned by a dead worker and can be claimed again.
+    """
+    stale = timezone.now() - timedelta(seconds=settings.SUMMARY_JOB_CLAIM_TIMEOUT)
+    with transaction.atomic():
+        jobs = list(
+            SummaryJob.objects
+            .select_for_update(skip_locked=True)
+            .filter(Q(claimed_at__isnull=True) | Q(claimed_at__lt=stale))
+            .filter(attempts__lt=settings.SUMMARY_JOB_MAX_ATTEMPTS)
+            .order_by('requested_at')[:limit]
+        )
+        if jobs:
+            claimed_at = timezone.now()
+            SummaryJob.objects.filter(pk__in=[job.pk for job in jobs]).update(claimed_at=claimed_at)
+            for job in jobs:
+                job.claimed_at = claimed_at
+    return jobs
+
+
+def _release(job, **changes):
+    """Drop the worker's claim on a job, unless it went stale and was claimed again."""
+    return SummaryJob.objects.filter(pk=job.pk, claimed_at=job.claimed_at).update(claimed_at=None, **changes)
+
+
+def run_summary_job(job):
+    """Recompute the job's summary. Returns True on success."""
+    try:
+        rebuild_wrapped_summary(CustomUser(user_id=job.user_id))
+    except Exception as exc:
+        _release(job, attempts=F('attempts') + 1, last_error=repr(exc))
+        if job.attempts + 1 >= settings.SUMMARY_JOB_MAX_ATTEMPTS:
+            logger.exception("Summary job for %s failed for the last time; it will not be retried.", job.user_id)
+        else:
+            logger.warning("Summary job for %s failed: %r", job.user_id, exc)
+        return False
+    # If the user wrote again meanwhile the token changed: the job stays,
+    # and is released for the next worker to pick up
+    deleted, _ = SummaryJob.objects.filter(pk=job.pk, token=job.token).delete()
+    if not deleted:
+        _release(job)
+    return True
+
+
+def failed_summary_jobs():
+    """Jobs that used up their attempts and are no longer claimed."""
+    return SummaryJob.objects.filter(attempts__gte=settings.SUMMARY_JOB_MAX_ATTEMPTS)
+
+
+def retry_failed_summary_jobs(queryset=None):
+    """Give failed jobs a fresh set of attempts; returns how many were reset."""
+    queryset = failed_summary_jobs() if queryset is None else queryset
+    return queryset.update(attempts=0, claimed_at=None)
@@ -0,0 +1,55 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure what opening a database connection costs per request. "
+        "Times ITERATIONS request cycles (SELECT 1 plus the connection "
+        "handling Django does around each request) with a fresh connection "
+        "each time, and with the configured CONN_MAX_AGE / DB_POOL settings."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=200)
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        settings_dict = connection.settings_dict
+        pool = bool(settings_dict.get('OPTIONS', {}).get('pool'))
+        configured = 'pool' if pool else f"CONN_MAX_AGE={settings_dict['CONN_MAX_AGE']}"
+
+        fresh = self._time(iterations, reuse=False)
+        connection.close()
+        managed = self._time(iterations, reuse=True)
+        connection.close()
+
+        self.stdout.write(f"{iterations} request cycles against {connection.vendor}:")
+        for label, elapsed in (("new connection every request", fresh), (f"configured ({configured})", managed)):
+            self.stdout.write(f"  {label + ':':<32} {elapsed * 1000 / iterations:.2f} ms/request")
+        if managed:
+            self.stdout.write(self.style.SUCCESS(
+                f"Connection handling costs {(fresh - managed) * 1000 / iterations:.2f} ms less per request "
+                f"({fresh / managed:.1f}x faster)."
+            ))
+
+    def _time(self, iterations, reuse):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            if reuse:
+                # What request_started / request_finished do around each request
+                connection.close_if_unusable_or_obsolete()
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+                    cursor.fetchone()
+                connection.close_if_unusable_or_obsolete()
+            else:
+                # A driver-level connect, bypassing any pool
+                raw = connection.Database.connect(**connection.get_connection_params())
+                with raw.cursor() as cursor:
+                    cursor.execute('SELECT 1')
+                    cursor.fetchone()
+                raw.close()
+        return time.perf_counter() - started
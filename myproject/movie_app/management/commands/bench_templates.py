@@ -0,0 +1,80 @@
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand
+from django.template import Context, Engine, Template
+from django.template.loader import get_template
+
+from movie_app.models import Movie, WatchHistory
+
+
+REVIEW = "A slow burn that rewards patience with a finale worth every minute of the wait."
+
+
+class Command(BaseCommand):
+    help = (
+        "Time rendering the watch history rows per 1,000 rows: without the "
+        "cached template loader, with it, and as a fragment cache hit. Uses "
+        "in-memory entries, so no database access is needed."
+    )
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        entries = [
+            WatchHistory(
+                watched_id=i,
+                movie=Movie(movie_id=i, title=f"Movie {i}", release_year=2000 + i % 25),
+                watch_date=date(2024, 1, 1) + timedelta(days=i % 365),
+                rating=i % 10 + 1,
+                review=REVIEW if i % 3 else '',
+            )
+            for i in range(1, rows + 1)
+        ]
+        context = {'watch_history': entries}
+
+        # A fresh, non-caching engine re-reads and re-parses the template on every lookup
+        uncached_engine = Engine(loaders=['django.template.loaders.app_directories.Loader'])
+
+        def uncached():
+            uncached_engine.get_template('watch_history_rows.html').render(Context(context))
+
+        def cached_loader():
+            get_template('watch_history_rows.html').render(context)
+
+        fragment = Template(
+            "{% load cache %}{% cache 600 bench_rows version %}"
+            "{% include 'watch_history_rows.html' %}{% endcache %}"
+        )
+        fragment_context = Context(dict(context, version=time.time_ns()))
+        fragment.render(fragment_context)  # warm the fragment
+
+        def fragment_hit():
+            fragment.render(fragment_context)
+
+        per_thousand = 1000 / rows
+        self.stdout.write(f"Rendering {rows} watch history rows, best of {repeat}:")
+        results = {}
+        for label, render in (
+            ("no cached loader", uncached),
+            ("cached loader", cached_loader),
+            ("fragment cache hit", fragment_hit),
+        ):
+            render()
+            best = min(self._time(render) for _ in range(repeat))
+            results[label] = best
+            self.stdout.write(f"  {label + ':':<20} {best * 1000 * per_thousand:8.2f} ms per 1,000 rows")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Fragment hits are {results['no cached loader'] / results['fragment cache hit']:.0f}x faster "
+            f"than a full uncached render."
+        ))
+
+    def _time(self, render):
+        started = time.perf_counter()
+        render()
+        return time.perf_counter() - started
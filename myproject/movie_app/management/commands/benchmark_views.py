@@ -0,0 +1,251 @@
+import itertools
+import json
+import logging
+import statistics
+import time
+from datetime import date, datetime, timezone
+
+from django.contrib.auth.models import User
+from django.core.cache import caches
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client, override_settings
+
+from movie_app.models import WatchHistory
+
+
+FORMAT_VERSION = 1
+READ_PAGES = [
+    ('dashboard', lambda entry: '/dashboard/'),
+    ('watch_history', lambda entry: '/watch-history/'),
+    ('wrapped_summary', lambda entry: '/wrapped/'),
+    ('wrapped_summary_year', lambda entry: f'/wrapped/?year={date.today().year}'),
+    ('edit_watch_entry', lambda entry: f'/edit-entry/{entry.pk}/'),
+]
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the dashboard, watch_history, add_movie, edit_watch_entry and "
+        "wrapped_summary views through the full middleware stack, for the "
+        "synthetic user with the most watches ('heavy') and the median one "
+        "('typical'), with cold and warm caches. With --sizes, the data is "
+        "re-seeded by seed_synthetic at each size first. Results are written "
+        "as JSON; with --baseline, they are compared to an earlier run and "
+        "the command fails on regressions. PostgreSQL only."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            help="comma-separated watch_history sizes to seed and measure, e.g. 10000,100000,1000000; "
+                 "by default the data already seeded is measured",
+        )
+        parser.add_argument('--requests', type=int, default=20, help="timed requests per case")
+        parser.add_argument('--warmup', type=int, default=3, help="untimed requests per case first")
+        parser.add_argument('--seed', type=int, default=412)
+        parser.add_argument('--prefix', default='synth')
+        parser.add_argument('--output', help="write the results to this JSON file")
+        parser.add_argument('--baseline', help="JSON file from an earlier run to compare against")
+        parser.add_argument(
+            '--tolerance',
+            type=float,
+            default=0.25,
+            help="fraction by which a median may be slower than the baseline's before it counts as a regression",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("benchmark_views needs a PostgreSQL database.")
+        if options['requests'] < 1:
+            raise CommandError("--requests must be at least 1.")
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',')] if options['sizes'] else [None]
+        except ValueError:
+            raise CommandError("--sizes must be comma-separated integers.")
+        baseline = self._load(options['baseline']) if options['baseline'] else None
+        self.options = options
+
+        results = []
+        for size in sizes:
+            if size is not None:
+                call_command('seed_synthetic', watches=size, clear=True, seed=options['seed'],
+                             prefix=options['prefix'], stdout=self.stdout)
+            # Debug query logging and budget exceptions would distort or stop the
+            # run; per-request log lines are dropped, over-budget warnings kept
+            timing_logger = logging.getLogger('movie_app.timing')
+            level = timing_logger.level
+            timing_logger.setLevel(logging.WARNING)
+            try:
+                with override_settings(DEBUG=False, ALLOWED_HOSTS=['testserver'], QUERY_BUDGET_MODE='log'):
+                    results.extend(self.measure(size))
+            finally:
+                timing_logger.setLevel(level)
+
+        report = {
+            'format': FORMAT_VERSION,
+            'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'database': {'vendor': connection.vendor, 'version': connection.pg_version},
+            'options': {key: options[key] for key in ('requests', 'warmup', 'seed', 'prefix')},
+            'results': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as handle:
+                json.dump(report, handle, indent=2)
+                handle.write('\n')
+            self.stdout.write(f"Wrote {len(results)} results to {options['output']}.")
+        if baseline is not None:
+            self.compare(baseline, results, options['tolerance'])
+
+    def _load(self, path):
+        try:
+            with open(path, encoding='utf-8') as handle:
+                report = json.load(handle)
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Could not read baseline {path}: {exc}")
+        if report.get('format') != FORMAT_VERSION:
+            raise CommandError(f"{path} is not a benchmark_views results file (format {FORMAT_VERSION}).")
+        return report
+
+    def _users(self):
+        """Return [(label, username, watches)] for the heaviest and the median synthetic user."""
+        counts = list(
+            WatchHistory.objects
+            .filter(user__user_id__startswith=f"{self.options['prefix']}-")
+            .values_list('user_id')
+            .annotate(n=Count('watched_id'))
+            .order_by('-n', 'user_id')
+        )
+        if not counts:
+            raise CommandError(
+                f"No synthetic watch history for {self.options['prefix']}-* users; "
+                f"run seed_synthetic or pass --sizes."
+            )
+        heavy, typical = counts[0], counts[len(counts) // 2]
+        return [('heavy', *heavy), ('typical', *typical)]
+
+    def _clear_caches(self):
+        for cache in caches.all():
+            cache.clear()
+
+    def _run(self, request, cold, setup=None):
+        """Time `request` --requests times after --warmup untimed calls; return the samples."""
+        samples = []
+        for i in range(self.options['warmup'] + self.options['requests']):
+            if setup:
+                setup()
+            if cold:
+                self._clear_caches()
+            started = time.perf_counter()
+            response = request()
+            elapsed = time.perf_counter() - started
+            if response.status_code >= 400:
+                raise CommandError(f"{response.wsgi_request.path} answered {response.status_code}.")
+            if i >= self.options['warmup']:
+                timings = getattr(response.wsgi_request, 'timings', None)
+                if timings is None:
+                    raise CommandError("benchmark_views needs movie_app.timing.RequestTimingMiddleware in MIDDLEWARE.")
+                samples.append((elapsed, timings.queries, timings.db_seconds))
+        return samples
+
+    def _result(self, size, view, label, watches, cache, samples):
+        latencies = [elapsed * 1000 for elapsed, _, _ in samples]
+        return {
+            'size': size,
+            'view': view,
+            'user': label,
+            'watches': watches,
+            'cache': cache,
+            'requests': len(samples),
+            'median_ms': round(statistics.median(latencies), 3),
+            'p95_ms': round(_percentile(latencies, 0.95), 3),
+            'min_ms': round(min(latencies), 3),
+            'queries': statistics.median(queries for _, queries, _ in samples),
+            'db_ms': round(statistics.median(db * 1000 for _, _, db in samples), 3),
+        }
+
+    def measure(self, size):
+        results = []
+        label_size = f"{size} watches" if size is not None else "current data"
+        self.stdout.write(self.style.MIGRATE_HEADING(f"Benchmarking with {label_size}"))
+        for label, username, watches in self._users():
+            client = Client()
+            client.force_login(User.objects.get(username=username))
+            latest = WatchHistory.objects.filter(user_id=username).order_by('-watched_id').first()
+
+            cases = []
+            for view, path in READ_PAGES:
+                url = path(latest)
+                for cache in ('cold', 'warm'):
+                    cases.append((view, cache, lambda url=url: client.get(url), None))
+
+            # Writes: add an entry and delete it again, and re-rate the latest one
+            form = {
+                'movie': latest.movie_id,
+                'watch_date': date.today().isoformat(),
+                'rating': latest.rating,
+                'review': '',
+            }
+            added = []
+
+            def add():
+                response = client.post('/add-movie/', form)
+                added.append(WatchHistory.objects.filter(user_id=username).order_by('-watched_id').first().pk)
+                return response
+
+            def delete():
+                return client.post(f'/edit-entry/{added.pop()}/', {'delete': '1'})
+
+            ratings = itertools.cycle(range(1, 11))
+            edit_form = dict(form, watch_date=latest.watch_date.isoformat())
+
+            def update():
+                return client.post(f'/edit-entry/{latest.pk}/', dict(edit_form, rating=next(ratings)))
+
+            cases.append(('add_movie', 'warm', add, None))
+            cases.append(('edit_watch_entry_delete', 'warm', delete, lambda: added or add()))
+            cases.append(('edit_watch_entry_update', 'warm', update, None))
+
+            for view, cache, request, setup in cases:
+                samples = self._run(request, cache == 'cold', setup)
+                result = self._result(size, view, label, watches, cache, samples)
+                results.append(result)
+                self.stdout.write(
+                    f"  {view:<24} {label:<8} {cache:<5} median {result['median_ms']:8.2f} ms  "
+                    f"p95 {result['p95_ms']:8.2f} ms  {result['queries']:>4g} queries"
+                )
+            # Remove whatever the add case left behind
+            while added:
+                delete()
+        return results
+
+    def compare(self, baseline, results, tolerance):
+        def key(result):
+            return (result['size'], result['view'], result['user'], result['cache'])
+
+        previous = {key(result): result for result in baseline['results']}
+        regressions = []
+        for result in results:
+            before = previous.get(key(result))
+            if before is None:
+                continue
+            ratio = result['median_ms'] / before['median_ms'] if before['median_ms'] else 1
+            slower = ratio > 1 + tolerance
+            more_queries = result['queries'] > before['queries']
+            if slower or more_queries:
+                regressions.append(result)
+            style = self.style.ERROR if slower or more_queries else self.style.SUCCESS
+            self.stdout.write(style(
+                f"  {result['view']:<24} {result['user']:<8} {result['cache']:<5} size={result['size']}: "
+                f"{ratio:.2f}x median, queries {before['queries']:g} -> {result['queries']:g}"
+            ))
+        if regressions:
+            raise CommandError(f"{len(regressions)} case(s) regressed against {self.options['baseline']}.")
+        self.stdout.write(self.style.SUCCESS(f"No regressions against {self.options['baseline']}."))
@@ -0,0 +1,86 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+
+from movie_app.models import Recommendation
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild every user's \"recommended for you\" list from co-ratings and "
+        "shared actors/directors. Needs numpy and scipy. Peak memory beyond the "
+        "ratings and credits matrices stays within --memory-mb."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=20, help="recommendations stored per user")
+        parser.add_argument('--neighbors', type=int, default=50, help="similar movies kept per movie")
+        parser.add_argument(
+            '--content-weight',
+            type=float,
+            default=0.3,
+            help="share of the similarity that comes from shared cast and directors (0-1)",
+        )
+        parser.add_argument('--memory-mb', type=int, default=256, help="budget for the dense working blocks")
+        parser.add_argument('--batch-size', type=int, default=5000, help="rows per bulk insert")
+
+    def handle(self, *args, **options):
+        try:
+            from movie_app import recommender
+        except ImportError as exc:
+            raise CommandError(f"build_recommendations needs numpy and scipy ({exc}); pip install -r requirements.txt")
+        if not 0 <= options['content_weight'] <= 1:
+            raise CommandError("--content-weight must be between 0 and 1.")
+
+        started = time.monotonic()
+        built_at = timezone.now()
+        memory_bytes = options['memory_mb'] * 1024 * 1024
+        users, movies = recommender.Codes(), recommender.Codes()
+        user_codes, movie_codes, ratings = recommender.load_ratings(users, movies)
+        credit_movies, credit_people, n_people = recommender.load_credits(movies)
+        self.stdout.write(
+            f"Loaded {len(ratings)} ratings by {len(users)} users and {len(credit_movies)} credits "
+            f"over {len(movies)} movies in {time.monotonic() - started:.1f}s."
+        )
+
+        rating_matrix = recommender.rating_matrix(user_codes, movie_codes, ratings, len(users), len(movies))
+        credit_matrix = recommender.credit_matrix(credit_movies, credit_people, len(movies), n_people)
+        neighbors = recommender.item_neighbors(
+            rating_matrix, credit_matrix, options['neighbors'], memory_bytes, options['content_weight'],
+        )
+        self.stdout.write(f"Built {neighbors.nnz} movie neighbours in {time.monotonic() - started:.1f}s.")
+
+        batch, batch_users, written = [], [], 0
+        for user_code, top_movies, scores in recommender.recommend(
+            rating_matrix, neighbors, options['top_k'], memory_bytes,
+        ):
+            user_id = users.ids[user_code]
+            batch_users.append(user_id)
+            batch.extend(
+                Recommendation(
+                    user_id=user_id, rank=rank, movie_id=movies.ids[movie_code],
+                    score=float(score), built_at=built_at,
+                )
+                for rank, (movie_code, score) in enumerate(zip(top_movies, scores), start=1)
+            )
+            if len(batch) >= options['batch_size']:
+                written += self._replace(batch_users, batch)
+                batch, batch_users = [], []
+        written += self._replace(batch_users, batch)
+
+        # Users who no longer get any recommendation keep none
+        stale, _ = Recommendation.objects.filter(built_at__lt=built_at).delete()
+        self.stdout.write(self.style.SUCCESS(
+            f"Stored {written} recommendations, removed {stale} stale ones, "
+            f"in {time.monotonic() - started:.1f}s."
+        ))
+
+    def _replace(self, user_ids, rows):
+        if not rows:
+            return 0
+        with transaction.atomic():
+            Recommendation.objects.filter(user_id__in=user_ids).delete()
+            Recommendation.objects.bulk_create(rows)
+        return len(rows)
@@ -0,0 +1,67 @@
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User as AuthUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from movie_app.identity import UNUSABLE_PASSWORD
+from movie_app.models import User as CustomUser
+
+
+# Plain-text placeholders older code wrote into users.password
+PLACEHOLDER_PASSWORDS = {'', 'temp'}
+
+
+class Command(BaseCommand):
+    help = (
+        "Give legacy profiles in the users table that have no auth account a "
+        "login. Their plain-text password, the only copy, is hashed into "
+        "auth_user and then removed from users; a placeholder password gives "
+        "an account that needs a reset. Each hash takes a noticeable fraction "
+        "of a second, so accounts are created in batches, and an interrupted "
+        "run picks up where it stopped. Name the users to convert or pass "
+        "--all. --discard removes their passwords without creating logins."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='*', help="legacy user_ids to convert")
+        parser.add_argument('--all', action='store_true', help="convert every legacy profile without an auth account")
+        parser.add_argument('--discard', action='store_true', help="only remove the stored passwords; nobody gets a login")
+        parser.add_argument('--batch-size', type=int, default=100, help="accounts created per transaction")
+
+    def handle(self, *args, **options):
+        if bool(options['usernames']) == options['all']:
+            raise CommandError("Name the users to convert, or pass --all.")
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        legacy = (
+            CustomUser.objects
+            .exclude(user_id__in=AuthUser.objects.values('username'))
+            .exclude(password=UNUSABLE_PASSWORD)
+        )
+        if options['usernames']:
+            legacy = legacy.filter(user_id__in=options['usernames'])
+
+        if options['discard']:
+            discarded = legacy.update(password=UNUSABLE_PASSWORD)
+            self.stdout.write(self.style.SUCCESS(f"Removed the passwords of {discarded} legacy profiles."))
+            return
+
+        profiles = list(legacy.only('user_id', 'name', 'password').order_by('user_id'))
+        created = 0
+        for start in range(0, len(profiles), options['batch_size']):
+            batch = profiles[start:start + options['batch_size']]
+            with transaction.atomic():
+                AuthUser.objects.bulk_create([
+                    AuthUser(
+                        username=profile.user_id,
+                        first_name=profile.name[:150],
+                        password=make_password(
+                            profile.password if profile.password not in PLACEHOLDER_PASSWORDS else None
+                        ),
+                    )
+                    for profile in batch
+                ])
+                CustomUser.objects.filter(pk__in=[profile.pk for profile in batch]).update(password=UNUSABLE_PASSWORD)
+            created += len(batch)
+            self.stdout.write(f"  created {created} of {len(profiles)} logins")
+        self.stdout.write(self.style.SUCCESS(f"Created {created} logins for legacy profiles."))
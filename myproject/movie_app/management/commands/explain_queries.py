@@ -0,0 +1,130 @@
+import json
+from datetime import date
+
+from asgiref.sync import async_to_sync, iscoroutinefunction
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory, override_settings
+
+from movie_app import views
+from movie_app.models import WatchHistory
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the read-only views as USERNAME, EXPLAIN every SELECT they issue "
+        "and flag sequential scans. PostgreSQL only."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help="auth user to render the pages as")
+        parser.add_argument('--search', default='the', help="query used for the movie search endpoint")
+        parser.add_argument(
+            '--no-analyze',
+            action='store_true',
+            help="plan only; do not execute the queries (drops ANALYZE and BUFFERS)",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("explain_queries needs a PostgreSQL database.")
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"No auth user named {options['username']!r}.")
+
+        pages = [
+            ('dashboard', views.dashboard, '/dashboard/', {}),
+            ('watch_history', views.watch_history, '/watch-history/', {}),
+            ('wrapped_summary', views.wrapped_summary, '/wrapped/', {}),
+            ('wrapped_summary_year', views.wrapped_summary, f'/wrapped/?year={date.today().year}', {}),
+            ('add_movie', views.add_movie, '/add-movie/', {}),
+            ('movie_search', views.movie_search, f"/movies/search/?q={options['search']}", {}),
+        ]
+        entry = WatchHistory.objects.filter(user_id=user.username).order_by('-watched_id').first()
+        if entry:
+            pages.append(('edit_watch_entry', views.edit_watch_entry, f'/edit-entry/{entry.pk}/',
+                          {'entry_id': entry.pk}))
+
+        options_sql = 'FORMAT JSON' if options['no_analyze'] else 'ANALYZE, BUFFERS, FORMAT JSON'
+        factory = RequestFactory()
+        total_seq_scans = 0
+        # Bypass the dashboard, search and catalog caches so every query actually runs
+        no_cache = override_settings(CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+            'catalog': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'},
+        })
+        no_cache.enable()
+        try:
+            for name, view, path, kwargs in pages:
+                total_seq_scans += self._explain_page(factory, user, name, view, path, kwargs, options_sql)
+        finally:
+            no_cache.disable()
+
+        if total_seq_scans:
+            self.stdout.write(self.style.WARNING(f"{total_seq_scans} queries use sequential scans."))
+        else:
+            self.stdout.write(self.style.SUCCESS("No sequential scans."))
+
+    def _explain_page(self, factory, user, name, view, path, kwargs, options_sql):
+        """EXPLAIN the SELECTs one page issues; return how many seq-scan."""
+        captured = []
+        seq_scan_queries = 0
+        request = factory.get(path)
+        request.user = user
+        request.auser = _auser(user)
+        with connection.execute_wrapper(_capture(captured)):
+            if iscoroutinefunction(view):
+                # Async ORM calls run back on this thread, so the wrapper sees them
+                response = async_to_sync(view)(request, **kwargs)
+            else:
+                response = view(request, **kwargs)
+            if getattr(response, 'streaming', False):
+                b''.join(response.streaming_content)
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f"{name} ({len(captured)} queries)"))
+        for sql, params in captured:
+            if not sql.lstrip().upper().startswith('SELECT'):
+                continue
+            with connection.cursor() as cursor:
+                cursor.execute(f'EXPLAIN ({options_sql}) {sql}', params)
+                plan = cursor.fetchone()[0]
+            if isinstance(plan, str):
+                plan = json.loads(plan)
+            root = plan[0]
+            seq_scans = sorted(set(_seq_scans(root['Plan'])))
+            cost = root['Plan'].get('Total Cost')
+            timing = f", {root['Execution Time']:.2f} ms" if 'Execution Time' in root else ''
+            summary = f"  cost={cost}{timing}: {_shorten(sql)}"
+            if seq_scans:
+                seq_scan_queries += 1
+                self.stdout.write(self.style.WARNING(f"{summary}\n    Seq Scan on {', '.join(seq_scans)}"))
+            else:
+                self.stdout.write(summary)
+        return seq_scan_queries
+
+
+def _auser(user):
+    async def auser():
+        return user
+    return auser
+
+
+def _capture(captured):
+    def wrapper(execute, sql, params, many, context):
+        captured.append((sql, params))
+        return execute(sql, params, many, context)
+    return wrapper
+
+
+def _seq_scans(node):
+    if node.get('Node Type') == 'Seq Scan':
+        yield node.get('Relation Name', '?')
+    for child in node.get('Plans', []):
+        yield from _seq_scans(child)
+
+
+def _shorten(sql, width=120):
+    sql = ' '.join(sql.split())
+    return sql if len(sql) <= width else sql[:width - 3] + '...'
@@ -0,0 +1,177 @@
+import csv
+import json
+import time
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import F
+
+from movie_app.bulk import column_is_integer, copy_rows, open_text
+from movie_app.models import Movie, User as CustomUser, WrappedSummary
+from movie_app.sequences import repair_sequence
+from movie_app.signals import resync_user
+
+
+# Header names used by common exports (Letterboxd, IMDb) and by our own
+# column names, in order of preference.
+COLUMN_ALIASES = {
+    'user': ('user_id', 'username', 'user'),
+    'title': ('title', 'Title', 'Name', 'name'),
+    'year': ('release_year', 'year', 'Year'),
+    'date': ('watch_date', 'Watched Date', 'Date Rated', 'Date', 'date'),
+    'rating': ('rating', 'Your Rating', 'Rating'),
+    'review': ('review', 'Review'),
+}
+
+AMBIGUOUS = object()
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream watch history from a CSV or JSONL export (e.g. Letterboxd or "
+        "IMDb) into watch_history, resolving titles to movies in memory and "
+        "loading rows in COPY batches. Summaries are rebuilt once per user."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or JSONL file (optionally .gz), or - for stdin")
+        parser.add_argument('--format', choices=['csv', 'jsonl'], help="input format; defaults to the file extension")
+        parser.add_argument('--user', help="user_id for rows without a user column")
+        parser.add_argument('--batch-size', type=int, default=50000)
+        parser.add_argument(
+            '--rating-scale',
+            type=float,
+            default=1.0,
+            help="multiply ratings by this, e.g. 2 for 5-star exports",
+        )
+        parser.add_argument('--date-format', default='%Y-%m-%d')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('jsonl' if '.jsonl' in path or '.ndjson' in path else 'csv')
+        started = time.monotonic()
+
+        self.by_title_year, self.by_title = self._build_title_index()
+        self.known_users = set(CustomUser.objects.values_list('user_id', flat=True))
+        if options['user'] and options['user'] not in self.known_users:
+            raise CommandError(f"Unknown user {options['user']!r}.")
+        self.round_ratings = column_is_integer('watch_history', 'rating')
+        self.options = options
+        self.skipped = {}
+        # Users with committed rows, whose summaries need a rebuild
+        self.loaded_users = set()
+        if connection.vendor == 'postgresql':
+            # COPY takes ids from the sequence, which a legacy load leaves behind
+            repair_sequence('watch_history', 'watched_id')
+
+        try:
+            loaded = self._load_all(path, fmt)
+        finally:
+            # Also after a failed run: earlier batches are already committed.
+            # Summaries and rollups are rebuilt once per user, not once per row
+            for user_id in sorted(self.loaded_users):
+                resync_user(user_id)
+            self.stdout.write(f"Rebuilt {len(self.loaded_users)} summaries.")
+
+        self.stdout.write(f"Loaded {loaded} rows in {time.monotonic() - started:.1f}s.")
+        for reason, count in sorted(self.skipped.items()):
+            self.stdout.write(self.style.WARNING(f"Skipped {count} rows: {reason}"))
+
+    def _load_all(self, path, fmt):
+        loaded = 0
+        with open_text(path) as handle:
+            records = self._read_csv(handle) if fmt == 'csv' else self._read_jsonl(handle)
+            batch = []
+            for record in records:
+                row = self._to_row(record)
+                if row is not None:
+                    batch.append(row)
+                if len(batch) >= self.options['batch_size']:
+                    loaded += self._load(batch)
+                    batch = []
+            loaded += self._load(batch)
+        return loaded
+
+    def _build_title_index(self):
+        """Map (title, year) and bare title to movie_id, both casefolded."""
+        by_title_year, by_title = {}, {}
+        for movie_id, title, year in Movie.objects.values_list('movie_id', 'title', 'release_year').iterator():
+            key = title.casefold().strip()
+            by_title_year[(key, year)] = movie_id
+            by_title[key] = AMBIGUOUS if key in by_title else movie_id
+        return by_title_year, by_title
+
+    def _read_csv(self, handle):
+        reader = csv.DictReader(handle)
+        columns = {}
+        for field, aliases in COLUMN_ALIASES.items():
+            columns[field] = next((name for name in aliases if name in (reader.fieldnames or [])), None)
+        for record in reader:
+            yield {field: record.get(name) if name else None for field, name in columns.items()}
+
+    def _read_jsonl(self, handle):
+        for line in handle:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            yield {
+                field: next((record[name] for name in aliases if name in record), None)
+                for field, aliases in COLUMN_ALIASES.items()
+            }
+
+    def _skip(self, reason):
+        self.skipped[reason] = self.skipped.get(reason, 0) + 1
+        return None
+
+    def _to_row(self, record):
+        user_id = record['user'] or self.options['user']
+        if user_id not in self.known_users:
+            return self._skip("unknown or missing user")
+
+        title = (record['title'] or '').casefold().strip()
+        year = record['year']
+        movie_id = None
+        if year not in (None, ''):
+            try:
+                movie_id = self.by_title_year.get((title, int(year)))
+            except (TypeError, ValueError):
+                pass
+        if movie_id is None:
+            movie_id = self.by_title.get(title)
+        if movie_id is None:
+            return self._skip("title not in catalog")
+        if movie_id is AMBIGUOUS:
+            return self._skip("title matches several movies and no year given")
+
+        try:
+            watch_date = datetime.strptime(str(record['date']).strip(), self.options['date_format']).date()
+        except (TypeError, ValueError):
+            return self._skip("missing or unparseable date")
+
+        try:
+            rating = float(record['rating']) * self.options['rating_scale']
+        except (TypeError, ValueError):
+            return self._skip("missing or unparseable rating")
+        if self.round_ratings:
+            rating = int(round(rating))
+        if not 1 <= rating <= 10:
+            return self._skip("rating outside 1-10")
+
+        return (user_id, movie_id, watch_date.isoformat(), rating, record['review'] or '')
+
+    def _load(self, batch):
+        if not batch:
+            return 0
+        users = {row[0] for row in batch}
+        with transaction.atomic():
+            count = copy_rows('watch_history', ['user_id', 'movie_id', 'watch_date', 'rating', 'review'], batch)
+            # Should the run die before the rebuild, the next write rebuilds
+            # these summaries instead of applying deltas to stale totals. COPY
+            # sends no signals, so the history write counters are bumped here
+            WrappedSummary.objects.filter(user_id__in=users).update(
+                incremental_ready=False, history_writes=F('history_writes') + 1,
+            )
+        self.loaded_users |= users
+        self.stdout.write(f"  copied {count} rows")
+        return count
@@ -0,0 +1,214 @@
+import csv
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from movie_app.bulk import copy_rows, open_text
+from movie_app.sequences import repair_sequence
+
+
+ACTOR_CATEGORIES = {'actor', 'actress'}
+DIRECTOR_CATEGORIES = {'director'}
+SERIAL_COLUMNS = [
+    ('movies', 'movie_id'),
+    ('actors', 'actor_id'),
+    ('directors', 'director_id'),
+]
+
+
+def _int_or_none(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _read_tsv(path):
+    """Stream an IMDb-style TSV as dicts. Those files are never quoted."""
+    csv.field_size_limit(sys.maxsize)
+    with open_text(path) as handle:
+        yield from csv.DictReader(handle, delimiter='\t', quoting=csv.QUOTE_NONE)
+
+
+def _batched(rows, size):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream IMDb-style TSV dumps (title.basics, title.principals, "
+        "name.basics) into movies, people and their credits. Movies "
+        "and people are deduplicated in memory, people are upserted with "
+        "ON CONFLICT on (name, birth_year) (by name alone when the birth year "
+        "is unknown), and credits are COPYed into a "
+        "staging table and merged into movie_actors / movie_directors. PostgreSQL only."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--basics', required=True, help="title.basics.tsv[.gz]")
+        parser.add_argument('--principals', help="title.principals.tsv[.gz]")
+        parser.add_argument('--names', help="name.basics.tsv[.gz]; required with --principals")
+        parser.add_argument('--title-types', default='movie', help="comma-separated titleType values to keep")
+        parser.add_argument('--batch-size', type=int, default=100000)
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("load_catalog needs a PostgreSQL database.")
+        if options['principals'] and not options['names']:
+            raise CommandError("--principals needs --names to resolve people.")
+        self.batch_size = options['batch_size']
+        started = time.monotonic()
+        for table, column in SERIAL_COLUMNS:
+            repair_sequence(table, column)
+
+        movie_ids = self.load_movies(options['basics'], set(options['title_types'].split(',')))
+        self.stdout.write(f"Resolved {len(movie_ids)} titles ({time.monotonic() - started:.1f}s).")
+
+        if options['principals']:
+            credits = self.load_credits(options['principals'], options['names'], movie_ids)
+            self.stdout.write(f"Merged {credits} new credits ({time.monotonic() - started:.1f}s).")
+
+        self.stdout.write(self.style.SUCCESS(f"Catalog load finished in {time.monotonic() - started:.1f}s."))
+
+    def _execute(self, sql, params=None):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.rowcount
+
+    def _fetch(self, sql, params=None):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    def load_movies(self, path, title_types):
+        """Insert unseen movies; return {tconst: movie_id} for every kept title."""
+        existing = {
+            (title.casefold(), year): movie_id
+            for movie_id, title, year in self._fetch("SELECT movie_id, title, release_year FROM movies")
+        }
+        # Several tconsts can share a (title, year); they all map to one movie
+        tconst_keys = {}
+        new_movies = {}
+        for row in _read_tsv(path):
+            if row['titleType'] not in title_types:
+                continue
+            year = _int_or_none(row['startYear'])
+            if year is None or year <= 1900:
+                continue
+            title = row['primaryTitle']
+            key = (title.casefold(), year)
+            tconst_keys[row['tconst']] = key
+            if key not in existing and key not in new_movies:
+                runtime = _int_or_none(row['runtimeMinutes'])
+                new_movies[key] = (title, year, runtime if runtime and runtime > 0 else None)
+
+        with transaction.atomic():
+            self._execute(
+                "CREATE TEMP TABLE stage_movies (title text, release_year int, runtime int) ON COMMIT DROP"
+            )
+            for batch in _batched(new_movies.values(), self.batch_size):
+                copy_rows('stage_movies', ['title', 'release_year', 'runtime'], batch)
+            inserted = self._fetch(
+                "INSERT INTO movies (title, release_year, runtime, plot) "
+                "SELECT title, release_year, runtime, '' FROM stage_movies "
+                "RETURNING movie_id, title, release_year"
+            )
+        for movie_id, title, year in inserted:
+            existing[(title.casefold(), year)] = movie_id
+        self.stdout.write(f"Inserted {len(inserted)} movies.")
+
+        return {tconst: existing[key] for tconst, key in tconst_keys.items() if key in existing}
+
+    def load_credits(self, principals_path, names_path, movie_ids):
+        """Stage credits, upsert the people they mention and merge the credits."""
+        with transaction.atomic():
+            self._execute("CREATE TEMP TABLE stage_credits (movie_id int, nconst text, role text) ON COMMIT DROP")
+            self._execute(
+                "CREATE TEMP TABLE stage_people (nconst text, role text, name text, birth_year int) ON COMMIT DROP"
+            )
+
+            needed = {}
+            def credit_rows():
+                for row in _read_tsv(principals_path):
+                    movie_id = movie_ids.get(row['tconst'])
+                    if movie_id is None:
+                        continue
+                    category = row['category']
+                    if category in ACTOR_CATEGORIES:
+                        role = 'actor'
+                    elif category in DIRECTOR_CATEGORIES:
+                        role = 'director'
+                    else:
+                        continue
+                    needed.setdefault(row['nconst'], set()).add(role)
+                    yield (movie_id, row['nconst'], role)
+
+            staged = 0
+            for batch in _batched(credit_rows(), self.batch_size):
+                staged += copy_rows('stage_credits', ['movie_id', 'nconst', 'role'], batch)
+            self.stdout.write(f"Staged {staged} credits for {len(needed)} people.")
+
+            # People are keyed by (name, birth year): the INSERT below keeps
+            # one row per key and ON CONFLICT skips people already loaded.
+            distinct_people = set()
+            def people_rows():
+                for row in _read_tsv(names_path):
+                    roles = needed.get(row['nconst'])
+                    if not roles:
+                        continue
+                    birth_year = _int_or_none(row['birthYear'])
+                    if birth_year is not None and birth_year <= 1900:
+                        birth_year = None
+                    for role in roles:
+                        yield (row['nconst'], role, row['primaryName'], birth_year)
+                        distinct_people.add((row['primaryName'], birth_year, role))
+
+            for batch in _batched(people_rows(), self.batch_size):
+                copy_rows('stage_people', ['nconst', 'role', 'name', 'birth_year'], batch)
+            self._execute("ANALYZE stage_credits")
+            self._execute("ANALYZE stage_people")
+
+            for role, table in (('actor', 'actors'), ('director', 'directors')):
+                count = self._execute(
+                    f"INSERT INTO {table} (name, birth_year) "
+                    f"SELECT DISTINCT name, birth_year FROM stage_people WHERE role = %s AND birth_year IS NOT NULL "
+                    f"ON CONFLICT (name, birth_year) DO NOTHING",
+                    [role],
+                )
+                # NULL birth years never conflict, so unknown-year people are
+                # matched by name against rows that lack a birth year too
+                count += self._execute(
+                    f"INSERT INTO {table} (name, birth_year) "
+                    f"SELECT DISTINCT s.name, NULL::int FROM stage_people s "
+                    f"WHERE s.role = %s AND s.birth_year IS NULL AND NOT EXISTS ("
+                    f"SELECT 1 FROM {table} p WHERE p.name = s.name AND p.birth_year IS NULL)",
+                    [role],
+                )
+                self.stdout.write(f"Inserted {count} {table} "
+                                  f"({sum(1 for key in distinct_people if key[2] == role)} distinct in the dump).")
+
+            merged = 0
+            for role, table, credits in (('actor', 'actors', 'movie_actors'), ('director', 'directors', 'movie_directors')):
+                merged += self._execute(f"""
+                    INSERT INTO {credits} (movie_id, {role}_id)
+                    SELECT DISTINCT ON (c.movie_id, c.nconst) c.movie_id, p.{role}_id
+                    FROM stage_credits c
+                    JOIN stage_people s ON s.nconst = c.nconst AND s.role = c.role
+                    JOIN {table} p ON p.name = s.name AND (
+                        p.birth_year = s.birth_year OR (p.birth_year IS NULL AND s.birth_year IS NULL)
+                    )
+                    WHERE c.role = %s
+                    -- Legacy rows may share a name without a birth year; credit the oldest
+                    ORDER BY c.movie_id, c.nconst, p.{role}_id
+                    ON CONFLICT (movie_id, {role}_id) DO NOTHING
+                """, [role])
+            return merged
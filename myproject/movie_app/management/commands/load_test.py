@@ -0,0 +1,136 @@
+import http.client
+import statistics
+import threading
+import time
+import urllib.parse
+import urllib.request
+from http.cookiejar import CookieJar
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+DEFAULT_PATHS = ['/dashboard/', '/watch-history/', '/wrapped/']
+
+
+def login(base_url, username, password):
+    """Log in through the login form and return the Cookie header to reuse."""
+    jar = CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar))
+    opener.open(f'{base_url}/login/').read()
+    csrf = next((cookie.value for cookie in jar if cookie.name == 'csrftoken'), None)
+    if csrf is None:
+        raise CommandError(f"{base_url}/login/ did not set a csrftoken cookie.")
+    form = urllib.parse.urlencode({
+        'csrfmiddlewaretoken': csrf,
+        'username': username,
+        'password': password,
+    }).encode()
+    opener.open(urllib.request.Request(f'{base_url}/login/', data=form, headers={'Referer': f'{base_url}/login/'})).read()
+    if not any(cookie.name == 'sessionid' for cookie in jar):
+        raise CommandError(f"Could not log in to {base_url} as {username!r}.")
+    return '; '.join(f'{cookie.name}={cookie.value}' for cookie in jar)
+
+
+class Worker(threading.Thread):
+    """One keep-alive connection issuing GETs round-robin over `paths`."""
+
+    def __init__(self, base_url, cookie, paths, deadline, offset):
+        super().__init__(daemon=True)
+        parts = urllib.parse.urlsplit(base_url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.headers = {'Cookie': cookie}
+        self.paths = paths
+        self.deadline = deadline
+        self.offset = offset
+        self.latencies = []
+        self.errors = 0
+
+    def run(self):
+        conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        i = self.offset
+        while time.monotonic() < self.deadline:
+            path = self.paths[i % len(self.paths)]
+            i += 1
+            started = time.monotonic()
+            try:
+                conn.request('GET', path, headers=self.headers)
+                response = conn.getresponse()
+                response.read()
+            except (OSError, http.client.HTTPException):
+                self.errors += 1
+                conn.close()
+                conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+                continue
+            if response.status != 200:
+                self.errors += 1
+            else:
+                self.latencies.append(time.monotonic() - started)
+        conn.close()
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare requests/sec of the read pages across running deployments, "
+        "e.g. `gunicorn myproject.wsgi -w 4` against "
+        "`uvicorn myproject.asgi:application --workers 4`. Logs in as "
+        "USERNAME on each target and keeps CONCURRENCY connections busy for "
+        "DURATION seconds."
+    )
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--target',
+            action='append',
+            required=True,
+            metavar='NAME=URL',
+            help="deployment to test, e.g. wsgi=http://127.0.0.1:8000; repeat to compare",
+        )
+        parser.add_argument('--username', required=True)
+        parser.add_argument('--password', required=True)
+        parser.add_argument('--path', action='append', dest='paths', help="page to request; repeatable")
+        parser.add_argument('--concurrency', type=int, default=16)
+        parser.add_argument('--duration', type=float, default=10.0, help="seconds per target")
+        parser.add_argument('--warmup', type=float, default=2.0, help="seconds of unmeasured load first")
+
+    def handle(self, *args, **options):
+        paths = options['paths'] or DEFAULT_PATHS
+        results = []
+        for target in options['target']:
+            name, sep, base_url = target.partition('=')
+            if not sep:
+                name, base_url = target, target
+            base_url = base_url.rstrip('/')
+            cookie = login(base_url, options['username'], options['password'])
+
+            if options['warmup']:
+                self._run(base_url, cookie, paths, options['concurrency'], options['warmup'])
+            workers, elapsed = self._run(base_url, cookie, paths, options['concurrency'], options['duration'])
+
+            latencies = sorted(latency for worker in workers for latency in worker.latencies)
+            errors = sum(worker.errors for worker in workers)
+            rps = len(latencies) / elapsed
+            results.append((name, rps))
+            self.stdout.write(self.style.MIGRATE_HEADING(f"{name} ({base_url})"))
+            self.stdout.write(f"  {len(latencies)} requests, {errors} errors, {rps:.1f} req/s")
+            if latencies:
+                quantiles = statistics.quantiles(latencies, n=100) if len(latencies) > 1 else latencies * 99
+                self.stdout.write(
+                    f"  latency ms: p50={quantiles[49] * 1000:.1f} "
+                    f"p95={quantiles[94] * 1000:.1f} p99={quantiles[98] * 1000:.1f}"
+                )
+
+        if len(results) > 1 and results[0][1]:
+            baseline_name, baseline = results[0]
+            for name, rps in results[1:]:
+                self.stdout.write(self.style.SUCCESS(f"{name}: {rps / baseline:.2f}x the req/s of {baseline_name}"))
+
+    def _run(self, base_url, cookie, paths, concurrency, duration):
+        started = time.monotonic()
+        deadline = started + duration
+        workers = [Worker(base_url, cookie, paths, deadline, i) for i in range(concurrency)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return workers, time.monotonic() - started
@@ -0,0 +1,147 @@
+import time
+from datetime import date
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from movie_app import partitioning
+
+
+class Command(BaseCommand):
+    help = (
+        "Convert watch_history into a table hash-partitioned on user_id while "
+        "the site keeps running (see movie_app.partitioning). --prepare creates "
+        "the partitioned copy unless migration 0019 already did. A plain run "
+        "then backfills it in short batches and can be stopped and resumed at "
+        "any time. --swap puts it in place once the backfill is done. "
+        "PostgreSQL only."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--prepare', action='store_true', help="create the partitioned table and its sync trigger")
+        parser.add_argument(
+            '--partitions',
+            type=int,
+            default=settings.WATCH_HISTORY_PARTITIONS or 16,
+            help="hash partitions for --prepare (default WATCH_HISTORY_PARTITIONS, or 16)",
+        )
+        parser.add_argument(
+            '--by-year',
+            action='store_true',
+            default=settings.WATCH_HISTORY_PARTITION_BY_YEAR,
+            help="with --prepare, split each hash partition by watch_date year",
+        )
+        parser.add_argument('--batch-size', type=int, default=10000, help="watched_ids copied per transaction")
+        parser.add_argument('--sleep', type=float, default=0, help="seconds to pause between batches")
+        parser.add_argument('--verify', action='store_true', help="compare row counts before swapping (scans both tables)")
+        parser.add_argument('--swap', action='store_true', help="put the partitioned table in place after the backfill")
+        parser.add_argument('--lock-timeout', type=int, default=10, help="seconds --swap waits for its lock")
+        parser.add_argument(
+            '--years-ahead',
+            type=int,
+            help="create year partitions up to this many years past the current one",
+        )
+        parser.add_argument('--drop-old', action='store_true', help="drop the unpartitioned table kept by --swap")
+        parser.add_argument('--abort', action='store_true', help="drop the partitioned table before it is swapped in")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("partition_watch_history needs a PostgreSQL database.")
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1.")
+        try:
+            self.run(options)
+        except partitioning.PartitioningError as exc:
+            raise CommandError(str(exc))
+
+    def run(self, options):
+        if options['abort']:
+            with transaction.atomic(), connection.cursor() as cursor:
+                partitioning.abort(cursor)
+            self.stdout.write(self.style.SUCCESS(f"Dropped {partitioning.SHADOW}; watch_history is unchanged."))
+            return
+
+        if options['prepare']:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(f"SET LOCAL lock_timeout = '{options['lock_timeout']}s'")
+                partitioning.prepare(cursor, options['partitions'], options['by_year'])
+            layout = f"{options['partitions']} hash partitions" + (" by year" if options['by_year'] else "")
+            self.stdout.write(f"Created {partitioning.SHADOW} with {layout}.")
+
+        with connection.cursor() as cursor:
+            current = partitioning.state(cursor)
+        if current == 'prepared':
+            self.backfill(options)
+            if options['verify']:
+                self.verify()
+            if options['swap']:
+                self.swap(options)
+        elif options['swap'] or options['verify']:
+            hint = "it is already partitioned" if current == 'partitioned' else "run with --prepare first"
+            raise CommandError(f"Nothing to {'swap' if options['swap'] else 'verify'}: {hint}.")
+
+        if options['years_ahead'] is not None:
+            with transaction.atomic(), connection.cursor() as cursor:
+                created = partitioning.add_year_partitions(cursor, date.today().year + options['years_ahead'])
+            self.stdout.write(f"Created {created} year partitions.")
+
+        if options['drop_old']:
+            with connection.cursor() as cursor:
+                if partitioning.state(cursor) != 'partitioned':
+                    raise CommandError("Swap the partitioned table in before dropping the old one.")
+                dropped = partitioning.drop_old(cursor)
+            self.stdout.write(f"Dropped {partitioning.OLD}." if dropped else f"There is no {partitioning.OLD}.")
+
+        self.status()
+
+    def backfill(self, options):
+        started = time.monotonic()
+        total = 0
+        while True:
+            with transaction.atomic(), connection.cursor() as cursor:
+                copied, through, high = partitioning.backfill_batch(cursor, options['batch_size'])
+            total += copied
+            if through >= high:
+                break
+            self.stdout.write(f"  copied through id {through} of {high} ({total} rows)")
+            if options['sleep']:
+                time.sleep(options['sleep'])
+        if total:
+            self.stdout.write(f"Backfilled {total} rows in {time.monotonic() - started:.1f}s.")
+
+    def verify(self):
+        with connection.cursor() as cursor:
+            source, copied = partitioning.verify(cursor)
+        if source != copied:
+            raise CommandError(f"watch_history has {source} rows but {partitioning.SHADOW} has {copied}.")
+        self.stdout.write(self.style.SUCCESS(f"Both tables hold {source} rows."))
+
+    def swap(self, options):
+        started = time.monotonic()
+        with transaction.atomic(), connection.cursor() as cursor:
+            refresh = partitioning.swap(cursor, options['lock_timeout'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Swapped the partitioned table in; watch_history was locked for {time.monotonic() - started:.2f}s."
+        ))
+        with connection.cursor() as cursor:
+            for view in refresh:
+                self.stdout.write(f"Refreshing {view}...")
+                cursor.execute(f"REFRESH MATERIALIZED VIEW {connection.ops.quote_name(view)}")
+            # Autovacuum analyzes the partitions but never the parent
+            cursor.execute(f"ANALYZE {partitioning.TABLE}")
+
+    def status(self):
+        with connection.cursor() as cursor:
+            current = partitioning.state(cursor)
+            if current == 'partitioned':
+                self.stdout.write(f"watch_history is partitioned into {partitioning.leaf_partitions(cursor)} tables.")
+            elif current == 'prepared':
+                values = partitioning.progress(cursor)
+                done = 'done' if values['backfilled_through'] >= values['high_water'] else 'in progress'
+                self.stdout.write(
+                    f"watch_history is mirrored into {partitioning.SHADOW}; backfill {done} "
+                    f"(id {values['backfilled_through']} of {values['high_water']}). Run with --swap to finish."
+                )
+            else:
+                self.stdout.write("watch_history is not partitioned; run with --prepare to start.")
@@ -0,0 +1,51 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+
+class Command(BaseCommand):
+    help = (
+        "Refresh the wrapped_summary_mv materialized view read by the Wrapped "
+        "page when WRAPPED_SUMMARY_BACKEND = 'materialized'. PostgreSQL only."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--blocking',
+            action='store_true',
+            help="refresh without CONCURRENTLY (faster, but blocks readers while it runs)",
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=0,
+            help="keep running and refresh every INTERVAL seconds",
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("wrapped_summary_mv only exists on PostgreSQL.")
+
+        while True:
+            self.refresh(concurrently=not options['blocking'])
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def refresh(self, concurrently=True):
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT ispopulated FROM pg_matviews WHERE matviewname = 'wrapped_summary_mv'")
+            row = cursor.fetchone()
+            if row is None:
+                raise CommandError("wrapped_summary_mv does not exist; run migrate first.")
+            # CONCURRENTLY is only allowed once the view holds data
+            concurrently = concurrently and row[0]
+
+            started = time.monotonic()
+            cursor.execute(
+                f"REFRESH MATERIALIZED VIEW {'CONCURRENTLY ' if concurrently else ''}wrapped_summary_mv"
+            )
+        elapsed = time.monotonic() - started
+        mode = 'concurrently' if concurrently else 'blocking'
+        self.stdout.write(self.style.SUCCESS(f"Refreshed wrapped_summary_mv ({mode}) in {elapsed:.2f}s."))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from movie_app.sequences import repair_sequences
+
+
+class Command(BaseCommand):
+    help = (
+        "Move every movie_app serial sequence past the largest id in its "
+        "table. Safe to run any time: sequences are only ever moved forward. "
+        "PostgreSQL only."
+    )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("repair_sequences needs a PostgreSQL database.")
+        repaired = 0
+        for sequence, old, new in repair_sequences():
+            if new != old:
+                repaired += 1
+                self.stdout.write(f"{sequence}: {old} -> {new}")
+            else:
+                self.stdout.write(f"{sequence}: ok ({old})")
+        self.stdout.write(self.style.SUCCESS(f"Repaired {repaired} sequences."))
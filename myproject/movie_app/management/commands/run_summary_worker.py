@@ -0,0 +1,95 @@
+import logging
+import multiprocessing
+import os
+import signal
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+
+from movie_app.jobs import failed_summary_jobs, retry_failed_summary_jobs
+
+
+logger = logging.getLogger('movie_app.jobs')
+
+
+def work(name, batch_size, poll_interval, once, stop):
+    """Claim and run summary jobs until `stop` is set (or the queue drains, with once)."""
+    # Spawned children start without Django set up; forked ones already are
+    import django
+    django.setup()
+    from movie_app.jobs import claim_summary_jobs, run_summary_job
+
+    # Ctrl-C goes to the whole process group; let the parent decide when to stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+    done = failed = 0
+    while not stop.is_set():
+        jobs = claim_summary_jobs(batch_size)
+        if not jobs:
+            if once:
+                break
+            stop.wait(poll_interval)
+            continue
+        for job in jobs:
+            # Failures are logged by run_summary_job()
+            if run_summary_job(job):
+                done += 1
+            else:
+                failed += 1
+    connection.close()
+    logger.info("%s stopped after %d jobs (%d failed).", name, done, failed)
+
+
+class Command(BaseCommand):
+    help = (
+        "Run WrappedSummary recomputes queued by the views when "
+        "SUMMARY_UPDATES = 'queue'. Starts one worker process per CPU by "
+        "default; workers claim jobs with FOR UPDATE SKIP LOCKED."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--batch-size', type=int, default=20, help="jobs claimed per round trip")
+        parser.add_argument('--poll-interval', type=float, default=1.0, help="seconds to sleep when the queue is empty")
+        parser.add_argument('--once', action='store_true', help="exit once the queue is empty")
+        parser.add_argument(
+            '--retry-failed',
+            action='store_true',
+            help="first give jobs that used up SUMMARY_JOB_MAX_ATTEMPTS another round of attempts",
+        )
+
+    def handle(self, *args, **options):
+        if options['retry_failed']:
+            self.stdout.write(f"Retrying {retry_failed_summary_jobs()} failed summary jobs.")
+        failed = failed_summary_jobs().count()
+        if failed:
+            self.stderr.write(self.style.WARNING(
+                f"{failed} summary jobs failed {settings.SUMMARY_JOB_MAX_ATTEMPTS} times and are no longer "
+                "run; see their last_error in the admin, then retry them there or with --retry-failed."
+            ))
+
+        stop = multiprocessing.Event()
+        worker_args = (options['batch_size'], options['poll_interval'], options['once'], stop)
+
+        # Forked children must not share the parent's database connection
+        connections.close_all()
+        workers = [
+            multiprocessing.Process(target=work, args=(f'worker-{i}',) + worker_args)
+            for i in range(max(options['processes'], 1))
+        ]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f"Started {len(workers)} summary workers.")
+
+        signal.signal(signal.SIGTERM, lambda signum, frame: stop.set())
+        try:
+            while any(worker.is_alive() for worker in workers):
+                time.sleep(0.5)
+        except KeyboardInterrupt:
+            self.stdout.write("Stopping workers after their current batch...")
+            stop.set()
+        for worker in workers:
+            worker.join()
+        self.stdout.write(self.style.SUCCESS("Summary workers stopped."))
@@ -0,0 +1,362 @@
+import itertools
+import random
+import time
+from datetime import date, timedelta
+
+from django.contrib.auth.models import User as AuthUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import CASCADE, SET_NULL
+from django.db.models.deletion import get_candidate_relations_to_delete
+
+from movie_app.bulk import column_max_length, copy_rows
+from movie_app.dashboard import invalidate_dashboard
+from movie_app.fragments import bump_history_version
+from movie_app.identity import UNUSABLE_PASSWORD
+from movie_app.models import Actor, Director, Movie, User as CustomUser
+from movie_app.sequences import repair_sequences
+
+
+ADJECTIVES = [
+    'Silent', 'Broken', 'Golden', 'Last', 'Hidden', 'Crimson', 'Lonely', 'Electric', 'Frozen', 'Burning',
+    'Midnight', 'Savage', 'Gentle', 'Distant', 'Wild', 'Hollow', 'Secret', 'Endless', 'Fallen', 'Velvet',
+]
+NOUNS = [
+    'River', 'Empire', 'Garden', 'Signal', 'Harbor', 'Kingdom', 'Machine', 'Summer', 'Shadow', 'Horizon',
+    'Orchard', 'Frontier', 'Station', 'Letter', 'Mirror', 'Storm', 'Island', 'Highway', 'Circus', 'Promise',
+]
+SEQUELS = ['', '', '', '', ' II', ' III', ': Reckoning', ': Origins']
+REVIEWS = [
+    "Loved every minute of it.",
+    "Beautifully shot, but the second half drags.",
+    "Not for me.",
+    "A rewatch that holds up.",
+    "The score alone is worth it.",
+]
+REVIEW_SHARE = 0.15
+
+
+def _like_prefix(prefix):
+    """LIKE pattern matching strings that start with prefix."""
+    return prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+
+
+def _cumulative(weights):
+    return list(itertools.accumulate(weights))
+
+
+def _zipf_weights(n, exponent, rng):
+    """Zipf weights 1/rank**exponent, shuffled so popularity is unrelated to id."""
+    weights = [1 / rank ** exponent for rank in range(1, n + 1)]
+    rng.shuffle(weights)
+    return weights
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill the database with a synthetic catalog and watch history for "
+        "benchmarking: Zipf-distributed movie popularity, Pareto-distributed "
+        "(heavy-tailed) user activity, COPY-loaded in batches, with summaries "
+        "and monthly rollups built set-based afterwards. Synthetic users are "
+        "named PREFIX-0000001 and so on, and --clear removes everything a "
+        "previous run created (including any watch history on synthetic "
+        "movies). The same --seed gives the same data. PostgreSQL only."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--watches', type=int, default=100000, help="watch_history rows to generate")
+        parser.add_argument('--users', type=int, help="users to spread them over; default WATCHES / 100")
+        parser.add_argument('--movies', type=int, default=20000)
+        parser.add_argument('--actors', type=int, default=30000)
+        parser.add_argument('--directors', type=int, default=3000)
+        parser.add_argument('--cast-size', type=int, default=8, help="average actors credited per movie")
+        parser.add_argument('--years', type=int, default=5, help="spread watch dates over this many years")
+        parser.add_argument(
+            '--movie-skew',
+            type=float,
+            default=1.0,
+            help="Zipf exponent of movie (and actor) popularity; higher is more concentrated",
+        )
+        parser.add_argument(
+            '--user-skew',
+            type=float,
+            default=1.5,
+            help="Pareto shape of user activity; lower gives heavier heavy users",
+        )
+        parser.add_argument('--seed', type=int, default=412)
+        parser.add_argument('--prefix', default='synth', help="usernames are PREFIX-0000001 and so on")
+        parser.add_argument('--batch-size', type=int, default=100000)
+        parser.add_argument('--clear', action='store_true', help="remove a previous run's data first")
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError("seed_synthetic needs a PostgreSQL database.")
+        if options['watches'] < 0 or options['movies'] < 1 or options['actors'] < 1 or options['directors'] < 1:
+            raise CommandError("--watches must be >= 0 and --movies, --actors and --directors >= 1.")
+        self.prefix = options['prefix']
+        self.marker = f'[{self.prefix}]'
+        self.batch_size = options['batch_size']
+        self.rng = random.Random(options['seed'])
+        users = max(1, options['users'] or options['watches'] // 100)
+        self.user_width = max(7, len(str(users)))
+        longest = len(self.prefix) + 1 + self.user_width
+        max_length = column_max_length('users', 'user_id')
+        if max_length and longest > max_length:
+            raise CommandError(f"users.user_id holds {max_length} characters; use a prefix of at most "
+                               f"{max_length - 1 - self.user_width}.")
+        started = time.monotonic()
+
+        if options['clear']:
+            self.clear()
+            self.stdout.write(f"Removed the previous synthetic data ({time.monotonic() - started:.1f}s).")
+        elif CustomUser.objects.filter(user_id__startswith=f'{self.prefix}-').exists():
+            raise CommandError(f"Synthetic users named {self.prefix}-* already exist; pass --clear to replace them.")
+        repair_sequences()
+
+        movies, quality = self.seed_catalog(options)
+        self.stdout.write(f"Created {len(movies)} movies and their credits ({time.monotonic() - started:.1f}s).")
+
+        user_ids, bias = self.seed_users(users)
+        watches = self.seed_watches(options, movies, quality, user_ids, bias)
+        self.stdout.write(f"Copied {watches} watch history rows ({time.monotonic() - started:.1f}s).")
+
+        self.build_derived()
+        for user_id in user_ids:
+            invalidate_dashboard(user_id)
+            bump_history_version(user_id)
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {users} users and {watches} watches in {time.monotonic() - started:.1f}s."
+        ))
+
+    def _execute(self, sql, params=None):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.rowcount
+
+    def _ids(self, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return [row[0] for row in cursor.fetchall()]
+
+    def _delete(self, model, where, params):
+        """DELETE model's rows matching where, cascading like the ORM but in SQL."""
+        opts = model._meta
+        table, pk = connection.ops.quote_name(opts.db_table), connection.ops.quote_name(opts.pk.column)
+        selected = f"SELECT {pk} FROM {table} WHERE {where}"
+        for relation in get_candidate_relations_to_delete(opts):
+            related = relation.related_model._meta
+            if not related.managed:
+                continue
+            column = connection.ops.quote_name(relation.field.column)
+            on_delete = relation.on_delete
+            if on_delete is CASCADE:
+                self._delete(relation.related_model, f"{column} IN ({selected})", params)
+            elif on_delete is SET_NULL:
+                self._execute(
+                    f"UPDATE {connection.ops.quote_name(related.db_table)} SET {column} = NULL "
+                    f"WHERE {column} IN ({selected})",
+                    params,
+                )
+        self._execute(f"DELETE FROM {table} WHERE {where}", params)
+
+    def clear(self):
+        with transaction.atomic():
+            users = _like_prefix(f'{self.prefix}-')
+            user_ids = self._ids("SELECT user_id FROM users WHERE user_id LIKE %s", [users])
+            self._delete(CustomUser, "user_id LIKE %s", [users])
+            self._delete(AuthUser, "username LIKE %s", [users])
+            self._delete(Movie, "plot = %s", [self.marker])
+            self._delete(Actor, "name LIKE %s", [_like_prefix(f'{self.prefix} actor ')])
+            self._delete(Director, "name LIKE %s", [_like_prefix(f'{self.prefix} director ')])
+        for user_id in user_ids:
+            invalidate_dashboard(user_id)
+            bump_history_version(user_id)
+
+    def _copy(self, table, columns, rows):
+        count = 0
+        for start in range(0, len(rows), self.batch_size):
+            count += copy_rows(table, columns, rows[start:start + self.batch_size])
+        return count
+
+    def seed_catalog(self, options):
+        """Create movies, actors, directors and credits; return (movie ids, movie quality)."""
+        rng = self.rng
+        this_year = date.today().year
+        with transaction.atomic():
+            self._copy('movies', ['title', 'release_year', 'plot', 'runtime'], [
+                (
+                    f"The {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}{rng.choice(SEQUELS)}",
+                    max(1920, this_year - int(rng.expovariate(1 / 15))),
+                    self.marker,
+                    str(rng.randint(75, 180)),
+                )
+                for _ in range(options['movies'])
+            ])
+            movies = self._ids("SELECT movie_id FROM movies WHERE plot = %s ORDER BY movie_id", [self.marker])
+
+            people = {}
+            for role, table, count in (
+                ('actor', 'actors', options['actors']),
+                ('director', 'directors', options['directors']),
+            ):
+                self._copy(table, ['name', 'birth_year'], [
+                    (f'{self.prefix} {role} {i}', rng.randint(1930, 2005)) for i in range(1, count + 1)
+                ])
+                people[role] = self._ids(
+                    f"SELECT {role}_id FROM {table} WHERE name LIKE %s ORDER BY {role}_id",
+                    [_like_prefix(f'{self.prefix} {role} ')],
+                )
+
+            # A few actors and directors appear in far more movies than the rest
+            actor_weights = _cumulative(_zipf_weights(len(people['actor']), options['movie_skew'], rng))
+            director_weights = _cumulative(_zipf_weights(len(people['director']), options['movie_skew'], rng))
+            cast, directing = [], []
+            for movie_id in movies:
+                size = max(1, min(len(people['actor']), rng.randint(1, 2 * options['cast_size'] - 1)))
+                credited = set(rng.choices(people['actor'], cum_weights=actor_weights, k=size))
+                cast.extend((movie_id, actor_id) for actor_id in credited)
+                directors = set(rng.choices(people['director'], cum_weights=director_weights, k=2 if rng.random() < 0.1 else 1))
+                directing.extend((movie_id, director_id) for director_id in directors)
+            self._copy('movie_actors', ['movie_id', 'actor_id'], cast)
+            self._copy('movie_directors', ['movie_id', 'director_id'], directing)
+
+        quality = {movie_id: rng.gauss(6.5, 1.3) for movie_id in movies}
+        return movies, quality
+
+    def seed_users(self, count):
+        """Create auth accounts and profiles; return (user ids, per-user rating bias)."""
+        user_ids = [f'{self.prefix}-{i:0{self.user_width}d}' for i in range(1, count + 1)]
+        joined = date.today().isoformat()
+        with transaction.atomic():
+            self._copy(
+                'auth_user',
+                ['password', 'is_superuser', 'username', 'first_name', 'last_name', 'email', 'is_staff', 'is_active',
+                 'date_joined'],
+                [(UNUSABLE_PASSWORD, False, user_id, '', '', '', False, True, joined) for user_id in user_ids],
+            )
+            self._copy(
+                'users',
+                ['user_id', 'password', 'name', 'birthday', 'profile_picture'],
+                [
+                    (user_id, UNUSABLE_PASSWORD, user_id, date(self.rng.randint(1950, 2008), 1, 1).isoformat(), '')
+                    for user_id in user_ids
+                ],
+            )
+        bias = [self.rng.gauss(0, 1) for _ in user_ids]
+        return user_ids, bias
+
+    def seed_watches(self, options, movies, quality, user_ids, bias):
+        """COPY watch history in batches, one transaction per batch."""
+        rng = self.rng
+        movie_weights = _cumulative(_zipf_weights(len(movies), options['movie_skew'], rng))
+        user_weights = _cumulative([rng.paretovariate(options['user_skew']) for _ in user_ids])
+        users = range(len(user_ids))
+        today = date.today()
+        days = max(1, options['years'] * 365)
+        columns = ['user_id', 'movie_id', 'watch_date', 'rating', 'review']
+
+        remaining = options['watches']
+        copied = 0
+        while remaining > 0:
+            size = min(remaining, self.batch_size)
+            batch = []
+            for user, movie_id in zip(
+                rng.choices(users, cum_weights=user_weights, k=size),
+                rng.choices(movies, cum_weights=movie_weights, k=size),
+            ):
+                rating = min(10, max(1, round(quality[movie_id] + bias[user] + rng.gauss(0, 1.5))))
+                batch.append((
+                    user_ids[user],
+                    movie_id,
+                    (today - timedelta(days=rng.randrange(days))).isoformat(),
+                    rating,
+                    rng.choice(REVIEWS) if rng.random() < REVIEW_SHARE else '',
+                ))
+            with transaction.atomic():
+                copied += copy_rows('watch_history', columns, batch)
+            remaining -= size
+            self.stdout.write(f"  copied {copied} rows")
+        return copied
+
+    def build_derived(self):
+        """Build summaries, actor counts and monthly rollups for the synthetic users in SQL.
+
+        This is what rebuild_wrapped_summary() and rebuild_rollups() would
+        produce, computed for all seeded users at once.
+        """
+        pattern = _like_prefix(f'{self.prefix}-')
+        month = "date_trunc('month', watch_date)::date"
+        statements = [
+            """
+            INSERT INTO user_actor_counts (user_id, actor_id, appearances)
+            SELECT wh.user_id, ma.actor_id, COUNT(*)
+            FROM watch_history wh JOIN movie_actors ma ON ma.movie_id = wh.movie_id
+            WHERE wh.user_id LIKE %(pattern)s
+            GROUP BY 1, 2
+            """,
+            """
+            INSERT INTO wrapped_summary
+                (user_id, top_actor, total_movies_watched, avg_rating, highest_rated_movie, rating_sum,
+                 highest_rated_watched_id, highest_rating, highest_rated_date, top_actor_ref_id, top_actor_count,
+                 incremental_ready)
+            SELECT u.user_id, COALESCE(a.name, 'N/A'), COALESCE(t.total, 0), ROUND(t.avg_rating::numeric, 2), m.title,
+                   COALESCE(t.rating_sum, 0), b.watched_id, b.rating, b.watch_date, top.actor_id,
+                   COALESCE(top.appearances, 0), TRUE
+            FROM users u
+            LEFT JOIN (
+                SELECT user_id, COUNT(*) AS total, SUM(rating) AS rating_sum, AVG(rating) AS avg_rating
+                FROM watch_history WHERE user_id LIKE %(pattern)s GROUP BY 1
+            ) t ON t.user_id = u.user_id
+            LEFT JOIN (
+                SELECT DISTINCT ON (user_id) user_id, watched_id, rating, watch_date, movie_id
+                FROM watch_history WHERE user_id LIKE %(pattern)s
+                ORDER BY user_id, rating DESC, watch_date DESC, watched_id DESC
+            ) b ON b.user_id = u.user_id
+            LEFT JOIN movies m ON m.movie_id = b.movie_id
+            LEFT JOIN (
+                SELECT DISTINCT ON (user_id) user_id, actor_id, appearances
+                FROM user_actor_counts WHERE user_id LIKE %(pattern)s
+                ORDER BY user_id, appearances DESC, actor_id
+            ) top ON top.user_id = u.user_id
+            LEFT JOIN actors a ON a.actor_id = top.actor_id
+            WHERE u.user_id LIKE %(pattern)s
+            """,
+            f"""
+            INSERT INTO user_monthly_rollups
+                (user_id, month, watch_count, rating_sum, best_watched_id, best_rating, best_date, best_movie_id)
+            SELECT totals.user_id, totals.month, totals.watch_count, totals.rating_sum,
+                   best.watched_id, best.rating, best.watch_date, best.movie_id
+            FROM (
+                SELECT user_id, {month} AS month, COUNT(*) AS watch_count, SUM(rating) AS rating_sum
+                FROM watch_history WHERE user_id LIKE %(pattern)s GROUP BY 1, 2
+            ) totals
+            JOIN (
+                SELECT DISTINCT ON (user_id, {month}) user_id, {month} AS month, watched_id, rating, watch_date, movie_id
+                FROM watch_history WHERE user_id LIKE %(pattern)s
+                ORDER BY user_id, {month}, rating DESC, watch_date DESC, watched_id DESC
+            ) best USING (user_id, month)
+            """,
+            """
+            INSERT INTO user_monthly_actor_counts (user_id, month, actor_id, appearances)
+            SELECT wh.user_id, date_trunc('month', wh.watch_date)::date, ma.actor_id, COUNT(*)
+            FROM watch_history wh JOIN movie_actors ma ON ma.movie_id = wh.movie_id
+            WHERE wh.user_id LIKE %(pattern)s
+            GROUP BY 1, 2, 3
+            """,
+            """
+            INSERT INTO user_monthly_director_counts (user_id, month, director_id, appearances)
+            SELECT wh.user_id, date_trunc('month', wh.watch_date)::date, md.director_id, COUNT(*)
+            FROM watch_history wh JOIN movie_directors md ON md.movie_id = wh.movie_id
+            WHERE wh.user_id LIKE %(pattern)s
+            GROUP BY 1, 2, 3
+            """,
+        ]
+        # Fresh statistics for the loaded tables first, so the joins below are planned for their real size
+        for table in ('users', 'movies', 'actors', 'directors', 'movie_actors', 'movie_directors', 'watch_history'):
+            self._execute(f"ANALYZE {table}")
+        with transaction.atomic():
+            for sql in statements:
+                self._execute(sql, {'pattern': pattern})
+        for table in ('wrapped_summary', 'user_actor_counts', 'user_monthly_rollups', 'user_monthly_actor_counts',
+                      'user_monthly_director_counts'):
+            self._execute(f"ANALYZE {table}")
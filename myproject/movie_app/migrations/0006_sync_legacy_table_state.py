@@ -0,0 +1,55 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    """Point the migration state at the hand-built tables.
+
+    The tables in DB_Final_Movie_Analysis.sql are created outside of Django,
+    so this only updates the model state (table names and columns) to match
+    models.py. No SQL is run. Later migrations can then safely alter the
+    real tables.
+    """
+
+    dependencies = [
+        ('movie_app', '0005_remove_wrapped_legacy_fields'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.RemoveField(model_name='actor', name='birthyear'),
+                migrations.AddField(
+                    model_name='actor',
+                    name='birth_year',
+                    field=models.IntegerField(blank=True, db_column='birth_year', null=True),
+                ),
+                migrations.RemoveField(model_name='director', name='birthyear'),
+                migrations.AddField(
+                    model_name='director',
+                    name='birth_year',
+                    field=models.IntegerField(blank=True, db_column='birth_year', null=True),
+                ),
+                migrations.RemoveField(model_name='movie', name='genre'),
+                migrations.RemoveField(model_name='movie', name='rating'),
+                migrations.RemoveField(model_name='user', name='birthyear'),
+                migrations.AddField(
+                    model_name='user',
+                    name='birthday',
+                    field=models.DateField(db_column='birthday'),
+                    preserve_default=False,
+                ),
+                migrations.AlterField(
+                    model_name='watchhistory',
+                    name='watched_id',
+                    field=models.AutoField(db_column='watched_id', primary_key=True, serialize=False),
+                ),
+                migrations.AlterModelTable(name='actor', table='actors'),
+                migrations.AlterModelTable(name='castcrew', table='cast_crew'),
+                migrations.AlterModelTable(name='director', table='directors'),
+                migrations.AlterModelTable(name='movie', table='movies'),
+                migrations.AlterModelTable(name='user', table='users'),
+                migrations.AlterModelTable(name='watchhistory', table='watch_history'),
+                migrations.AlterModelTable(name='wrappedsummary', table='wrapped_summary'),
+            ],
+        ),
+    ]
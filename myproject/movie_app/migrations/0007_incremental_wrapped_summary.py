@@ -0,0 +1,63 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:17
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movie_app', '0006_sync_legacy_table_state'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wrappedsummary',
+            name='highest_rated_date',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='wrappedsummary',
+            name='highest_rated_watched_id',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='wrappedsummary',
+            name='highest_rating',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='wrappedsummary',
+            name='incremental_ready',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='wrappedsummary',
+            name='rating_sum',
+            field=models.FloatField(default=0),
+        ),
+        migrations.AddField(
+            model_name='wrappedsummary',
+            name='top_actor_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='wrappedsummary',
+            name='top_actor_ref',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='movie_app.actor'),
+        ),
+        migrations.CreateModel(
+            name='ActorAppearance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('appearances', models.IntegerField(default=0)),
+                ('actor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='movie_app.actor')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='movie_app.user')),
+            ],
+            options={
+                'db_table': 'user_actor_counts',
+                'indexes': [models.Index(fields=['user', '-appearances'], name='user_actor_counts_top_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'actor'), name='user_actor_counts_user_actor_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+from django.db import migrations
+
+
+def create_title_index(apps, schema_editor):
+    # Trigram indexes are Postgres-only; other backends just scan.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm'")
+        has_trgm = cursor.fetchone() is not None
+    if has_trgm:
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        # Matches the UPPER(title) LIKE ... that istartswith/icontains generate
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS movies_title_upper_trgm_idx "
+            "ON movies USING gin (UPPER(title::text) gin_trgm_ops)"
+        )
+    else:
+        # Without pg_trgm, at least serve the prefix (istartswith) lookups
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS movies_title_upper_prefix_idx "
+            "ON movies (UPPER(title::text) text_pattern_ops)"
+        )
+
+
+def drop_title_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("DROP INDEX IF EXISTS movies_title_upper_trgm_idx")
+    schema_editor.execute("DROP INDEX IF EXISTS movies_title_upper_prefix_idx")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movie_app', '0007_incremental_wrapped_summary'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_title_index, drop_title_index),
+    ]
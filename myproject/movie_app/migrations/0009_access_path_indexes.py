@@ -0,0 +1,70 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+# The legacy tables only have primary keys. These indexes match the access
+# paths used by the views. They are built CONCURRENTLY so the migration does
+# not block writes on a live database, which means it cannot run inside a
+# transaction.
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('movie_app', '0008_movie_title_trigram_index'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='castcrew',
+            index=models.Index(fields=['movie', 'actor'], name='cast_crew_movie_actor_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='movie',
+            index=models.Index(fields=['title'], name='movies_title_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='watchhistory',
+            index=models.Index(fields=['user', '-watch_date', '-watched_id'], include=('movie', 'rating'), name='watch_history_user_date_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='watchhistory',
+            index=models.Index(fields=['user', '-rating', '-watch_date', '-watched_id'], name='watch_history_user_rating_idx'),
+        ),
+        # Keep the oldest summary per user (the one the app reads) so the
+        # unique index can be built, then attach the index as a constraint.
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    sql="""
+                        DELETE FROM wrapped_summary w
+                        USING wrapped_summary older
+                        WHERE w.user_id = older.user_id
+                          AND w.summary_id > older.summary_id
+                    """,
+                    reverse_sql=migrations.RunSQL.noop,
+                ),
+                migrations.RunSQL(
+                    sql=(
+                        "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS wrapped_summary_user_uniq "
+                        "ON wrapped_summary (user_id)"
+                    ),
+                    reverse_sql="DROP INDEX CONCURRENTLY IF EXISTS wrapped_summary_user_uniq",
+                ),
+                migrations.RunSQL(
+                    sql=(
+                        "ALTER TABLE wrapped_summary ADD CONSTRAINT wrapped_summary_user_uniq "
+                        "UNIQUE USING INDEX wrapped_summary_user_uniq"
+                    ),
+                    reverse_sql="ALTER TABLE wrapped_summary DROP CONSTRAINT IF EXISTS wrapped_summary_user_uniq",
+                ),
+            ],
+            state_operations=[
+                migrations.AddConstraint(
+                    model_name='wrappedsummary',
+                    constraint=models.UniqueConstraint(fields=('user',), name='wrapped_summary_user_uniq'),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:22
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Every user's summary in one set-based pass. Ties are broken the same way as
+# movie_app.summary: rating, then watch date, then watched_id; and for actors,
+# appearances then the lowest actor_id.
+CREATE_VIEW_SQL = """
+CREATE MATERIALIZED VIEW IF NOT EXISTS wrapped_summary_mv AS
+WITH totals AS (
+    SELECT user_id,
+           COUNT(*) AS total_movies_watched,
+           ROUND(AVG(rating)::numeric, 2) AS avg_rating
+    FROM watch_history
+    GROUP BY user_id
+),
+best AS (
+    SELECT DISTINCT ON (wh.user_id) wh.user_id, m.title
+    FROM watch_history wh
+    JOIN movies m ON m.movie_id = wh.movie_id
+    ORDER BY wh.user_id, wh.rating DESC, wh.watch_date DESC, wh.watched_id DESC
+),
+actor_counts AS (
+    SELECT wh.user_id, cc.actor_id, COUNT(*) AS appearances
+    FROM watch_history wh
+    JOIN cast_crew cc ON cc.movie_id = wh.movie_id
+    GROUP BY wh.user_id, cc.actor_id
+),
+top_actor AS (
+    SELECT DISTINCT ON (ac.user_id) ac.user_id, a.name
+    FROM actor_counts ac
+    JOIN actors a ON a.actor_id = ac.actor_id
+    ORDER BY ac.user_id, ac.appearances DESC, ac.actor_id
+)
+SELECT t.user_id,
+       COALESCE(ta.name, 'N/A') AS top_actor,
+       t.total_movies_watched,
+       t.avg_rating,
+       b.title AS highest_rated_movie
+FROM totals t
+LEFT JOIN best b ON b.user_id = t.user_id
+LEFT JOIN top_actor ta ON ta.user_id = t.user_id
+WITH NO DATA
+"""
+
+
+def create_view(apps, schema_editor):
+    # Materialized views are Postgres-only; other backends keep using the
+    # incrementally maintained wrapped_summary table.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(CREATE_VIEW_SQL)
+    # REFRESH ... CONCURRENTLY needs a unique index
+    schema_editor.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS wrapped_summary_mv_user_id_uniq ON wrapped_summary_mv (user_id)"
+    )
+
+
+def drop_view(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute("DROP MATERIALIZED VIEW IF EXISTS wrapped_summary_mv")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movie_app', '0009_access_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WrappedSummarySnapshot',
+            fields=[
+                ('user', models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, primary_key=True, serialize=False, to='movie_app.user')),
+                ('top_actor', models.CharField(max_length=100)),
+                ('total_movies_watched', models.IntegerField()),
+                ('avg_rating', models.DecimalField(blank=True, decimal_places=2, max_digits=4, null=True)),
+                ('highest_rated_movie', models.CharField(blank=True, max_length=200, null=True)),
+            ],
+            options={
+                'db_table': 'wrapped_summary_mv',
+                'managed': False,
+            },
+        ),
+        migrations.RunPython(create_view, drop_view),
+    ]
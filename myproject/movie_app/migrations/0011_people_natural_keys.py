@@ -0,0 +1,119 @@
+from django.db import migrations, models
+
+
+# Merge actors/directors that share a name and a known birth year into the
+# row with the lowest id, so a unique index on that natural key can be built.
+# The catalog loader relies on it for ON CONFLICT upserts. Rows without a
+# birth year are left alone: a shared name alone does not make them the same
+# person, and the unique index treats their NULLs as distinct.
+MERGE_SQL = {
+    'actors': [
+        """
+        CREATE TEMP TABLE people_merge AS
+        SELECT actor_id AS old_id, keep_id FROM (
+            SELECT actor_id, MIN(actor_id) OVER (PARTITION BY name, birth_year) AS keep_id
+            FROM actors
+            WHERE birth_year IS NOT NULL
+        ) ranked
+        WHERE actor_id <> keep_id
+        """,
+        "UPDATE cast_crew c SET actor_id = m.keep_id FROM people_merge m WHERE c.actor_id = m.old_id",
+        # Per-user counters for merged actors are dropped and those users'
+        # summaries are flagged so their next write rebuilds them.
+        """
+        UPDATE wrapped_summary SET incremental_ready = false
+        WHERE user_id IN (
+            SELECT u.user_id FROM user_actor_counts u JOIN people_merge m ON u.actor_id = m.old_id
+        )
+        """,
+        "DELETE FROM user_actor_counts u USING people_merge m WHERE u.actor_id = m.old_id",
+        "UPDATE wrapped_summary w SET top_actor_ref_id = m.keep_id FROM people_merge m WHERE w.top_actor_ref_id = m.old_id",
+        "DELETE FROM actors a USING people_merge m WHERE a.actor_id = m.old_id",
+    ],
+    'directors': [
+        """
+        CREATE TEMP TABLE people_merge AS
+        SELECT director_id AS old_id, keep_id FROM (
+            SELECT director_id, MIN(director_id) OVER (PARTITION BY name, birth_year) AS keep_id
+            FROM directors
+            WHERE birth_year IS NOT NULL
+        ) ranked
+        WHERE director_id <> keep_id
+        """,
+        "UPDATE cast_crew c SET director_id = m.keep_id FROM people_merge m WHERE c.director_id = m.old_id",
+        "DELETE FROM directors d USING people_merge m WHERE d.director_id = m.old_id",
+    ],
+}
+
+# Repointing can leave identical (movie, actor, director) rows behind
+DEDUPE_CAST_SQL = [
+    """
+    UPDATE wrapped_summary SET incremental_ready = false
+    WHERE user_id IN (
+        SELECT wh.user_id FROM watch_history wh
+        WHERE wh.movie_id IN (
+            SELECT c.movie_id FROM cast_crew c
+            GROUP BY c.movie_id, c.actor_id, c.director_id HAVING COUNT(*) > 1
+        )
+    )
+    """,
+    """
+    DELETE FROM cast_crew c USING cast_crew older
+    WHERE c.movie_id = older.movie_id
+      AND c.actor_id = older.actor_id
+      AND c.director_id = older.director_id
+      AND c.movie_cast_id > older.movie_cast_id
+    """,
+]
+
+
+def merge_duplicate_people(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table in ('actors', 'directors'):
+        for sql in MERGE_SQL[table]:
+            schema_editor.execute(sql)
+        schema_editor.execute("DROP TABLE people_merge")
+    for sql in DEDUPE_CAST_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('movie_app', '0010_wrapped_summary_materialized_view'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_people, migrations.RunPython.noop, atomic=True),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunSQL(
+                    sql=(
+                        "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS actors_name_birth_year_uniq "
+                        "ON actors (name, birth_year)"
+                    ),
+                    reverse_sql="DROP INDEX CONCURRENTLY IF EXISTS actors_name_birth_year_uniq",
+                ),
+                migrations.RunSQL(
+                    sql=(
+                        "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS directors_name_birth_year_uniq "
+                        "ON directors (name, birth_year)"
+                    ),
+                    reverse_sql="DROP INDEX CONCURRENTLY IF EXISTS directors_name_birth_year_uniq",
+                ),
+            ],
+            state_operations=[
+                migrations.AddConstraint(
+                    model_name='actor',
+                    constraint=models.UniqueConstraint(fields=['name', 'birth_year'], name='actors_name_birth_year_uniq'),
+                ),
+                migrations.AddConstraint(
+                    model_name='director',
+                    constraint=models.UniqueConstraint(fields=['name', 'birth_year'], name='directors_name_birth_year_uniq'),
+                ),
+            ],
+        ),
+    ]
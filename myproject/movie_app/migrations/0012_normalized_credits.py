@@ -0,0 +1,251 @@
+import django.db.models.deletion
+from django.db import migrations, models, transaction
+
+# Movies per INSERT ... SELECT batch when copying cast_crew, so a large
+# table is rewritten in short transactions instead of one long one. The
+# legacy columns are nullable; a credit missing its person is not copied.
+BATCH_SIZE = 5000
+
+COPY_SQL = [
+    """
+    INSERT INTO movie_actors (movie_id, actor_id)
+    SELECT DISTINCT movie_id, actor_id FROM cast_crew
+    WHERE movie_id >= %s AND movie_id < %s AND actor_id IS NOT NULL
+    ON CONFLICT DO NOTHING
+    """,
+    """
+    INSERT INTO movie_directors (movie_id, director_id)
+    SELECT DISTINCT movie_id, director_id FROM cast_crew
+    WHERE movie_id >= %s AND movie_id < %s AND director_id IS NOT NULL
+    ON CONFLICT DO NOTHING
+    """,
+]
+
+# Appearance counters used to count cast_crew rows, i.e. once per director.
+# Recount them from the new credits and re-pick each user's top actor with
+# the same tie-break as movie_app.summary.
+RECOUNT_SQL = [
+    "DELETE FROM user_actor_counts",
+    """
+    INSERT INTO user_actor_counts (user_id, actor_id, appearances)
+    SELECT wh.user_id, ma.actor_id, COUNT(*)
+    FROM watch_history wh
+    JOIN movie_actors ma ON ma.movie_id = wh.movie_id
+    WHERE wh.user_id IS NOT NULL
+    GROUP BY wh.user_id, ma.actor_id
+    """,
+    """
+    UPDATE wrapped_summary SET top_actor_ref_id = (
+        SELECT u.actor_id FROM user_actor_counts u
+        WHERE u.user_id = wrapped_summary.user_id
+        ORDER BY u.appearances DESC, u.actor_id
+        LIMIT 1
+    )
+    """,
+    """
+    UPDATE wrapped_summary SET
+        top_actor_count = COALESCE((
+            SELECT u.appearances FROM user_actor_counts u
+            WHERE u.user_id = wrapped_summary.user_id AND u.actor_id = wrapped_summary.top_actor_ref_id
+        ), 0),
+        top_actor = COALESCE((
+            SELECT a.name FROM actors a WHERE a.actor_id = wrapped_summary.top_actor_ref_id
+        ), 'N/A')
+    """,
+]
+
+# Same shape as the old table: one row per (movie, actor, director), and a
+# movie credited on one side only still shows, with NULL for the other.
+# movie_cast_id packs the MovieActor id into the high 32 bits and the
+# MovieDirector id into the low ones (0 for the missing side). Driving the
+# joins from movies keeps filters on movie/actor/director on the underlying
+# indexes and lets the admin page through it in movie_id order.
+CREATE_CAST_VIEW_SQL = """
+CREATE VIEW cast_crew AS
+SELECT COALESCE(ma.id, 0) * 4294967296 + COALESCE(md.id, 0) AS movie_cast_id,
+       m.movie_id,
+       ma.actor_id,
+       md.director_id
+FROM movies m
+LEFT JOIN movie_actors ma ON ma.movie_id = m.movie_id
+LEFT JOIN movie_directors md ON md.movie_id = m.movie_id
+WHERE ma.id IS NOT NULL OR md.id IS NOT NULL
+"""
+
+# wrapped_summary_mv from 0010 reads cast_crew, so it is rebuilt on top of
+# movie_actors, which also stops it counting an actor once per director.
+SUMMARY_VIEW_SQL = """
+CREATE MATERIALIZED VIEW IF NOT EXISTS wrapped_summary_mv AS
+WITH totals AS (
+    SELECT user_id,
+           COUNT(*) AS total_movies_watched,
+           ROUND(AVG(rating)::numeric, 2) AS avg_rating
+    FROM watch_history
+    GROUP BY user_id
+),
+best AS (
+    SELECT DISTINCT ON (wh.user_id) wh.user_id, m.title
+    FROM watch_history wh
+    JOIN movies m ON m.movie_id = wh.movie_id
+    ORDER BY wh.user_id, wh.rating DESC, wh.watch_date DESC, wh.watched_id DESC
+),
+actor_counts AS (
+    SELECT wh.user_id, {credits}.actor_id, COUNT(*) AS appearances
+    FROM watch_history wh
+    JOIN {credits} ON {credits}.movie_id = wh.movie_id
+    GROUP BY wh.user_id, {credits}.actor_id
+),
+top_actor AS (
+    SELECT DISTINCT ON (ac.user_id) ac.user_id, a.name
+    FROM actor_counts ac
+    JOIN actors a ON a.actor_id = ac.actor_id
+    ORDER BY ac.user_id, ac.appearances DESC, ac.actor_id
+)
+SELECT t.user_id,
+       COALESCE(ta.name, 'N/A') AS top_actor,
+       t.total_movies_watched,
+       t.avg_rating,
+       b.title AS highest_rated_movie
+FROM totals t
+LEFT JOIN best b ON b.user_id = t.user_id
+LEFT JOIN top_actor ta ON ta.user_id = t.user_id
+WITH NO DATA
+"""
+
+
+def copy_credits(apps, schema_editor):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT MIN(movie_id), MAX(movie_id) FROM cast_crew")
+        low, high = cursor.fetchone()
+    if low is None:
+        return
+    for start in range(low, high + 1, BATCH_SIZE):
+        with transaction.atomic(using=schema_editor.connection.alias):
+            for sql in COPY_SQL:
+                schema_editor.execute(sql, [start, start + BATCH_SIZE])
+
+
+def recount_actor_appearances(apps, schema_editor):
+    for sql in RECOUNT_SQL:
+        schema_editor.execute(sql)
+
+
+def _drop_summary_view(schema_editor):
+    """Drop wrapped_summary_mv; return whether it held data."""
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT ispopulated FROM pg_matviews WHERE matviewname = 'wrapped_summary_mv'")
+        row = cursor.fetchone()
+    schema_editor.execute("DROP MATERIALIZED VIEW IF EXISTS wrapped_summary_mv")
+    return bool(row and row[0])
+
+
+def _create_summary_view(schema_editor, credits, populate):
+    schema_editor.execute(SUMMARY_VIEW_SQL.format(credits=credits))
+    schema_editor.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS wrapped_summary_mv_user_id_uniq ON wrapped_summary_mv (user_id)"
+    )
+    if populate:
+        schema_editor.execute("REFRESH MATERIALIZED VIEW wrapped_summary_mv")
+
+
+def replace_table_with_view(apps, schema_editor):
+    postgres = schema_editor.connection.vendor == 'postgresql'
+    populated = _drop_summary_view(schema_editor) if postgres else False
+    schema_editor.execute("DROP TABLE cast_crew")
+    schema_editor.execute(CREATE_CAST_VIEW_SQL)
+    if postgres:
+        _create_summary_view(schema_editor, 'movie_actors', populated)
+
+
+def restore_table(apps, schema_editor):
+    postgres = schema_editor.connection.vendor == 'postgresql'
+    populated = _drop_summary_view(schema_editor) if postgres else False
+    schema_editor.execute("DROP VIEW cast_crew")
+    pk = 'serial PRIMARY KEY' if postgres else 'integer PRIMARY KEY AUTOINCREMENT'
+    schema_editor.execute(f"""
+        CREATE TABLE cast_crew (
+            movie_cast_id {pk},
+            movie_id integer NOT NULL REFERENCES movies (movie_id),
+            actor_id integer NOT NULL REFERENCES actors (actor_id),
+            director_id integer NOT NULL REFERENCES directors (director_id)
+        )
+    """)
+    schema_editor.execute("""
+        INSERT INTO cast_crew (movie_id, actor_id, director_id)
+        SELECT ma.movie_id, ma.actor_id, md.director_id
+        FROM movie_actors ma
+        JOIN movie_directors md ON md.movie_id = ma.movie_id
+        ORDER BY ma.movie_id, ma.actor_id, md.director_id
+    """)
+    schema_editor.execute("CREATE INDEX cast_crew_movie_actor_idx ON cast_crew (movie_id, actor_id)")
+    if postgres:
+        _create_summary_view(schema_editor, 'cast_crew', populated)
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('movie_app', '0011_people_natural_keys'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovieActor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('actor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='credits', to='movie_app.actor')),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='actor_credits', to='movie_app.movie')),
+            ],
+            options={
+                'db_table': 'movie_actors',
+                'indexes': [models.Index(fields=['actor', 'movie'], name='movie_actors_actor_idx')],
+                'constraints': [models.UniqueConstraint(fields=('movie', 'actor'), name='movie_actors_movie_actor_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='MovieDirector',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('director', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='credits', to='movie_app.director')),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='director_credits', to='movie_app.movie')),
+            ],
+            options={
+                'db_table': 'movie_directors',
+                'indexes': [models.Index(fields=['director', 'movie'], name='movie_directors_director_idx')],
+                'constraints': [models.UniqueConstraint(fields=('movie', 'director'), name='movie_directors_movie_director_uniq')],
+            },
+        ),
+        migrations.RunPython(copy_credits, migrations.RunPython.noop, atomic=False),
+        migrations.RunPython(recount_actor_appearances, migrations.RunPython.noop, atomic=True),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(replace_table_with_view, restore_table, atomic=True),
+            ],
+            state_operations=[
+                migrations.RemoveIndex(model_name='castcrew', name='cast_crew_movie_actor_idx'),
+                migrations.AlterField(
+                    model_name='castcrew',
+                    name='movie_cast_id',
+                    field=models.BigIntegerField(primary_key=True, serialize=False),
+                ),
+                migrations.AlterField(
+                    model_name='castcrew',
+                    name='movie',
+                    field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to='movie_app.movie'),
+                ),
+                migrations.AlterField(
+                    model_name='castcrew',
+                    name='actor',
+                    field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to='movie_app.actor'),
+                ),
+                migrations.AlterField(
+                    model_name='castcrew',
+                    name='director',
+                    field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, to='movie_app.director'),
+                ),
+                migrations.AlterModelOptions(name='castcrew', options={'managed': False}),
+            ],
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:32
+
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movie_app', '0012_normalized_credits'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SummaryJob',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, serialize=False, to='movie_app.user')),
+                ('token', models.UUIDField(default=uuid.uuid4)),
+                ('requested_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('attempts', models.IntegerField(default=0)),
+                ('last_error', models.TextField(blank=True)),
+            ],
+            options={
+                'db_table': 'summary_jobs',
+                'indexes': [models.Index(fields=['requested_at'], name='summary_jobs_requested_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,51 @@
+from datetime import date
+
+from django.db import migrations
+
+
+UNUSABLE_PASSWORD = '!'
+
+
+def unify_users(apps, schema_editor):
+    """Give every auth account a profile and keep credentials only in auth_user.
+
+    Auth accounts without a profile get one, and profiles with an auth
+    account lose their copy of the password. Legacy profiles without an auth
+    account are left as they are: whether they may log in is decided by
+    running `manage.py create_legacy_logins`, not by migrating.
+    """
+    AuthUser = apps.get_model('auth', 'User')
+    CustomUser = apps.get_model('movie_app', 'User')
+    db = schema_editor.connection.alias
+
+    profiles = set(CustomUser.objects.using(db).values_list('user_id', flat=True))
+    CustomUser.objects.using(db).bulk_create([
+        CustomUser(
+            user_id=user.username,
+            name=user.first_name or user.username,
+            birthday=date(2000, 1, 1),
+            password=UNUSABLE_PASSWORD,
+            profile_picture='',
+        )
+        for user in AuthUser.objects.using(db).exclude(username__in=profiles).iterator()
+    ], batch_size=1000)
+
+    (
+        CustomUser.objects.using(db)
+        .filter(user_id__in=AuthUser.objects.using(db).values('username'))
+        .exclude(password=UNUSABLE_PASSWORD)
+        .update(password=UNUSABLE_PASSWORD)
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('movie_app', '0013_summary_jobs'),
+    ]
+
+    operations = [
+        # Removed passwords cannot be recovered, so the reverse is a no-op
+        migrations.RunPython(unify_users, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,102 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+MONTH = "date_trunc('month', watch_date)::date"
+
+BACKFILL_SQL = [
+    f"""
+    INSERT INTO user_monthly_rollups
+        (user_id, month, watch_count, rating_sum, best_watched_id, best_rating, best_date, best_movie_id)
+    SELECT totals.user_id, totals.month, totals.watch_count, totals.rating_sum,
+           best.watched_id, best.rating, best.watch_date, best.movie_id
+    FROM (
+        SELECT user_id, {MONTH} AS month, COUNT(*) AS watch_count, SUM(rating) AS rating_sum
+        FROM watch_history GROUP BY 1, 2
+    ) totals
+    JOIN (
+        SELECT DISTINCT ON (user_id, {MONTH}) user_id, {MONTH} AS month, watched_id, rating, watch_date, movie_id
+        FROM watch_history
+        ORDER BY user_id, {MONTH}, rating DESC, watch_date DESC, watched_id DESC
+    ) best USING (user_id, month)
+    """,
+    """
+    INSERT INTO user_monthly_actor_counts (user_id, month, actor_id, appearances)
+    SELECT wh.user_id, date_trunc('month', wh.watch_date)::date, ma.actor_id, COUNT(*)
+    FROM watch_history wh JOIN movie_actors ma ON ma.movie_id = wh.movie_id
+    GROUP BY 1, 2, 3
+    """,
+    """
+    INSERT INTO user_monthly_director_counts (user_id, month, director_id, appearances)
+    SELECT wh.user_id, date_trunc('month', wh.watch_date)::date, md.director_id, COUNT(*)
+    FROM watch_history wh JOIN movie_directors md ON md.movie_id = wh.movie_id
+    GROUP BY 1, 2, 3
+    """,
+]
+
+
+def backfill_rollups(apps, schema_editor):
+    """Build every user's monthly rollups from the existing history, set-based."""
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for sql in BACKFILL_SQL:
+        schema_editor.execute(sql)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movie_app', '0014_unify_user_identity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyActorCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('appearances', models.IntegerField(default=0)),
+                ('actor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='movie_app.actor')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='movie_app.user')),
+            ],
+            options={
+                'db_table': 'user_monthly_actor_counts',
+                'constraints': [models.UniqueConstraint(fields=('user', 'month', 'actor'), name='monthly_actor_counts_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='MonthlyDirectorCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('appearances', models.IntegerField(default=0)),
+                ('director', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='movie_app.director')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='movie_app.user')),
+            ],
+            options={
+                'db_table': 'user_monthly_director_counts',
+                'constraints': [models.UniqueConstraint(fields=('user', 'month', 'director'), name='monthly_director_counts_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='MonthlyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField()),
+                ('watch_count', models.IntegerField(default=0)),
+                ('rating_sum', models.FloatField(default=0)),
+                ('best_watched_id', models.IntegerField(blank=True, null=True)),
+                ('best_rating', models.FloatField(blank=True, null=True)),
+                ('best_date', models.DateField(blank=True, null=True)),
+                ('best_movie', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='movie_app.movie')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='movie_app.user')),
+            ],
+            options={
+                'db_table': 'user_monthly_rollups',
+                'constraints': [models.UniqueConstraint(fields=('user', 'month'), name='monthly_rollups_user_month_uniq')],
+            },
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
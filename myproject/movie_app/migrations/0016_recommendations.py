@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-18 10:52
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movie_app', '0015_monthly_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Recommendation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.IntegerField()),
+                ('score', models.FloatField()),
+                ('built_at', models.DateTimeField()),
+                ('movie', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='movie_app.movie')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='movie_app.user')),
+            ],
+            options={
+                'db_table': 'user_recommendations',
+                'constraints': [models.UniqueConstraint(fields=('user', 'rank'), name='user_recommendations_rank_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+from django.db import migrations
+
+
+# Stored generated tsvector columns, kept up to date by Postgres on every
+# write, with GIN indexes for the @@ matches in movie_app.fulltext. They are
+# deliberately not model fields, so ordinary reads never fetch them. Adding
+# a stored column rewrites the table under an exclusive lock; the indexes
+# are then built CONCURRENTLY, which cannot run inside a transaction.
+COLUMNS = [
+    (
+        'movies', 'search_vector',
+        "setweight(to_tsvector('english'::regconfig, COALESCE(title, '')), 'A') || "
+        "setweight(to_tsvector('english'::regconfig, COALESCE(plot, '')), 'B')",
+        'movies_search_vector_idx',
+    ),
+    (
+        'watch_history', 'review_vector',
+        "to_tsvector('english'::regconfig, COALESCE(review, ''))",
+        'watch_history_review_vector_idx',
+    ),
+]
+
+
+def add_search_columns(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table, column, expression, index in COLUMNS:
+        schema_editor.execute(
+            f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} tsvector "
+            f"GENERATED ALWAYS AS ({expression}) STORED"
+        )
+        schema_editor.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {index} ON {table} USING gin ({column})")
+
+
+def drop_search_columns(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for table, column, _, index in COLUMNS:
+        schema_editor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index}")
+        schema_editor.execute(f"ALTER TABLE {table} DROP COLUMN IF EXISTS {column}")
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('movie_app', '0016_recommendations'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_search_columns, drop_search_columns),
+    ]
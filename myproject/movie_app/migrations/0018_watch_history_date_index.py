@@ -0,0 +1,21 @@
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+# Serves the watch_history admin's date hierarchy and date sorting. Built
+# CONCURRENTLY, so it cannot run inside a transaction.
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('movie_app', '0017_full_text_search'),
+    ]
+
+    operations = [
+        AddIndexConcurrently(
+            model_name='watchhistory',
+            index=models.Index(fields=['watch_date', 'watched_id'], name='watch_history_date_idx'),
+        ),
+    ]
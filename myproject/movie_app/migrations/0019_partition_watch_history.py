@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.db import migrations
+
+# Opt-in: with WATCH_HISTORY_PARTITIONS set, create the partitioned copy of
+# watch_history and the trigger that keeps it in sync. The copy is only put
+# in place by `manage.py partition_watch_history --swap` once the backfill
+# has run, so the model state does not change. Without the setting this is
+# a no-op and the command's --prepare does the same later. The steps live
+# in movie_app.partitioning because the command shares them.
+
+
+def prepare_partitioned_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql' or not settings.WATCH_HISTORY_PARTITIONS:
+        return
+    from movie_app import partitioning
+
+    with schema_editor.connection.cursor() as cursor:
+        if partitioning.state(cursor) == 'unprepared':
+            partitioning.prepare(cursor, settings.WATCH_HISTORY_PARTITIONS, settings.WATCH_HISTORY_PARTITION_BY_YEAR)
+
+
+def drop_partitioned_table(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    from movie_app import partitioning
+
+    # Once swapped in, the partitioned table stays; the model works on either
+    with schema_editor.connection.cursor() as cursor:
+        if partitioning.state(cursor) == 'prepared':
+            partitioning.abort(cursor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movie_app', '0018_watch_history_date_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(prepare_partitioned_table, drop_partitioned_table),
+    ]
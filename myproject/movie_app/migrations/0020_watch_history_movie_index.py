@@ -0,0 +1,59 @@
+from django.db import migrations, models
+
+# Serves the watch_history admin's title search, which looks entries up by
+# movie_id, and deletes that cascade from movies. Built CONCURRENTLY, so it
+# cannot run inside a transaction. Postgres cannot build a partitioned
+# table's index concurrently: once watch_history is partitioned it gets a
+# plain CREATE INDEX, and a partitioned copy still being backfilled gets
+# the index too, so the swap keeps it.
+
+INDEX = 'watch_history_movie_idx'
+
+
+def add_movie_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        WatchHistory = apps.get_model('movie_app', 'WatchHistory')
+        schema_editor.add_index(WatchHistory, models.Index(fields=['movie'], name=INDEX))
+        return
+    from movie_app import partitioning
+
+    with schema_editor.connection.cursor() as cursor:
+        current = partitioning.state(cursor)
+    if current == 'prepared':
+        schema_editor.execute(f"CREATE INDEX IF NOT EXISTS {INDEX}{partitioning.PENDING} ON {partitioning.SHADOW} (movie_id)")
+    concurrently = '' if current == 'partitioned' else ' CONCURRENTLY'
+    schema_editor.execute(f"CREATE INDEX{concurrently} IF NOT EXISTS {INDEX} ON watch_history (movie_id)")
+
+
+def drop_movie_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        WatchHistory = apps.get_model('movie_app', 'WatchHistory')
+        schema_editor.remove_index(WatchHistory, models.Index(fields=['movie'], name=INDEX))
+        return
+    from movie_app import partitioning
+
+    schema_editor.execute(f"DROP INDEX IF EXISTS {INDEX}{partitioning.PENDING}")
+    schema_editor.execute(f"DROP INDEX IF EXISTS {INDEX}")
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('movie_app', '0019_partition_watch_history'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='watchhistory',
+                    index=models.Index(fields=['movie'], name='watch_history_movie_idx'),
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(add_movie_index, drop_movie_index),
+            ],
+        ),
+    ]
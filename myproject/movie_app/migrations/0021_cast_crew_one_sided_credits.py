@@ -0,0 +1,44 @@
+from importlib import import_module
+
+from django.db import migrations
+
+# 0012 first created cast_crew as an inner join of movie_actors and
+# movie_directors, which dropped every movie credited on one side only.
+# Recreate it with the definition 0012 now uses, which keeps those movies
+# with NULL for the missing side. Nothing else reads the view, so dropping
+# and recreating it is enough.
+normalized_credits = import_module('movie_app.migrations.0012_normalized_credits')
+
+INNER_JOIN_VIEW_SQL = """
+CREATE VIEW cast_crew AS
+SELECT ma.id * 4294967296 + md.id AS movie_cast_id,
+       ma.movie_id,
+       ma.actor_id,
+       md.director_id
+FROM movie_actors ma
+JOIN movie_directors md ON md.movie_id = ma.movie_id
+"""
+
+
+def _replace_view(schema_editor, sql):
+    schema_editor.execute("DROP VIEW IF EXISTS cast_crew")
+    schema_editor.execute(sql)
+
+
+def keep_one_sided_credits(apps, schema_editor):
+    _replace_view(schema_editor, normalized_credits.CREATE_CAST_VIEW_SQL)
+
+
+def inner_join_credits(apps, schema_editor):
+    _replace_view(schema_editor, INNER_JOIN_VIEW_SQL)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movie_app', '0020_watch_history_movie_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(keep_one_sided_credits, inner_join_credits),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 12:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('movie_app', '0021_cast_crew_one_sided_credits'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='wrappedsummary',
+            name='history_writes',
+            field=models.BigIntegerField(default=0),
+        ),
+    ]
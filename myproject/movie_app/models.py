@@ -1,4 +1,7 @@
-from django.db import models
+import uuid
+
+from django.db import models, transaction
+from django.utils import timezone
 
 class Movie(models.Model):
     movie_id = models.AutoField(primary_key=True)
@@ -12,6 +15,9 @@ class Movie(models.Model):
     
     class Meta:
         db_table = 'movies'  # Point to existing 'movies' table
+        indexes = [
+            models.Index(fields=['title'], name='movies_title_idx'),
+        ]
     
 
 class Actor(models.Model):
@@ -24,6 +30,11 @@ class Actor(models.Model):
     
     class Meta:
         db_table = 'actors'  # Point to existing 'actors' table
+        constraints = [
+            # Natural key used by the catalog loader's ON CONFLICT upserts; people
+            # without a birth year can share a name, as NULLs never conflict
+            models.UniqueConstraint(fields=['name', 'birth_year'], name='actors_name_birth_year_uniq'),
+        ]
 
 class Director(models.Model):
     director_id = models.IntegerField(primary_key=True)
@@ -35,18 +46,68 @@ class Director(models.Model):
     
     class Meta:
         db_table = 'directors'  # Point to existing 'directors' table
+        constraints = [
+            models.UniqueConstraint(fields=['name', 'birth_year'], name='directors_name_birth_year_uniq'),
+        ]
+
+class MovieActor(models.Model):
+    """One actor credit on a movie."""
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='actor_credits')
+    actor = models.ForeignKey(Actor, on_delete=models.CASCADE, related_name='credits')
+
+    def __str__(self):
+        return f"{self.movie_id} - {self.actor_id}"
+
+    class Meta:
+        db_table = 'movie_actors'
+        constraints = [
+            # Also serves per-movie cast lookups (movie_id leading)
+            models.UniqueConstraint(fields=['movie', 'actor'], name='movie_actors_movie_actor_uniq'),
+        ]
+        indexes = [
+            # Filmography: an actor's movies
+            models.Index(fields=['actor', 'movie'], name='movie_actors_actor_idx'),
+        ]
+
+class MovieDirector(models.Model):
+    """One director credit on a movie."""
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='director_credits')
+    director = models.ForeignKey(Director, on_delete=models.CASCADE, related_name='credits')
+
+    def __str__(self):
+        return f"{self.movie_id} - {self.director_id}"
+
+    class Meta:
+        db_table = 'movie_directors'
+        constraints = [
+            models.UniqueConstraint(fields=['movie', 'director'], name='movie_directors_movie_director_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['director', 'movie'], name='movie_directors_director_idx'),
+        ]
 
 class CastCrew(models.Model):
-    movie_cast_id = models.AutoField(primary_key=True)
-    movie = models.ForeignKey(Movie, on_delete=models.CASCADE)
-    actor = models.ForeignKey(Actor, on_delete=models.CASCADE)
-    director = models.ForeignKey(Director, on_delete=models.CASCADE)
+    """Read-only compatibility view over MovieActor x MovieDirector.
+
+    cast_crew used to be a table with one row per (movie, actor, director);
+    migration 0012 moved its rows into movie_actors / movie_directors and
+    replaced it with a view of the same shape. A movie with no director (or
+    no actors) still has rows, with director (or actor) None. Write credits to
+    the new models.
+    """
+    movie_cast_id = models.BigIntegerField(primary_key=True)
+    movie = models.ForeignKey(Movie, on_delete=models.DO_NOTHING, db_constraint=False)
+    actor = models.ForeignKey(Actor, on_delete=models.DO_NOTHING, db_constraint=False, null=True)
+    director = models.ForeignKey(Director, on_delete=models.DO_NOTHING, db_constraint=False, null=True)
 
     def __str__(self):
-        return f"{self.movie.title} - {self.actor.name} - {self.director.name}"
+        actor = self.actor.name if self.actor_id else '-'
+        director = self.director.name if self.director_id else '-'
+        return f"{self.movie.title} - {actor} - {director}"
     
     class Meta:
-        db_table = 'cast_crew'  # Point to existing 'cast_crew' table
+        managed = False
+        db_table = 'cast_crew'  # View over movie_actors and movie_directors
 
 class User(models.Model):
     user_id = models.CharField(max_length=100, primary_key=True)
@@ -61,6 +122,26 @@ class User(models.Model):
     class Meta:
         db_table = 'users'  # Point to existing 'users' table
 
+class WatchHistoryQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        """QuerySet.update(), plus the per-user bookkeeping signals do for saves.
+
+        update() sends no signals, so the history write counters and cached
+        pages of every user whose entries changed are updated here.
+        """
+        from .signals import entries_updated
+
+        with transaction.atomic(using=self.db):
+            user_ids = set(self.order_by().values_list('user_id', flat=True).distinct())
+            rows = super().update(**kwargs)
+            new_user = kwargs.get('user_id', kwargs.get('user'))
+            if new_user is not None:
+                user_ids.add(getattr(new_user, 'pk', new_user))
+            if rows:
+                entries_updated(user_ids)
+        return rows
+
+
 class WatchHistory(models.Model):
     watched_id = models.AutoField(primary_key=True, db_column='watched_id')
     user = models.ForeignKey(User, on_delete=models.CASCADE)
@@ -69,11 +150,38 @@ class WatchHistory(models.Model):
     rating = models.FloatField()
     review = models.TextField()
 
+    objects = WatchHistoryQuerySet.as_manager()
+
     def __str__(self):
         return f"{self.user.name} watched {self.movie.title} on {self.watch_date}"
-    
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # What the row held, so movie_app.signals can apply an edit as a delta
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
     class Meta:
         db_table = 'watch_history'  # Point to existing 'watch_history' table
+        indexes = [
+            # Recent-first listing and keyset pagination; rating and movie_id
+            # are included so count/avg and the dashboard slice avoid the heap
+            models.Index(
+                fields=['user', '-watch_date', '-watched_id'],
+                include=['movie', 'rating'],
+                name='watch_history_user_date_idx',
+            ),
+            # Highest-rated entry lookup in summary rebuilds
+            models.Index(
+                fields=['user', '-rating', '-watch_date', '-watched_id'],
+                name='watch_history_user_rating_idx',
+            ),
+            # Admin date hierarchy probes and sorting by date
+            models.Index(fields=['watch_date', 'watched_id'], name='watch_history_date_idx'),
+            # Admin title search and cascades from movies
+            models.Index(fields=['movie'], name='watch_history_movie_idx'),
+        ]
 
 class WrappedSummary(models.Model):
     summary_id = models.AutoField(primary_key=True)
@@ -84,8 +192,172 @@ class WrappedSummary(models.Model):
     avg_rating = models.DecimalField(max_digits=4, decimal_places=2, null=True, blank=True)
     highest_rated_movie = models.CharField(max_length=200, null=True, blank=True)
 
+    # Running state used by movie_app.summary to apply deltas instead of
+    # re-aggregating the whole watch history on every write.
+    rating_sum = models.FloatField(default=0)
+    highest_rated_watched_id = models.IntegerField(null=True, blank=True)
+    highest_rating = models.FloatField(null=True, blank=True)
+    highest_rated_date = models.DateField(null=True, blank=True)
+    top_actor_ref = models.ForeignKey(Actor, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+    top_actor_count = models.IntegerField(default=0)
+    incremental_ready = models.BooleanField(default=False)
+    # Bumped in the same transaction as every write to the user's watch
+    # history (movie_app.signals); the API's history ETags are derived from it
+    history_writes = models.BigIntegerField(default=0)
+
     def __str__(self):
         return f"{self.user.name}'s summary"
     
     class Meta:
-        db_table = 'wrapped_summary'
\ No newline at end of file
+        db_table = 'wrapped_summary'
+        constraints = [
+            models.UniqueConstraint(fields=['user'], name='wrapped_summary_user_uniq'),
+        ]
+
+
+class WrappedSummarySnapshot(models.Model):
+    """Read-only row of the wrapped_summary_mv materialized view.
+
+    The view is created by migration 0010 and refreshed by the
+    refresh_wrapped_summaries management command.
+    """
+    user = models.OneToOneField(User, primary_key=True, on_delete=models.DO_NOTHING, db_constraint=False)
+    top_actor = models.CharField(max_length=100)
+    total_movies_watched = models.IntegerField()
+    avg_rating = models.DecimalField(max_digits=4, decimal_places=2, null=True, blank=True)
+    highest_rated_movie = models.CharField(max_length=200, null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.user_id}'s summary snapshot"
+
+    class Meta:
+        managed = False
+        db_table = 'wrapped_summary_mv'
+
+
+class ActorAppearance(models.Model):
+    """How many times an actor shows up in a user's watched movies."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    actor = models.ForeignKey(Actor, on_delete=models.CASCADE)
+    appearances = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id} - {self.actor_id}: {self.appearances}"
+
+    class Meta:
+        db_table = 'user_actor_counts'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'actor'], name='user_actor_counts_user_actor_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-appearances'], name='user_actor_counts_top_idx'),
+        ]
+
+
+class SummaryJob(models.Model):
+    """A pending WrappedSummary recompute for one user.
+
+    There is at most one row per user, so repeated writes coalesce into a
+    single recompute. Rows are claimed and run by `manage.py
+    run_summary_worker`; see movie_app.jobs.
+    """
+    user = models.OneToOneField(User, primary_key=True, on_delete=models.CASCADE)
+    # Replaced on every enqueue; the worker only deletes the job if it is
+    # unchanged, so writes made during a recompute get another run
+    token = models.UUIDField(default=uuid.uuid4)
+    requested_at = models.DateTimeField(default=timezone.now)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.IntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    def __str__(self):
+        return f"Summary job for {self.user_id}"
+
+    class Meta:
+        db_table = 'summary_jobs'
+        indexes = [
+            models.Index(fields=['requested_at'], name='summary_jobs_requested_idx'),
+        ]
+
+
+class MonthlyRollup(models.Model):
+    """One user's watches in one calendar month, maintained on every write.
+
+    Windowed summaries (a year, a quarter, the last 12 months) add up these
+    rows instead of scanning the history; see movie_app.rollups.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    # First day of the month
+    month = models.DateField()
+    watch_count = models.IntegerField(default=0)
+    rating_sum = models.FloatField(default=0)
+    # The month's highest-rated entry, ranked like WrappedSummary's
+    best_watched_id = models.IntegerField(null=True, blank=True)
+    best_rating = models.FloatField(null=True, blank=True)
+    best_date = models.DateField(null=True, blank=True)
+    best_movie = models.ForeignKey(Movie, null=True, blank=True, on_delete=models.SET_NULL, related_name='+')
+
+    def __str__(self):
+        return f"{self.user_id} {self.month:%Y-%m}: {self.watch_count}"
+
+    class Meta:
+        db_table = 'user_monthly_rollups'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'month'], name='monthly_rollups_user_month_uniq'),
+        ]
+
+
+class MonthlyActorCount(models.Model):
+    """How many times an actor shows up in a user's watches in one month."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    month = models.DateField()
+    actor = models.ForeignKey(Actor, on_delete=models.CASCADE)
+    appearances = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id} {self.month:%Y-%m} - {self.actor_id}: {self.appearances}"
+
+    class Meta:
+        db_table = 'user_monthly_actor_counts'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'month', 'actor'], name='monthly_actor_counts_uniq'),
+        ]
+
+
+class MonthlyDirectorCount(models.Model):
+    """How many times a director shows up in a user's watches in one month."""
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    month = models.DateField()
+    director = models.ForeignKey(Director, on_delete=models.CASCADE)
+    appearances = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id} {self.month:%Y-%m} - {self.director_id}: {self.appearances}"
+
+    class Meta:
+        db_table = 'user_monthly_director_counts'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'month', 'director'], name='monthly_director_counts_uniq'),
+        ]
+
+
+class Recommendation(models.Model):
+    """A movie recommended to a user, ranked from 1.
+
+    Written in bulk by `manage.py build_recommendations`; see
+    movie_app.recommender.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    rank = models.IntegerField()
+    movie = models.ForeignKey(Movie, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+    built_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.user_id} #{self.rank}: {self.movie_id}"
+
+    class Meta:
+        db_table = 'user_recommendations'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'rank'], name='user_recommendations_rank_uniq'),
+        ]
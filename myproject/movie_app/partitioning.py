@@ -0,0 +1,383 @@
+"""Online conversion of watch_history into a partitioned table.
+
+watch_history becomes hash-partitioned on user_id. Each user's rows, and
+the vacuum and index work for them, then live in one of several smaller
+tables. Optionally, each hash partition is split again by watch_date year,
+with a default partition for dates outside the years created. The
+WatchHistory model is unchanged. Every per-user query already filters on
+user_id, so Postgres prunes it to one partition. Statements by watched_id
+alone, such as saving or deleting an entry, probe each partition's primary
+key index instead.
+
+The conversion has three steps, none of which blocks the site for long:
+
+1. prepare() creates watch_history_partitioned next to the live table,
+   with the same columns (review_vector included), indexes and foreign
+   keys. It adds a trigger that mirrors every insert, update and delete
+   into the new table.
+2. backfill_batch() copies the rows that existed before the trigger, one
+   short transaction per range of watched_ids.
+3. swap() takes an exclusive lock, checks the backfill finished and
+   renames the partitioned table to watch_history. The old table is kept
+   as watch_history_unpartitioned until drop_old().
+
+Partitioned tables need the partition key in every unique index. The
+primary key becomes (watched_id, user_id), plus watch_date with year
+partitions. watched_id stays unique because the sequence still assigns it.
+Rows without a user_id have no partition to go to. They are not copied,
+and verify() and swap() refuse to go on while any exist, so none is lost.
+"""
+import json
+import re
+from datetime import date
+
+from django.db import connection
+
+
+TABLE = 'watch_history'
+SHADOW = 'watch_history_partitioned'
+OLD = 'watch_history_unpartitioned'
+TRIGGER = 'watch_history_partition_mirror'
+# Suffixes for index names while both tables exist: the partitioned table's
+# until the swap, the old table's after it
+PENDING = '_part'
+RETIRED = '_old'
+# Year partitions reach back at most this far; older dates go to the default
+MAX_YEARS_BACK = 30
+
+INDEX_DEFINITION = re.compile(r'^CREATE (UNIQUE )?INDEX \S+ ON (ONLY )?\S+ ')
+
+
+class PartitioningError(Exception):
+    pass
+
+
+def _quote(name):
+    return connection.ops.quote_name(name)
+
+
+def _relkind(cursor, name):
+    cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [name])
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def state(cursor):
+    """'unprepared', 'prepared' (mirroring into the new table) or 'partitioned'."""
+    if _relkind(cursor, TABLE) == 'p':
+        return 'partitioned'
+    return 'prepared' if _relkind(cursor, SHADOW) else 'unprepared'
+
+
+def _require(cursor, expected):
+    current = state(cursor)
+    if current != expected:
+        raise PartitioningError(f"{TABLE} is {current}, not {expected}.")
+
+
+def progress(cursor):
+    """Backfill progress, kept as JSON in the partitioned table's comment."""
+    cursor.execute("SELECT obj_description(to_regclass(%s), 'pg_class')", [SHADOW])
+    return json.loads(cursor.fetchone()[0])
+
+
+def _save_progress(cursor, values):
+    cursor.execute(f"COMMENT ON TABLE {SHADOW} IS %s", [json.dumps(values)])
+
+
+def _columns(cursor, table):
+    """Quoted names of the columns a copy writes, i.e. all but generated ones."""
+    cursor.execute(
+        """
+        SELECT attname FROM pg_attribute
+        WHERE attrelid = %s::regclass AND attnum > 0 AND NOT attisdropped AND attgenerated = ''
+        ORDER BY attnum
+        """,
+        [table],
+    )
+    return [_quote(name) for (name,) in cursor.fetchall()]
+
+
+def _indexes(cursor, table):
+    """[(name, definition, is_primary)] for the indexes of table."""
+    cursor.execute(
+        """
+        SELECT i.relname, pg_get_indexdef(x.indexrelid), x.indisprimary
+        FROM pg_index x JOIN pg_class i ON i.oid = x.indexrelid
+        WHERE x.indrelid = %s::regclass
+        ORDER BY i.relname
+        """,
+        [table],
+    )
+    return cursor.fetchall()
+
+
+def _partitions(cursor, table):
+    """Names of table's direct partitions."""
+    cursor.execute(
+        """
+        SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = %s::regclass
+        ORDER BY c.relname
+        """,
+        [table],
+    )
+    return [name for (name,) in cursor.fetchall()]
+
+
+def _create_year_partition(cursor, parent, year):
+    cursor.execute(
+        f"CREATE TABLE IF NOT EXISTS {_quote(f'{parent}_{year}')} PARTITION OF {_quote(parent)} "
+        f"FOR VALUES FROM ('{year}-01-01') TO ('{year + 1}-01-01')"
+    )
+
+
+def prepare(cursor, partitions, by_year=False):
+    """Create the partitioned table and the trigger that keeps it in sync.
+
+    Run inside a transaction: the trigger's lock makes writers wait until
+    it commits, so every row the trigger misses is below the high-water
+    mark recorded here and gets copied by backfill_batch().
+    """
+    if partitions < 2:
+        raise PartitioningError("Partition watch_history into at least 2 tables.")
+    _require(cursor, 'unprepared')
+    key = ['watched_id', 'user_id'] + (['watch_date'] if by_year else [])
+
+    cursor.execute(
+        f"CREATE TABLE {SHADOW} (LIKE {TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS "
+        f"INCLUDING GENERATED INCLUDING STORAGE) PARTITION BY HASH (user_id)"
+    )
+    cursor.execute(f"ALTER TABLE {SHADOW} ADD CONSTRAINT {TABLE}_pkey{PENDING} PRIMARY KEY ({', '.join(key)})")
+
+    years = []
+    if by_year:
+        this_year = date.today().year
+        cursor.execute(f"SELECT EXTRACT(YEAR FROM MIN(watch_date))::int FROM {TABLE}")
+        first = cursor.fetchone()[0] or this_year
+        years = range(max(first, this_year - MAX_YEARS_BACK), this_year + 2)
+    width = len(str(partitions - 1))
+    for remainder in range(partitions):
+        partition = f'{TABLE}_p{remainder:0{width}d}'
+        cursor.execute(
+            f"CREATE TABLE {partition} PARTITION OF {SHADOW} "
+            f"FOR VALUES WITH (MODULUS {partitions}, REMAINDER {remainder})"
+            + (" PARTITION BY RANGE (watch_date)" if by_year else "")
+        )
+        if by_year:
+            for year in years:
+                _create_year_partition(cursor, partition, year)
+            cursor.execute(f"CREATE TABLE {partition}_default PARTITION OF {partition} DEFAULT")
+
+    # Indexes on the parent are created on every partition; the table is
+    # still empty, so this is instant
+    for name, definition, primary in _indexes(cursor, TABLE):
+        if not primary:
+            cursor.execute(INDEX_DEFINITION.sub(
+                lambda match: f"CREATE {match[1] or ''}INDEX {_quote(name + PENDING)} ON {SHADOW} ",
+                definition,
+            ))
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint WHERE conrelid = %s::regclass AND contype = 'f'",
+        [TABLE],
+    )
+    for name, definition in cursor.fetchall():
+        cursor.execute(f"ALTER TABLE {SHADOW} ADD CONSTRAINT {_quote(name)} {definition}")
+
+    columns = _columns(cursor, TABLE)
+    old_key = ' AND '.join(f'{column} = OLD.{column}' for column in key)
+    cursor.execute(f"""
+        CREATE FUNCTION {TRIGGER}() RETURNS trigger LANGUAGE plpgsql AS $$
+        BEGIN
+            IF TG_OP <> 'INSERT' THEN
+                DELETE FROM {SHADOW} WHERE {old_key};
+            END IF;
+            IF TG_OP <> 'DELETE' AND NEW.user_id IS NOT NULL THEN
+                INSERT INTO {SHADOW} ({', '.join(columns)})
+                VALUES ({', '.join(f'NEW.{column}' for column in columns)});
+            END IF;
+            RETURN NULL;
+        END
+        $$
+    """)
+    cursor.execute(
+        f"CREATE TRIGGER {TRIGGER} AFTER INSERT OR UPDATE OR DELETE ON {TABLE} "
+        f"FOR EACH ROW EXECUTE FUNCTION {TRIGGER}()"
+    )
+    cursor.execute(f"SELECT COALESCE(MIN(watched_id) - 1, 0), COALESCE(MAX(watched_id), 0) FROM {TABLE}")
+    low, high = cursor.fetchone()
+    _save_progress(cursor, {'partitions': partitions, 'by_year': by_year, 'backfilled_through': low, 'high_water': high})
+
+
+def backfill_batch(cursor, batch_size):
+    """Copy the next batch_size watched_ids; return (rows copied, backfilled through, high water).
+
+    Run each batch in its own transaction. Source rows are locked FOR
+    SHARE, so a concurrent update or delete waits and its trigger then
+    sees the copied row; rows the trigger already wrote are left alone.
+    """
+    _require(cursor, 'prepared')
+    values = progress(cursor)
+    start, high = values['backfilled_through'], values['high_water']
+    if start >= high:
+        return 0, start, high
+    end = min(start + batch_size, high)
+    columns = ', '.join(_columns(cursor, TABLE))
+    cursor.execute(
+        f"""
+        INSERT INTO {SHADOW} ({columns})
+        SELECT {columns} FROM {TABLE}
+        WHERE watched_id > %s AND watched_id <= %s AND user_id IS NOT NULL
+        FOR SHARE
+        ON CONFLICT DO NOTHING
+        """,
+        [start, end],
+    )
+    copied = cursor.rowcount
+    values['backfilled_through'] = end
+    _save_progress(cursor, values)
+    return copied, end, high
+
+
+def _require_users(cursor):
+    cursor.execute(f"SELECT COUNT(*) FROM {TABLE} WHERE user_id IS NULL")
+    orphans = cursor.fetchone()[0]
+    if orphans:
+        raise PartitioningError(
+            f"{TABLE} has {orphans} rows without a user_id, which the partitioned table cannot hold; "
+            f"give them a user or delete them first."
+        )
+
+
+def verify(cursor):
+    """(rows in watch_history, rows in the partitioned table), from one snapshot."""
+    _require(cursor, 'prepared')
+    _require_users(cursor)
+    cursor.execute(f"SELECT (SELECT COUNT(*) FROM {TABLE}), (SELECT COUNT(*) FROM {SHADOW})")
+    return cursor.fetchone()
+
+
+def _dependent_views(cursor, table):
+    """[(name, relkind, definition, populated)] for views that read table."""
+    cursor.execute(
+        """
+        SELECT DISTINCT c.relname, c.relkind, pg_get_viewdef(c.oid), c.relispopulated
+        FROM pg_depend d
+        JOIN pg_rewrite r ON r.oid = d.objid
+        JOIN pg_class c ON c.oid = r.ev_class
+        WHERE d.classid = 'pg_rewrite'::regclass AND d.refobjid = %s::regclass AND c.oid <> d.refobjid
+        ORDER BY c.relname
+        """,
+        [table],
+    )
+    return cursor.fetchall()
+
+
+def swap(cursor, lock_timeout=10):
+    """Put the partitioned table in watch_history's place; run inside a transaction.
+
+    Views over watch_history are recreated on the new table. Materialized
+    views come back empty; returns the names of those that held data, for
+    the caller to refresh once this commits.
+    """
+    _require(cursor, 'prepared')
+    # Give up rather than queue every other query behind the lock
+    cursor.execute(f"SET LOCAL lock_timeout = '{int(lock_timeout)}s'")
+    cursor.execute(f"LOCK TABLE {TABLE} IN ACCESS EXCLUSIVE MODE")
+    values = progress(cursor)
+    if values['backfilled_through'] < values['high_water']:
+        raise PartitioningError(
+            f"The backfill has copied ids up to {values['backfilled_through']} of {values['high_water']}; "
+            f"finish it before swapping."
+        )
+    _require_users(cursor)
+
+    views = _dependent_views(cursor, TABLE)
+    view_indexes = {name: _indexes(cursor, name) for name, kind, _, _ in views if kind == 'm'}
+    for name, kind, _, _ in views:
+        cursor.execute(f"DROP {'MATERIALIZED VIEW' if kind == 'm' else 'VIEW'} {_quote(name)}")
+    cursor.execute(f"DROP TRIGGER {TRIGGER} ON {TABLE}")
+    cursor.execute(f"DROP FUNCTION {TRIGGER}()")
+
+    # The id sequence belongs to the old table and would be dropped with it
+    cursor.execute("SELECT pg_get_serial_sequence(%s, 'watched_id')", [TABLE])
+    sequence = cursor.fetchone()[0]
+    cursor.execute(
+        "SELECT attidentity FROM pg_attribute WHERE attrelid = %s::regclass AND attname = 'watched_id'", [TABLE],
+    )
+    if sequence and cursor.fetchone()[0]:
+        # Tables created by migrate have an identity column instead, whose
+        # sequence can't be handed over (nor, before PostgreSQL 17, can a
+        # partitioned table have one), so carry on from it with a new sequence
+        own = f'{SHADOW}_watched_id_seq'
+        cursor.execute(f"CREATE SEQUENCE {own} OWNED BY {SHADOW}.watched_id")
+        cursor.execute(f"SELECT setval(%s, last_value, is_called) FROM {sequence}", [own])
+        cursor.execute(f"ALTER TABLE {SHADOW} ALTER watched_id SET DEFAULT nextval(%s::regclass)", [own])
+    elif sequence:
+        cursor.execute(f"ALTER SEQUENCE {sequence} OWNED BY {SHADOW}.watched_id")
+
+    for name, _, _ in _indexes(cursor, TABLE):
+        cursor.execute(f"ALTER INDEX {_quote(name)} RENAME TO {_quote(name + RETIRED)}")
+    cursor.execute(f"ALTER TABLE {TABLE} RENAME TO {OLD}")
+    cursor.execute(f"ALTER TABLE {SHADOW} RENAME TO {TABLE}")
+    for name, _, _ in _indexes(cursor, TABLE):
+        if name.endswith(PENDING):
+            cursor.execute(f"ALTER INDEX {_quote(name)} RENAME TO {_quote(name[:-len(PENDING)])}")
+    cursor.execute(f"COMMENT ON TABLE {TABLE} IS NULL")
+
+    refresh = []
+    for name, kind, definition, populated in views:
+        if kind == 'm':
+            cursor.execute(f"CREATE MATERIALIZED VIEW {_quote(name)} AS {definition.rstrip().rstrip(';')} WITH NO DATA")
+            for _, index_definition, _ in view_indexes[name]:
+                cursor.execute(index_definition)
+            if populated:
+                refresh.append(name)
+        else:
+            cursor.execute(f"CREATE VIEW {_quote(name)} AS {definition.rstrip().rstrip(';')}")
+    return refresh
+
+
+def add_year_partitions(cursor, through_year):
+    """Create any missing year partitions up to through_year; return how many were made.
+
+    Rows for a year without its partition land in the default partition,
+    and a year cannot be added while the default holds rows for it, so
+    create them ahead of time.
+    """
+    current = state(cursor)
+    table = TABLE if current == 'partitioned' else SHADOW if current == 'prepared' else None
+    if table is None:
+        raise PartitioningError(f"{TABLE} is not partitioned.")
+    created = 0
+    for partition in _partitions(cursor, table):
+        if _relkind(cursor, partition) != 'p':
+            raise PartitioningError(f"{TABLE} is not partitioned by year.")
+        suffixes = [name.rsplit('_', 1)[1] for name in _partitions(cursor, partition)]
+        years = [int(suffix) for suffix in suffixes if suffix.isdigit()]
+        for year in range(max(years, default=date.today().year) + 1, through_year + 1):
+            _create_year_partition(cursor, partition, year)
+            created += 1
+    return created
+
+
+def abort(cursor):
+    """Drop the partitioned table and its trigger, leaving watch_history as it was."""
+    _require(cursor, 'prepared')
+    cursor.execute(f"DROP TRIGGER {TRIGGER} ON {TABLE}")
+    cursor.execute(f"DROP FUNCTION {TRIGGER}()")
+    cursor.execute(f"DROP TABLE {SHADOW}")
+
+
+def drop_old(cursor):
+    """Drop the unpartitioned table kept by swap(); returns whether there was one."""
+    if _relkind(cursor, OLD) is None:
+        return False
+    cursor.execute(f"DROP TABLE {OLD}")
+    return True
+
+
+def leaf_partitions(cursor):
+    """Number of tables that hold watch_history's rows."""
+    cursor.execute("SELECT COUNT(*) FROM pg_partition_tree(%s::regclass) WHERE isleaf", [TABLE])
+    return cursor.fetchone()[0]
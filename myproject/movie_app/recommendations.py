@@ -0,0 +1,24 @@
+"""Serving side of the "recommended for you" list.
+
+Recommendations are precomputed by `manage.py build_recommendations`, so
+reading a user's list is one range scan of the (user, rank) unique index,
+with the movies coming from the catalog cache.
+"""
+from .catalog import aget_many
+from .models import Movie, Recommendation
+
+
+def _movie_ids(username, limit):
+    return (
+        Recommendation.objects
+        .filter(user_id=username)
+        .order_by('rank')
+        .values_list('movie_id', flat=True)[:limit]
+    )
+
+
+async def arecommended_movies(username, limit=10):
+    """Return the user's top recommended movies, best first."""
+    movie_ids = [movie_id async for movie_id in _movie_ids(username, limit)]
+    movies = await aget_many(Movie, movie_ids)
+    return [movies[movie_id] for movie_id in movie_ids if movie_id in movies]
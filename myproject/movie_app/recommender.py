@@ -0,0 +1,178 @@
+"""Offline item-item recommender, run by `manage.py build_recommendations`.
+
+Movies are similar when the same users rated them alike (cosine over
+user-mean-centred ratings) and when they share actors or directors (cosine
+over credit vectors). The two are blended, and each movie keeps its top-K
+neighbours. A user's candidates are then scored by how well they rated
+each candidate's neighbours, and the top-K unwatched movies are stored in
+user_recommendations, so serving is one indexed lookup.
+
+Everything is vectorized with NumPy/SciPy sparse matrices. Only the ratings
+and credits matrices are held in full. Similarities are computed for a
+block of movies at a time and user scores for a block of users at a time,
+with both block sizes derived from a memory budget, so peak memory stays
+fixed as the number of ratings grows. NumPy and SciPy are only needed for
+this job, not by the web app.
+"""
+import numpy as np
+from scipy import sparse
+
+from .models import MovieActor, MovieDirector, WatchHistory
+
+
+FLOAT_BYTES = np.dtype(np.float32).itemsize
+
+
+class Codes:
+    """Assigns dense 0..n-1 codes to ids in order of first appearance."""
+
+    def __init__(self):
+        self.codes = {}
+        self.ids = []
+
+    def __len__(self):
+        return len(self.ids)
+
+    def code(self, value):
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.ids)
+            self.ids.append(value)
+        return code
+
+
+def load_ratings(users, movies, chunk_size=20000):
+    """Stream watch history into (user_codes, movie_codes, ratings) arrays."""
+    user_parts, movie_parts, rating_parts = [], [], []
+    rows = WatchHistory.objects.order_by().values_list('user_id', 'movie_id', 'rating')
+    chunk = []
+    for user_id, movie_id, rating in rows.iterator(chunk_size=chunk_size):
+        chunk.append((users.code(user_id), movies.code(movie_id), rating))
+        if len(chunk) >= chunk_size:
+            _append_chunk(chunk, user_parts, movie_parts, rating_parts)
+            chunk = []
+    _append_chunk(chunk, user_parts, movie_parts, rating_parts)
+    return (
+        np.concatenate(user_parts),
+        np.concatenate(movie_parts),
+        np.concatenate(rating_parts),
+    )
+
+
+def _append_chunk(chunk, user_parts, movie_parts, rating_parts):
+    user_codes, movie_codes, ratings = zip(*chunk) if chunk else ((), (), ())
+    user_parts.append(np.array(user_codes, dtype=np.int32))
+    movie_parts.append(np.array(movie_codes, dtype=np.int32))
+    rating_parts.append(np.array(ratings, dtype=np.float32))
+
+
+def load_credits(movies, chunk_size=20000):
+    """Return (movie_codes, person_codes, n_people) for actors and directors."""
+    people = Codes()
+    movie_codes, person_codes = [], []
+    for model, field in ((MovieActor, 'actor_id'), (MovieDirector, 'director_id')):
+        credits = model.objects.order_by().values_list('movie_id', field)
+        for movie_id, person_id in credits.iterator(chunk_size=chunk_size):
+            movie_codes.append(movies.code(movie_id))
+            person_codes.append(people.code((field, person_id)))
+    return np.array(movie_codes, dtype=np.int32), np.array(person_codes, dtype=np.int32), len(people)
+
+
+def rating_matrix(user_codes, movie_codes, ratings, n_users, n_movies):
+    """Users x movies CSR of each user's mean rating per movie (rewatches averaged)."""
+    shape = (n_users, n_movies)
+    totals = sparse.csr_matrix((ratings, (user_codes, movie_codes)), shape=shape, dtype=np.float32)
+    counts = sparse.csr_matrix((np.ones_like(ratings), (user_codes, movie_codes)), shape=shape, dtype=np.float32)
+    totals.data /= counts.data
+    return totals
+
+
+def credit_matrix(movie_codes, person_codes, n_movies, n_people):
+    """Movies x people 0/1 CSR of who is credited on what."""
+    return sparse.csr_matrix(
+        (np.ones(len(movie_codes), dtype=np.float32), (movie_codes, person_codes)),
+        shape=(n_movies, n_people),
+    ).sign()
+
+
+def _normalize_columns(matrix):
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel())
+    norms[norms == 0] = 1
+    return (matrix @ sparse.diags(1 / norms)).tocsr()
+
+
+def _centered(ratings):
+    """Subtract each user's mean rating from their ratings, keeping sparsity."""
+    counts = np.diff(ratings.indptr)
+    sums = np.asarray(ratings.sum(axis=1)).ravel()
+    means = np.divide(sums, counts, out=np.zeros_like(sums), where=counts > 0)
+    centered = ratings.copy()
+    centered.data -= np.repeat(means, counts).astype(np.float32)
+    centered.eliminate_zeros()
+    return centered
+
+
+def item_neighbors(ratings, credit_matrix, k, memory_bytes, content_weight):
+    """Movies x movies CSR holding, in column j, the top-k neighbours of movie j."""
+    n_movies = ratings.shape[1]
+    co_rated = _normalize_columns(_centered(ratings)).astype(np.float32)
+    co_rated_t = co_rated.T.tocsr()
+    co_rated = co_rated.tocsc()
+    cast = _normalize_columns(credit_matrix.T.tocsc()).astype(np.float32)
+    cast_t = cast.T.tocsr()
+    cast = cast.tocsc()
+
+    # Two dense movies x block temporaries, plus the top-k selection
+    block = max(1, memory_bytes // (3 * FLOAT_BYTES * max(n_movies, 1)))
+    keep = min(k, n_movies - 1)
+    rows, cols, data = [], [], []
+    for start in range(0, n_movies, block):
+        stop = min(start + block, n_movies)
+        scores = (1 - content_weight) * (co_rated_t @ co_rated[:, start:stop]).toarray()
+        scores += content_weight * (cast_t @ cast[:, start:stop]).toarray()
+        columns = np.arange(stop - start)
+        scores[start + columns, columns] = 0
+        if keep <= 0:
+            continue
+        top = np.argpartition(-scores, keep - 1, axis=0)[:keep]
+        values = np.take_along_axis(scores, top, axis=0)
+        positive = values > 0
+        rows.append(top[positive])
+        cols.append(np.broadcast_to(start + columns, top.shape)[positive])
+        data.append(values[positive])
+    if not rows:
+        return sparse.csr_matrix((n_movies, n_movies), dtype=np.float32)
+    return sparse.csr_matrix(
+        (np.concatenate(data), (np.concatenate(rows), np.concatenate(cols))),
+        shape=(n_movies, n_movies), dtype=np.float32,
+    )
+
+
+def recommend(ratings, neighbors, k, memory_bytes):
+    """Yield (user_code, movie_codes, scores) with each user's top-k unwatched movies.
+
+    A candidate's score is the user's ratings of its neighbours, scaled to
+    0..1 and weighted by similarity.
+    """
+    n_users, n_movies = ratings.shape
+    preference = ratings.copy()
+    preference.data /= 10
+    block = max(1, memory_bytes // (2 * FLOAT_BYTES * max(n_movies, 1)))
+    for start in range(0, n_users, block):
+        stop = min(start + block, n_users)
+        watched = preference[start:stop]
+        scores = (watched @ neighbors).toarray()
+        rows = np.repeat(np.arange(stop - start), np.diff(watched.indptr))
+        scores[rows, watched.indices] = 0
+        keep = min(k, n_movies)
+        if keep <= 0:
+            continue
+        top = np.argpartition(-scores, keep - 1, axis=1)[:, :keep]
+        values = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-values, axis=1, kind='stable')
+        top = np.take_along_axis(top, order, axis=1)
+        values = np.take_along_axis(values, order, axis=1)
+        for offset in range(stop - start):
+            positive = values[offset] > 0
+            if positive.any():
+                yield start + offset, top[offset][positive], values[offset][positive]
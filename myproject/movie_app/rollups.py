@@ -0,0 +1,253 @@
+"""Per-user monthly rollups behind windowed Wrapped summaries.
+
+Each WatchHistory write is applied to the month it falls in. That month's
+row holds the watch count, the rating sum and the best entry, and there are
+per-actor and per-director appearance counts per month. A window such as a
+year, a quarter or the last 12 months is then the sum of a few monthly rows,
+however long the history is. Counters are adjusted with INSERT ... ON
+CONFLICT DO UPDATE increments, so concurrent writes cannot lose an update.
+"""
+from collections import Counter, defaultdict
+from datetime import date
+
+from django.db import connection, transaction
+from django.db.models import Sum
+
+from . import catalog
+from .models import (
+    Actor, Director, Movie, MonthlyActorCount, MonthlyDirectorCount, MonthlyRollup, MovieActor, MovieDirector,
+    WatchHistory,
+)
+
+
+# Rows per INSERT statement, well under the bind parameter limits
+INCREMENT_BATCH_SIZE = 1000
+
+
+def month_of(day):
+    return day.replace(day=1)
+
+
+def _add_months(month, n):
+    index = month.year * 12 + month.month - 1 + n
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def parse_year(value):
+    """Return value as a year usable with year_window(), or None."""
+    try:
+        year = int(value)
+    except (TypeError, ValueError):
+        return None
+    return year if date.min.year <= year < date.max.year else None
+
+
+def year_window(year):
+    """(start, end) months covering a calendar year."""
+    return date(year, 1, 1), date(year + 1, 1, 1)
+
+
+def _rank(entry):
+    """Sort key matching order_by('-rating', '-watch_date', '-watched_id')."""
+    return (entry.rating, entry.watch_date, entry.watched_id)
+
+
+def _increment(model, key_fields, add_fields, rows):
+    """Add rows' add_fields onto model's rows matching key_fields, inserting missing ones."""
+    if not rows:
+        return
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    columns = [model._meta.get_field(name).column for name in key_fields + add_fields]
+    keys, adds = columns[:len(key_fields)], columns[len(key_fields):]
+    row_sql = '(' + ', '.join(['%s'] * len(columns)) + ')'
+    conflict = (
+        f"ON CONFLICT ({', '.join(quote(c) for c in keys)}) DO UPDATE SET "
+        + ', '.join(f"{quote(c)} = {table}.{quote(c)} + EXCLUDED.{quote(c)}" for c in adds)
+    )
+    with connection.cursor() as cursor:
+        for start in range(0, len(rows), INCREMENT_BATCH_SIZE):
+            batch = rows[start:start + INCREMENT_BATCH_SIZE]
+            cursor.execute(
+                f"INSERT INTO {table} ({', '.join(quote(c) for c in columns)}) "
+                f"VALUES {', '.join([row_sql] * len(batch))} {conflict}",
+                [value for row in batch for value in row],
+            )
+
+
+def _apply_people(user_id, changes):
+    """Apply [(month, movie_id, +1 or -1)] to the per-actor and per-director counts."""
+    movie_ids = {movie_id for _, movie_id, _ in changes}
+    for model, credit_model, field in (
+        (MonthlyActorCount, MovieActor, 'actor'),
+        (MonthlyDirectorCount, MovieDirector, 'director'),
+    ):
+        credits = defaultdict(list)
+        for movie_id, person_id in credit_model.objects.filter(movie_id__in=movie_ids).values_list('movie_id', f'{field}_id'):
+            credits[movie_id].append(person_id)
+        deltas = Counter()
+        for month, movie_id, sign in changes:
+            for person_id in credits[movie_id]:
+                deltas[(month, person_id)] += sign
+        _increment(model, ['user', 'month', field], ['appearances'], [
+            (user_id, month, person_id, n) for (month, person_id), n in deltas.items() if n
+        ])
+        if any(n < 0 for n in deltas.values()):
+            model.objects.filter(
+                user_id=user_id, month__in={month for month, _ in deltas}, appearances__lte=0,
+            ).delete()
+
+
+def _set_best(rollup, entry):
+    rollup.best_watched_id = entry.watched_id
+    rollup.best_rating = entry.rating
+    rollup.best_date = entry.watch_date
+    rollup.best_movie_id = entry.movie_id
+
+
+def _refresh_best(rollup):
+    """Find the month's best entry again, after the current one got worse or was deleted."""
+    best = (
+        WatchHistory.objects
+        .filter(user_id=rollup.user_id, watch_date__gte=rollup.month, watch_date__lt=_add_months(rollup.month, 1))
+        .order_by('-rating', '-watch_date', '-watched_id')
+        .first()
+    )
+    if best:
+        _set_best(rollup, best)
+    else:
+        rollup.best_watched_id = rollup.best_rating = rollup.best_date = rollup.best_movie_id = None
+    rollup.save(update_fields=['best_watched_id', 'best_rating', 'best_date', 'best_movie'])
+
+
+def apply_inserts(user_id, entries):
+    """Fold new entries (WatchHistory rows or summary snapshots) into their months."""
+    by_month = defaultdict(list)
+    for entry in entries:
+        by_month[month_of(entry.watch_date)].append(entry)
+    with transaction.atomic():
+        _increment(MonthlyRollup, ['user', 'month'], ['watch_count', 'rating_sum'], [
+            (user_id, month, len(batch), sum(entry.rating for entry in batch)) for month, batch in by_month.items()
+        ])
+        improved = []
+        for rollup in MonthlyRollup.objects.select_for_update().filter(user_id=user_id, month__in=by_month):
+            top = max(by_month[rollup.month], key=_rank)
+            if rollup.best_watched_id is None or _rank(top) > (rollup.best_rating, rollup.best_date, rollup.best_watched_id):
+                _set_best(rollup, top)
+                improved.append(rollup)
+        # One UPDATE however many months changed, e.g. when rebuilding a long history
+        MonthlyRollup.objects.bulk_update(improved, ['best_watched_id', 'best_rating', 'best_date', 'best_movie'])
+        _apply_people(user_id, [(month_of(entry.watch_date), entry.movie_id, 1) for entry in entries])
+
+
+def apply_delete(user_id, old):
+    """Remove a deleted entry, given its snapshot(), from its month."""
+    month = month_of(old.watch_date)
+    with transaction.atomic():
+        _increment(MonthlyRollup, ['user', 'month'], ['watch_count', 'rating_sum'], [(user_id, month, -1, -old.rating)])
+        rollup = MonthlyRollup.objects.select_for_update().get(user_id=user_id, month=month)
+        if rollup.watch_count <= 0:
+            rollup.delete()
+        elif rollup.best_watched_id == old.watched_id:
+            _refresh_best(rollup)
+        _apply_people(user_id, [(month, old.movie_id, -1)])
+
+
+def apply_update(user_id, old, entry):
+    """Apply an edit, given a snapshot() taken before the entry was changed."""
+    with transaction.atomic():
+        apply_delete(user_id, old)
+        apply_inserts(user_id, [entry])
+
+
+def rebuild_rollups(user_id):
+    """Recompute a user's rollups from their whole history, e.g. after a bulk import."""
+    with transaction.atomic():
+        for model in (MonthlyRollup, MonthlyActorCount, MonthlyDirectorCount):
+            model.objects.filter(user_id=user_id).delete()
+        entries = list(WatchHistory.objects.filter(user_id=user_id).only('watched_id', 'movie_id', 'rating', 'watch_date'))
+        if entries:
+            apply_inserts(user_id, entries)
+
+
+def _rollups(username, start, end):
+    return MonthlyRollup.objects.filter(user_id=username, month__gte=start, month__lt=end)
+
+
+def _top(model, field, username, start, end):
+    return (
+        model.objects
+        .filter(user_id=username, month__gte=start, month__lt=end)
+        .values_list(f'{field}_id')
+        .annotate(n=Sum('appearances'))
+        .order_by('-n', f'{field}_id')
+        .values_list(f'{field}_id', flat=True)[:1]
+    )
+
+
+def _summary(rollups, movies, actors, directors, top_actor_id, top_director_id):
+    total = sum(rollup.watch_count for rollup in rollups)
+    if not total:
+        return None
+    best = max(
+        (rollup for rollup in rollups if rollup.best_watched_id is not None),
+        key=lambda rollup: (rollup.best_rating, rollup.best_date, rollup.best_watched_id),
+        default=None,
+    )
+    movie = movies.get(best.best_movie_id) if best else None
+    actor = actors.get(top_actor_id)
+    director = directors.get(top_director_id)
+    return {
+        'total_movies_watched': total,
+        'avg_rating': round(sum(rollup.rating_sum for rollup in rollups) / total, 2),
+        'highest_rated_movie': movie.title if movie else None,
+        'top_actor': actor.name if actor else 'N/A',
+        'top_director': director.name if director else 'N/A',
+    }
+
+
+def window_summary(username, start, end):
+    """Summary of the user's watches in months [start, end), or None if there are none.
+
+    Reads at most one rollup row per month in the window plus the two top
+    people, so the cost does not depend on the length of the history.
+    """
+    rollups = list(_rollups(username, start, end))
+    if not rollups:
+        return None
+    top_actor_id = _top(MonthlyActorCount, 'actor', username, start, end).first()
+    top_director_id = _top(MonthlyDirectorCount, 'director', username, start, end).first()
+    return _summary(
+        rollups,
+        catalog.get_many(Movie, [rollup.best_movie_id for rollup in rollups if rollup.best_movie_id]),
+        catalog.get_many(Actor, [top_actor_id] if top_actor_id else []),
+        catalog.get_many(Director, [top_director_id] if top_director_id else []),
+        top_actor_id,
+        top_director_id,
+    )
+
+
+async def awindow_summary(username, start, end):
+    """Async version of window_summary()."""
+    rollups = [rollup async for rollup in _rollups(username, start, end)]
+    if not rollups:
+        return None
+    top_actor_id = await _top(MonthlyActorCount, 'actor', username, start, end).afirst()
+    top_director_id = await _top(MonthlyDirectorCount, 'director', username, start, end).afirst()
+    return _summary(
+        rollups,
+        await catalog.aget_many(Movie, [rollup.best_movie_id for rollup in rollups if rollup.best_movie_id]),
+        await catalog.aget_many(Actor, [top_actor_id] if top_actor_id else []),
+        await catalog.aget_many(Director, [top_director_id] if top_director_id else []),
+        top_actor_id,
+        top_director_id,
+    )
+
+
+def _years(username):
+    return MonthlyRollup.objects.filter(user_id=username).dates('month', 'year', order='DESC')
+
+
+async def aactive_years(username):
+    """Years the user has logged watches in, newest first."""
+    return [day.year async for day in _years(username)]
@@ -0,0 +1,79 @@
+"""Movie title search for the typeahead picker.
+
+Matches are case-insensitive substring matches on movies.title, with prefix
+matches ranked first. On Postgres both lookups are served by the trigram
+index on UPPER(title) added in migration 0008. Where pg_trgm was not
+installed, migration 0008 built a btree index that can only serve prefixes,
+so the search matches title prefixes only rather than scan the table.
+Results are cached per normalized query.
+"""
+import functools
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Case, IntegerField, Value, When
+
+from .models import Movie
+
+
+MIN_QUERY_LENGTH = 2
+
+
+def _normalize(query):
+    return ' '.join((query or '').split()).lower()
+
+
+def _cache_key(query, limit):
+    digest = hashlib.md5(query.encode('utf-8')).hexdigest()
+    return f'movie_app:movie_search:{limit}:{digest}'
+
+
+@functools.cache
+def _prefix_only():
+    """True on Postgres without migration 0008's trigram index."""
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM pg_indexes WHERE indexname = 'movies_title_upper_trgm_idx'")
+        return cursor.fetchone() is None
+
+
+def _matching(query):
+    if _prefix_only():
+        return Movie.objects.filter(title__istartswith=query).order_by('title', 'movie_id')
+    return (
+        Movie.objects
+        .filter(title__icontains=query)
+        .annotate(prefix_rank=Case(
+            When(title__istartswith=query, then=Value(0)),
+            default=Value(1),
+            output_field=IntegerField(),
+        ))
+        .order_by('prefix_rank', 'title', 'movie_id')
+    )
+
+
+def search_movies(query, limit=None):
+    """Return up to `limit` matching movies as dicts for the autocomplete endpoint."""
+    limit = limit or settings.MOVIE_SEARCH_LIMIT
+    query = _normalize(query)
+    if len(query) < MIN_QUERY_LENGTH:
+        return []
+
+    key = _cache_key(query, limit)
+    results = cache.get(key)
+    if results is None:
+        movies = _matching(query).values('movie_id', 'title', 'release_year')[:limit]
+        results = [
+            {
+                'id': movie['movie_id'],
+                'title': movie['title'],
+                'release_year': movie['release_year'],
+                'label': f"{movie['title']} ({movie['release_year']})",
+            }
+            for movie in movies
+        ]
+        cache.set(key, results, settings.MOVIE_SEARCH_CACHE_TIMEOUT)
+    return results
@@ -0,0 +1,86 @@
+"""Keep serial sequences ahead of the ids already in their tables.
+
+The legacy tables were loaded from a dump with explicit ids, which leaves
+their sequences behind and makes the next default-id INSERT collide. Run
+`manage.py repair_sequences` after loading data. As a safety net, the first
+insert into each serial-keyed table in a process also brings that table's
+sequence up to date, in one statement left out of the view's query budget
+(see ensure_sequences); nothing touches the database at startup.
+"""
+from django.apps import apps
+from django.db import connection
+
+from .timing import unbudgeted
+
+
+# Tables whose sequence this process has already checked
+_checked = set()
+
+# One round trip: advance the sequence only if it is behind the table. nextval()
+# keeps setval() from moving it back past ids other sessions just took.
+CATCH_UP_SQL = """
+SELECT setval(seq, GREATEST(highest, nextval(seq)))
+FROM (SELECT pg_get_serial_sequence(%s, %s)::regclass AS seq, (SELECT MAX({column}) FROM {table}) AS highest) s
+WHERE highest > COALESCE(pg_sequence_last_value(seq), 0)
+"""
+
+
+def serial_columns():
+    """Return (model, table, pk column) for the app's tables with integer ids."""
+    columns = []
+    for model in apps.get_app_config('movie_app').get_models():
+        opts = model._meta
+        # Unmanaged models are views; string keys have no sequence
+        if not opts.managed or opts.pk.get_internal_type() not in ('AutoField', 'BigAutoField', 'IntegerField'):
+            continue
+        columns.append((model, opts.db_table, opts.pk.column))
+    return columns
+
+
+def repair_sequence(table, column):
+    """Move table.column's sequence past MAX(column); never move it back.
+
+    Returns (sequence, old_value, new_value), with old == new when nothing
+    had to change, or None if the column has no sequence. Postgres only.
+    """
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_get_serial_sequence(%s, %s)", [table, column])
+        sequence = cursor.fetchone()[0]
+        if sequence is None:
+            return None
+        # pg_get_serial_sequence returns an already-quoted name
+        cursor.execute(f"SELECT last_value, is_called FROM {sequence}")
+        last_value, is_called = cursor.fetchone()
+        current = last_value if is_called else last_value - 1
+        cursor.execute(f"SELECT MAX({quote(column)}) FROM {quote(table)}")
+        highest = cursor.fetchone()[0] or 0
+        if highest <= current:
+            return sequence, current, current
+        cursor.execute("SELECT setval(%s, %s)", [sequence, highest])
+    return sequence, current, highest
+
+
+def repair_sequences():
+    """Repair every serial sequence of the app; return repair_sequence() results."""
+    if connection.vendor != 'postgresql':
+        return []
+    results = []
+    for _, table, column in serial_columns():
+        result = repair_sequence(table, column)
+        if result is not None:
+            results.append(result)
+    return results
+
+
+def ensure_sequences(sender, instance, **kwargs):
+    """pre_save guard: catch the model's sequence up once per process, before its first insert."""
+    table = sender._meta.db_table
+    if table in _checked or not instance._state.adding or instance.pk is not None:
+        return
+    if connection.vendor == 'postgresql':
+        quote = connection.ops.quote_name
+        column = sender._meta.pk.column
+        with unbudgeted(), connection.cursor() as cursor:
+            cursor.execute(CATCH_UP_SQL.format(column=quote(column), table=quote(table)), [table, column])
+    _checked.add(table)
@@ -0,0 +1,113 @@
+"""Receivers that keep summaries, rollups and caches in step with WatchHistory.
+
+Every single-row save or delete of a WatchHistory entry goes through here,
+whether it comes from a view, the admin or a cascade, so each one is applied
+to the user's WrappedSummary and monthly rollups as a delta. Writes that send
+no signals (bulk_create, COPY) call entries_added() or rebuild the affected
+users themselves; WatchHistory's QuerySet.update() reports the users it
+touched to entries_updated(). Each write also bumps the user's history write
+counter in the same transaction; the API's ETags are derived from it.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import QuerySet
+
+from . import rollups
+from .dashboard import invalidate_dashboard
+from .fragments import bump_history_version
+from .history import count_history_writes
+from .jobs import enqueue_summary_job
+from .models import User as CustomUser, WatchHistory
+from .summary import (
+    apply_watch_delete, apply_watch_inserts, apply_watch_update, loaded_snapshot, rebuild_wrapped_summary, snapshot,
+    stored_rating,
+)
+
+
+def _update_summary(user_id, apply):
+    if settings.SUMMARY_UPDATES == 'queue':
+        enqueue_summary_job(user_id)
+    else:
+        apply()
+
+
+def _changed(*user_ids):
+    for user_id in user_ids:
+        invalidate_dashboard(user_id)
+        bump_history_version(user_id)
+    count_history_writes(user_ids)
+
+
+def entries_added(user_id, entries):
+    """Fold new entries of one user into their summaries and drop their cached pages."""
+    _update_summary(user_id, lambda: apply_watch_inserts(entries, CustomUser(user_id=user_id)))
+    rollups.apply_inserts(user_id, entries)
+    _changed(user_id)
+
+
+def _entry_removed(old):
+    _update_summary(old.user_id, lambda: apply_watch_delete(old, CustomUser(user_id=old.user_id)))
+    rollups.apply_delete(old.user_id, old)
+    _changed(old.user_id)
+
+
+def entries_updated(user_ids):
+    """Drop the cached pages of users whose entries a QuerySet.update() changed.
+
+    update() applies no deltas: callers that change ratings, movies or dates
+    that way resync the affected users themselves.
+    """
+    _changed(*user_ids)
+
+
+def resync_user(user_id):
+    """Rebuild a user's summaries from their whole history, for writes no delta describes."""
+    _update_summary(user_id, lambda: rebuild_wrapped_summary(CustomUser(user_id=user_id)))
+    rollups.rebuild_rollups(user_id)
+    _changed(user_id)
+
+
+def watch_saving(sender, instance, raw=False, **kwargs):
+    """pre_save receiver: keep the instance's rating equal to what the column stores."""
+    instance.rating = stored_rating(instance.rating)
+
+
+def watch_saved(sender, instance, created, raw=False, **kwargs):
+    """post_save receiver for WatchHistory."""
+    if raw:
+        return
+    before = loaded_snapshot(instance)
+    if created:
+        entries_added(instance.user_id, [instance])
+    elif before is None:
+        # Deferred fields or a hand-built instance: nothing to diff against
+        resync_user(instance.user_id)
+    elif before.user_id != instance.user_id:
+        _entry_removed(before)
+        entries_added(instance.user_id, [instance])
+    else:
+        _update_summary(instance.user_id, lambda: apply_watch_update(before, instance))
+        rollups.apply_update(instance.user_id, before, instance)
+        _changed(instance.user_id)
+    # The next save of this instance diffs against what it holds now
+    instance._loaded_values = snapshot(instance)._asdict()
+
+
+def _origin_model(origin):
+    return origin.model if isinstance(origin, QuerySet) else type(origin)
+
+
+def watch_deleted(sender, instance, origin=None, **kwargs):
+    """post_delete receiver for WatchHistory."""
+    origin_model = _origin_model(origin)
+    if origin_model is CustomUser:
+        # The owner is going, and their summaries with them
+        return
+    if origin_model is not WatchHistory:
+        # A cascade, e.g. from a deleted movie whose credits may already be
+        # gone: rebuild from what is left once everything is deleted
+        user_id = instance.user_id
+        count_history_writes([user_id])
+        transaction.on_commit(lambda: resync_user(user_id))
+        return
+    _entry_removed(loaded_snapshot(instance) or snapshot(instance))
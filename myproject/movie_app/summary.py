@@ -0,0 +1,353 @@
+"""Incremental maintenance of WrappedSummary rows.
+
+Each write to WatchHistory is applied to the user's summary as a delta (see
+movie_app.signals). The summary row keeps a running rating sum and count, the
+best-rated entry, and per-actor appearance counters (ActorAppearance). A full
+rebuild only happens for a summary that is missing or not yet
+incremental_ready.
+"""
+import functools
+from collections import Counter, namedtuple
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Avg, Count, Sum
+
+from . import catalog
+from .bulk import column_is_integer
+from .models import ActorAppearance, MovieActor, User as CustomUser, WatchHistory, WrappedSummary, WrappedSummarySnapshot
+from .timing import unbudgeted
+
+
+# The fields of a WatchHistory row that feed into the summary. Edits are
+# diffed against the snapshot of the row as it was loaded.
+WatchSnapshot = namedtuple('WatchSnapshot', ['watched_id', 'user_id', 'movie_id', 'rating', 'watch_date'])
+
+
+def snapshot(entry):
+    """Capture the summary-relevant fields of a WatchHistory entry."""
+    return WatchSnapshot(entry.watched_id, entry.user_id, entry.movie_id, entry.rating, entry.watch_date)
+
+
+def loaded_snapshot(entry):
+    """snapshot() of the entry as it was loaded from the database, or None if unknown."""
+    values = getattr(entry, '_loaded_values', None) or {}
+    if not all(name in values for name in WatchSnapshot._fields):
+        return None
+    return WatchSnapshot(*(values[name] for name in WatchSnapshot._fields))
+
+
+@functools.cache
+def _integer_ratings():
+    with unbudgeted():
+        return column_is_integer('watch_history', 'rating')
+
+
+def stored_rating(rating):
+    """rating as watch_history will store it.
+
+    The legacy rating column is INT although the model says FloatField, and
+    Postgres rounds halves to even on the way in, as round() does. Deltas
+    have to use the stored value or the running sums drift from a rebuild.
+    """
+    if rating is not None and _integer_ratings():
+        return round(rating)
+    return rating
+
+
+def _rank(rating, watch_date, watched_id):
+    """Sort key matching order_by('-rating', '-watch_date', '-watched_id')."""
+    return (rating, watch_date, watched_id)
+
+
+def _best_rank(wrapped):
+    if wrapped.highest_rated_watched_id is None:
+        return None
+    return _rank(wrapped.highest_rating, wrapped.highest_rated_date, wrapped.highest_rated_watched_id)
+
+
+def _set_best(wrapped, entry):
+    wrapped.highest_rated_watched_id = entry.watched_id
+    wrapped.highest_rating = entry.rating
+    wrapped.highest_rated_date = entry.watch_date
+    wrapped.highest_rated_movie = entry.movie.title
+
+
+def _clear_best(wrapped):
+    wrapped.highest_rated_watched_id = None
+    wrapped.highest_rating = None
+    wrapped.highest_rated_date = None
+    wrapped.highest_rated_movie = None
+
+
+def _best_entry(user_id):
+    # One row off watch_history_user_rating_idx
+    return (
+        WatchHistory.objects
+        .filter(user_id=user_id)
+        .select_related('movie')
+        .order_by('-rating', '-watch_date', '-watched_id')
+        .first()
+    )
+
+
+def _refresh_best(wrapped):
+    """Find the best entry again, after the current one got worse or was deleted."""
+    top = _best_entry(wrapped.user_id)
+    if top:
+        _set_best(wrapped, top)
+    else:
+        _clear_best(wrapped)
+
+
+def _set_average(wrapped):
+    if wrapped.total_movies_watched:
+        wrapped.avg_rating = Decimal(round(wrapped.rating_sum / wrapped.total_movies_watched, 2))
+    else:
+        wrapped.avg_rating = None
+        wrapped.rating_sum = 0
+
+
+def _set_top_actor(wrapped, actor, count):
+    wrapped.top_actor_ref = actor
+    wrapped.top_actor_count = count if actor else 0
+    wrapped.top_actor = actor.name if actor else 'N/A'
+
+
+def _actor_counts_for_movie(movie_id):
+    """Return {actor_id: 1} for every actor credited on a single movie."""
+    return dict.fromkeys(MovieActor.objects.filter(movie_id=movie_id).values_list('actor_id', flat=True), 1)
+
+
+def _actor_counts_for_movies(movie_ids):
+    """Return {actor_id: appearances} across movie_ids, repeats included."""
+    watched = Counter(movie_ids)
+    counts = Counter()
+    credits = MovieActor.objects.filter(movie_id__in=watched).values_list('movie_id', 'actor_id')
+    for movie_id, actor_id in credits:
+        counts[actor_id] += watched[movie_id]
+    return counts
+
+
+def _select_top_actor(wrapped):
+    top = (
+        ActorAppearance.objects
+        .filter(user_id=wrapped.user_id)
+        .select_related('actor')
+        .order_by('-appearances', 'actor_id')
+        .first()
+    )
+    if top:
+        _set_top_actor(wrapped, top.actor, top.appearances)
+    else:
+        _set_top_actor(wrapped, None, 0)
+
+
+def _apply_actor_deltas(wrapped, deltas):
+    """Add {actor_id: delta} to the user's counters and refresh the top actor."""
+    deltas = {actor_id: n for actor_id, n in deltas.items() if n}
+    if not deltas:
+        return
+
+    current = dict(
+        ActorAppearance.objects
+        .filter(user_id=wrapped.user_id, actor_id__in=deltas)
+        .values_list('actor_id', 'appearances')
+    )
+    updated = {actor_id: current.get(actor_id, 0) + n for actor_id, n in deltas.items()}
+
+    dropped = [actor_id for actor_id, n in updated.items() if n <= 0]
+    if dropped:
+        ActorAppearance.objects.filter(user_id=wrapped.user_id, actor_id__in=dropped).delete()
+    kept = [
+        ActorAppearance(user_id=wrapped.user_id, actor_id=actor_id, appearances=n)
+        for actor_id, n in updated.items() if n > 0
+    ]
+    if kept:
+        ActorAppearance.objects.bulk_create(
+            kept,
+            update_conflicts=True,
+            unique_fields=['user', 'actor'],
+            update_fields=['appearances'],
+        )
+
+    top_id = wrapped.top_actor_ref_id
+    if top_id is not None and deltas.get(top_id, 0) < 0:
+        # The leader lost appearances; someone else may now be ahead.
+        _select_top_actor(wrapped)
+        return
+
+    best_id, best_count = top_id, wrapped.top_actor_count
+    if top_id in updated:
+        best_count = updated[top_id]
+    for actor_id, n in updated.items():
+        if deltas[actor_id] > 0 and (n, -actor_id) > (best_count, -(best_id or 0)):
+            best_id, best_count = actor_id, n
+    if best_id != top_id:
+        _set_top_actor(wrapped, catalog.get_actor(best_id), best_count)
+    else:
+        wrapped.top_actor_count = best_count
+
+
+def _locked_summary(custom_user):
+    """Return the user's summary row locked for update, or None."""
+    return (
+        WrappedSummary.objects
+        .select_for_update()
+        .filter(user=custom_user)
+        .order_by('summary_id')
+        .first()
+    )
+
+
+def rebuild_wrapped_summary(custom_user):
+    """Recompute and persist WrappedSummary values for a given CustomUser."""
+    if not custom_user:
+        return None
+    user_id = custom_user.user_id
+
+    with transaction.atomic():
+        wh_qs = WatchHistory.objects.filter(user_id=user_id)
+        totals = wh_qs.aggregate(total=Count('watched_id'), rating_sum=Sum('rating'), avg=Avg('rating'))
+
+        wrapped = _locked_summary(custom_user)
+        if wrapped is None:
+            wrapped = WrappedSummary(user=custom_user, top_actor='N/A', total_movies_watched=0)
+
+        wrapped.total_movies_watched = totals['total'] or 0
+        wrapped.rating_sum = totals['rating_sum'] or 0
+        avg = totals['avg']
+        wrapped.avg_rating = Decimal(round(avg, 2)) if avg is not None else None
+
+        _refresh_best(wrapped)
+
+        # Rebuild the per-actor counters from scratch
+        ActorAppearance.objects.filter(user_id=user_id).delete()
+        counts = (
+            MovieActor.objects
+            .filter(movie__watchhistory__user_id=user_id)
+            .values_list('actor_id')
+            .annotate(n=Count('id'))
+        )
+        ActorAppearance.objects.bulk_create(
+            ActorAppearance(user_id=user_id, actor_id=actor_id, appearances=n)
+            for actor_id, n in counts
+        )
+        _select_top_actor(wrapped)
+
+        wrapped.incremental_ready = True
+        wrapped.save()
+    return wrapped
+
+
+def apply_watch_inserts(entries, custom_user):
+    """Fold a batch of newly created entries of one user into their summary.
+
+    Costs the same handful of queries however many entries there are.
+    """
+    with transaction.atomic():
+        wrapped = _locked_summary(custom_user)
+        if wrapped is None or not wrapped.incremental_ready:
+            return rebuild_wrapped_summary(custom_user)
+
+        wrapped.total_movies_watched += len(entries)
+        wrapped.rating_sum += sum(entry.rating for entry in entries)
+        _set_average(wrapped)
+
+        top = max(entries, key=lambda entry: _rank(entry.rating, entry.watch_date, entry.watched_id))
+        best = _best_rank(wrapped)
+        if best is None or _rank(top.rating, top.watch_date, top.watched_id) > best:
+            _set_best(wrapped, top)
+
+        _apply_actor_deltas(wrapped, _actor_counts_for_movies([entry.movie_id for entry in entries]))
+        wrapped.save()
+    return wrapped
+
+
+def apply_watch_update(old, entry):
+    """Apply an edit, given a snapshot() taken before the entry was changed."""
+    # A bare reference: entry.user would load the users row
+    custom_user = CustomUser(user_id=entry.user_id)
+    with transaction.atomic():
+        wrapped = _locked_summary(custom_user)
+        if wrapped is None or not wrapped.incremental_ready:
+            return rebuild_wrapped_summary(custom_user)
+
+        wrapped.rating_sum += entry.rating - old.rating
+        _set_average(wrapped)
+
+        new_rank = _rank(entry.rating, entry.watch_date, entry.watched_id)
+        if wrapped.highest_rated_watched_id == entry.watched_id:
+            if new_rank < _rank(old.rating, old.watch_date, old.watched_id):
+                # The best entry got worse; another entry may now beat it
+                _refresh_best(wrapped)
+            else:
+                _set_best(wrapped, entry)
+        elif _best_rank(wrapped) is None or new_rank > _best_rank(wrapped):
+            _set_best(wrapped, entry)
+
+        if old.movie_id != entry.movie_id:
+            deltas = {actor_id: -n for actor_id, n in _actor_counts_for_movie(old.movie_id).items()}
+            for actor_id, n in _actor_counts_for_movie(entry.movie_id).items():
+                deltas[actor_id] = deltas.get(actor_id, 0) + n
+            _apply_actor_deltas(wrapped, deltas)
+        wrapped.save()
+    return wrapped
+
+
+def apply_watch_delete(old, custom_user):
+    """Remove a deleted entry, given its snapshot(), from the user's summary."""
+    with transaction.atomic():
+        wrapped = _locked_summary(custom_user)
+        if wrapped is None or not wrapped.incremental_ready:
+            return rebuild_wrapped_summary(custom_user)
+
+        wrapped.total_movies_watched -= 1
+        wrapped.rating_sum -= old.rating
+        _set_average(wrapped)
+        if wrapped.highest_rated_watched_id == old.watched_id:
+            _refresh_best(wrapped)
+
+        deltas = {actor_id: -n for actor_id, n in _actor_counts_for_movie(old.movie_id).items()}
+        _apply_actor_deltas(wrapped, deltas)
+        wrapped.save()
+    return wrapped
+
+
+async def aget_wrapped_summary(username):
+    """Return the summary row the Wrapped page should show, or None.
+
+    With WRAPPED_SUMMARY_BACKEND = 'materialized' this reads the
+    wrapped_summary_mv snapshot, which is only as fresh as its last refresh.
+    Otherwise, or until the view's first refresh, it reads the incrementally
+    maintained wrapped_summary table.
+    """
+    populated = _snapshot_seen_populated
+    if settings.WRAPPED_SUMMARY_BACKEND == 'materialized' and not populated:
+        populated = await sync_to_async(_snapshot_populated)()
+    return await _summary_model(populated).objects.filter(user_id=username).afirst()
+
+
+# Once refreshed, the view never goes back to holding no data
+_snapshot_seen_populated = False
+
+
+def _snapshot_populated():
+    """Whether wrapped_summary_mv can be read; migration 0010 creates it WITH NO DATA."""
+    global _snapshot_seen_populated
+    if (settings.WRAPPED_SUMMARY_BACKEND != 'materialized' or connection.vendor != 'postgresql'
+            or _snapshot_seen_populated):
+        return _snapshot_seen_populated
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT ispopulated FROM pg_matviews WHERE matviewname = 'wrapped_summary_mv'")
+        row = cursor.fetchone()
+    _snapshot_seen_populated = bool(row and row[0])
+    return _snapshot_seen_populated
+
+
+def _summary_model(populated):
+    if settings.WRAPPED_SUMMARY_BACKEND == 'materialized' and populated:
+        return WrappedSummarySnapshot
+    return WrappedSummary
@@ -1,3 +1,706 @@
-from django.test import TestCase
-
-# Create your tests here.
+import os
+import tempfile
+from datetime import date
+from importlib import import_module
+from io import StringIO
+from unittest import mock, skipUnless
+
+from django.contrib.auth.models import User as AuthUser
+from django.core.cache import caches
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import jobs, partitioning, rollups, summary
+from .fragments import history_version
+from .fulltext import search_movie_text, search_reviews
+from .history import encode_cursor
+from .identity import create_profile
+from .models import (
+    ActorAppearance, Actor, Director, MonthlyActorCount, MonthlyRollup, Movie, MovieActor, MovieDirector,
+    Recommendation, SummaryJob, WatchHistory, WrappedSummary,
+)
+from .summary import _integer_ratings, rebuild_wrapped_summary
+
+
+def summary_state(username):
+    """Everything the write paths maintain for a user, in comparable form."""
+    wrapped = WrappedSummary.objects.get(user_id=username)
+    return (
+        (
+            wrapped.total_movies_watched, wrapped.avg_rating, round(wrapped.rating_sum, 6),
+            wrapped.highest_rated_watched_id, wrapped.highest_rated_movie, wrapped.top_actor_count,
+        ),
+        sorted(ActorAppearance.objects.filter(user_id=username).values_list('actor_id', 'appearances')),
+        sorted(
+            MonthlyRollup.objects.filter(user_id=username)
+            .values_list('month', 'watch_count', 'rating_sum', 'best_watched_id')
+        ),
+        sorted(MonthlyActorCount.objects.filter(user_id=username).values_list('month', 'actor_id', 'appearances')),
+    )
+
+
+def rebuilt_state(username):
+    rebuild_wrapped_summary(WrappedSummary.objects.get(user_id=username).user)
+    rollups.rebuild_rollups(username)
+    return summary_state(username)
+
+
+def add_search_vectors():
+    """Add the tsvector columns from migration 0017 on PostgreSQL.
+
+    The test database is built from models.py, which does not declare them.
+    """
+    if connection.vendor != 'postgresql':
+        return
+    full_text = import_module('movie_app.migrations.0017_full_text_search')
+    with connection.cursor() as cursor:
+        for table, column, expression, _ in full_text.COLUMNS:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} tsvector GENERATED ALWAYS AS ({expression}) STORED")
+
+
+def drop_search_vectors():
+    if connection.vendor != 'postgresql':
+        return
+    full_text = import_module('movie_app.migrations.0017_full_text_search')
+    with connection.cursor() as cursor:
+        for table, column, _, _ in full_text.COLUMNS:
+            cursor.execute(f"ALTER TABLE {table} DROP COLUMN {column}")
+
+
+def write_temp_file(testcase, name, text):
+    """Write text to a file removed when the test ends; return its path."""
+    directory = tempfile.TemporaryDirectory()
+    testcase.addCleanup(directory.cleanup)
+    path = os.path.join(directory.name, name)
+    with open(path, 'w', encoding='utf-8') as handle:
+        handle.write(text)
+    return path
+
+
+class MovieAppFixtures:
+    """Three movies with overlapping casts and one director, and a user 'alice'."""
+
+    @classmethod
+    def create_fixtures(cls):
+        cls.actors = [Actor.objects.create(actor_id=i, name=f'Actor {i}', birth_year=1970 + i) for i in range(1, 4)]
+        cls.director = Director.objects.create(director_id=1, name='Director One', birth_year=1960)
+        cls.movies = []
+        for i, cast in enumerate([[0, 1], [1, 2], [2]]):
+            movie = Movie.objects.create(title=f'Movie {i}', release_year=2000 + i, plot='', runtime='90')
+            for actor in cast:
+                MovieActor.objects.create(movie=movie, actor=cls.actors[actor])
+            MovieDirector.objects.create(movie=movie, director=cls.director)
+            cls.movies.append(movie)
+        cls.user = AuthUser.objects.create_user('alice', password='secret')
+        create_profile(cls.user, date(1990, 1, 1))
+
+    def setUp(self):
+        super().setUp()
+        for cache in caches.all():
+            cache.clear()
+        self.client.force_login(self.user)
+
+    def add(self, movie, watch_date, rating):
+        return self.client.post(reverse('add_movie'), {
+            'movie': movie.pk, 'watch_date': watch_date, 'rating': rating, 'review': '',
+        })
+
+    def entry(self, watch_date, rating=7, movie=None, review=''):
+        return WatchHistory.objects.create(
+            user_id='alice', movie=movie or self.movies[0], watch_date=watch_date, rating=rating, review=review,
+        )
+
+
+# TestCase turns every atomic block into a savepoint, which counts as
+# queries; QueryBudgetTests checks the budgets outside of one
+@override_settings(QUERY_BUDGET_MODE='off', SUMMARY_UPDATES='inline')
+class MovieAppTestCase(MovieAppFixtures, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.create_fixtures()
+
+
+class WatchHistoryWriteTests(MovieAppTestCase):
+    def assertMatchesRebuild(self):
+        incremental = summary_state('alice')
+        self.assertEqual(incremental, rebuilt_state('alice'))
+
+    def test_view_writes_update_summaries_as_deltas(self):
+        self.add(self.movies[0], '2024-01-05', 8)
+        self.add(self.movies[1], '2024-02-10', 6.5)
+        self.assertMatchesRebuild()
+        entry = WatchHistory.objects.get(movie=self.movies[0])
+        self.client.post(reverse('edit_watch_entry', args=[entry.pk]), {
+            'movie': self.movies[2].pk, 'watch_date': '2023-12-31', 'rating': 9.5, 'review': 'moved',
+        })
+        self.assertMatchesRebuild()
+        self.client.post(reverse('edit_watch_entry', args=[entry.pk]), {'delete': '1'})
+        self.assertMatchesRebuild()
+        self.assertEqual(WrappedSummary.objects.get(user_id='alice').total_movies_watched, 1)
+
+    def test_batch_add(self):
+        data = {'form-TOTAL_FORMS': '3', 'form-INITIAL_FORMS': '0', 'form-MIN_NUM_FORMS': '1', 'form-MAX_NUM_FORMS': '100'}
+        for i, movie in enumerate(self.movies):
+            data.update({
+                f'form-{i}-movie': movie.pk, f'form-{i}-watch_date': f'2024-0{i + 1}-01',
+                f'form-{i}-rating': 5 + i, f'form-{i}-review': '',
+            })
+        self.client.post(reverse('add_movies'), data)
+        self.assertEqual(WatchHistory.objects.filter(user_id='alice').count(), 3)
+        self.assertMatchesRebuild()
+
+    def test_saves_and_queryset_deletes_outside_views(self):
+        best = self.entry(date(2024, 3, 1), rating=10)
+        other = self.entry(date(2024, 3, 2), rating=4, movie=self.movies[1])
+        other.rating = 9
+        other.save()
+        self.assertMatchesRebuild()
+        WatchHistory.objects.filter(pk=best.pk).delete()
+        self.assertMatchesRebuild()
+        self.assertEqual(WrappedSummary.objects.get(user_id='alice').highest_rated_watched_id, other.pk)
+
+    def test_movie_delete_cascades_into_a_resync(self):
+        self.entry(date(2024, 3, 1), movie=self.movies[0])
+        self.entry(date(2024, 3, 2), movie=self.movies[1])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.movies[0].delete()
+        self.assertMatchesRebuild()
+        self.assertEqual(WrappedSummary.objects.get(user_id='alice').total_movies_watched, 1)
+
+    @skipUnless(connection.vendor == 'postgresql', "the legacy INT rating column is only recreated on PostgreSQL")
+    def test_half_ratings_match_an_integer_column(self):
+        with connection.cursor() as cursor:
+            cursor.execute("ALTER TABLE watch_history ALTER COLUMN rating TYPE integer USING round(rating)")
+        _integer_ratings.cache_clear()
+        self.addCleanup(_integer_ratings.cache_clear)
+        self.add(self.movies[0], '2024-01-05', 7.5)
+        self.add(self.movies[1], '2024-01-06', 6.5)
+        entry = self.entry(date(2024, 1, 7), rating=2.5, movie=self.movies[2])
+        self.assertEqual(entry.rating, WatchHistory.objects.get(pk=entry.pk).rating)
+        self.assertMatchesRebuild()
+
+    def test_year_window_adds_up_monthly_rollups(self):
+        self.entry(date(2023, 12, 31), rating=2)
+        self.entry(date(2024, 1, 1), rating=6, movie=self.movies[1])
+        self.entry(date(2024, 11, 30), rating=9, movie=self.movies[2])
+        summary = rollups.window_summary('alice', *rollups.year_window(2024))
+        self.assertEqual(summary['total_movies_watched'], 2)
+        self.assertEqual(summary['avg_rating'], 7.5)
+        self.assertEqual(summary['highest_rated_movie'], self.movies[2].title)
+        self.assertEqual(summary['top_director'], self.director.name)
+        self.assertIsNone(rollups.window_summary('alice', *rollups.year_window(2022)))
+
+    def test_usernames_must_fit_the_profile_key(self):
+        response = self.client.post(reverse('register'), {
+            'username': 'u' * 101, 'email': 'u@example.com', 'first_name': 'U', 'last_name': 'V',
+            'password': 'secret', 'password_confirm': 'secret', 'birthday': '2000-01-01',
+        })
+        self.assertIn("username: Usernames can be at most 100 characters long.", map(str, response.context['messages']))
+        self.assertFalse(AuthUser.objects.filter(username='u' * 101).exists())
+
+
+class HistoryApiTests(MovieAppTestCase):
+    def setUp(self):
+        super().setUp()
+        # Two entries share a date, so the cursor has to break the tie by id
+        self.entries = [
+            self.entry(date(2024, 1, day), movie=self.movies[day % 3]) for day in (1, 2, 2, 3, 5)
+        ]
+
+    def test_keyset_pages_cover_the_history_once(self):
+        seen, cursor = [], None
+        while True:
+            params = {'page_size': 2, **({'cursor': cursor} if cursor else {})}
+            body = self.client.get(reverse('api_watch_history'), params).json()
+            seen.extend(entry['id'] for entry in body['results'])
+            cursor = body['next_cursor']
+            if cursor is None:
+                break
+        expected = sorted(self.entries, key=lambda entry: (entry.watch_date, entry.watched_id), reverse=True)
+        self.assertEqual(seen, [entry.pk for entry in expected])
+
+    def test_cursor_resumes_after_the_last_row(self):
+        newest_first = sorted(self.entries, key=lambda entry: (entry.watch_date, entry.watched_id), reverse=True)
+        body = self.client.get(reverse('api_watch_history'), {'cursor': encode_cursor(newest_first[2])}).json()
+        self.assertEqual([entry['id'] for entry in body['results']], [entry.pk for entry in newest_first[3:]])
+
+    def test_etag_answers_304_until_the_rows_change(self):
+        url = reverse('api_watch_history')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        # No signal and no cache bump: the ETag still has to follow the row
+        WatchHistory.objects.filter(pk=self.entries[-1].pk).update(review='edited elsewhere')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_not_modified_is_answered_before_the_page_is_read(self):
+        url = reverse('api_watch_history')
+        etag = self.client.get(url)['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        self.assertFalse([query for query in queries if 'FROM "watch_history"' in query['sql']])
+
+    def test_every_write_path_changes_the_etag(self):
+        url = reverse('api_watch_history')
+        edited = self.entries[0]
+        writes = [
+            lambda: self.entry(date(2024, 2, 1)),
+            lambda: self.add(self.movies[1], '2024-02-02', 6),
+            lambda: edited.save(),
+            lambda: WatchHistory.objects.filter(pk=self.entries[1].pk).delete(),
+            lambda: WatchHistory.objects.filter(user_id='alice').update(review='bulk'),
+        ]
+        etag = self.client.get(url)['ETag']
+        for write in writes:
+            write()
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+            etag = response['ETag']
+
+    def test_requires_login(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('api_watch_history')).status_code, 401)
+
+
+class FragmentCacheTests(MovieAppTestCase):
+    def history_page(self):
+        return self.client.get(reverse('watch_history'))
+
+    def test_history_rows_are_cached_until_a_write_commits(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            entry = self.entry(date(2024, 1, 1), review='first take')
+        self.assertContains(self.history_page(), 'first take')
+        # Behind the app's back: nothing bumps the version, so the cached rows stay
+        with connection.cursor() as cursor:
+            cursor.execute("UPDATE watch_history SET review = 'unseen' WHERE watched_id = %s", [entry.pk])
+        self.assertContains(self.history_page(), 'first take')
+        with self.captureOnCommitCallbacks(execute=True):
+            entry.review = 'second take'
+            entry.save()
+        self.assertContains(self.history_page(), 'second take')
+
+    def test_version_moves_only_on_commit(self):
+        before = history_version('alice')
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.entry(date(2024, 1, 1))
+        self.assertEqual(history_version('alice'), before)
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(history_version('alice'), before)
+
+
+@skipUnless(connection.vendor == 'postgresql', "ranked full-text search needs PostgreSQL")
+class FullTextSearchTests(MovieAppTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        add_search_vectors()
+        for title, plot in (
+            ('The Keepers', 'Two lighthouse keepers slowly lose their minds on a remote island.'),
+            ('Island Life', 'A year with the seabirds of a windswept island.'),
+            ('Island Birds', 'A documentary about gulls.'),
+        ):
+            Movie.objects.create(title=title, release_year=2019, plot=plot, runtime='100')
+
+    def test_title_matches_rank_above_plot_matches(self):
+        results = search_movie_text('island -documentary')
+        self.assertEqual([movie['title'] for movie in results], ['Island Life', 'The Keepers'])
+        self.assertIn('\x02island\x03', results[1]['snippet'])
+
+    def test_reviews_are_searched_per_user(self):
+        create_profile(AuthUser.objects.create_user('bob'), date(1990, 1, 1))
+        mine = self.entry(date(2024, 1, 1), review='A haunting lighthouse story, haunting all the way.')
+        self.entry(date(2024, 1, 2), review='Haunting score.')
+        self.entry(date(2024, 1, 3), review='Fun and light.')
+        WatchHistory.objects.create(
+            user_id='bob', movie=self.movies[1], watch_date=date(2024, 1, 1), rating=7, review='So haunting.',
+        )
+        results = search_reviews('alice', 'haunting lighthouse')
+        self.assertEqual(results, [mine])
+        self.assertEqual(results[0].movie, self.movies[0])
+        self.assertEqual(len(search_reviews('alice', 'haunting')), 2)
+
+
+class AdminSearchTests(MovieAppTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        add_search_vectors()
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(AuthUser.objects.create_superuser('admin', password='secret'))
+
+    def search(self, model, term):
+        return self.client.get(reverse(f'admin:movie_app_{model}_changelist'), {'q': term})
+
+    def test_credit_search_takes_ids_only(self):
+        credit = MovieActor.objects.filter(movie=self.movies[1]).first()
+        response = self.search('movieactor', str(credit.actor_id))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(credit, response.context['cl'].result_list)
+        for term in ('Actor', '99999999999999999999'):
+            response = self.search('movieactor', term)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(len(response.context['cl'].result_list), 0)
+        self.assertEqual(self.search('moviedirector', str(self.director.pk)).status_code, 200)
+
+    def test_watch_history_search_by_user_and_title(self):
+        mine = self.entry(date(2024, 1, 1), movie=self.movies[1])
+        by_user = self.search('watchhistory', 'alice')
+        self.assertEqual(list(by_user.context['cl'].result_list), [mine])
+        by_title = self.search('watchhistory', 'Movie 1')
+        self.assertEqual(list(by_title.context['cl'].result_list), [mine])
+        self.assertEqual(len(self.search('watchhistory', 'ali').context['cl'].result_list), 0)
+
+
+@override_settings(SUMMARY_UPDATES='queue', SUMMARY_JOB_MAX_ATTEMPTS=2)
+class SummaryJobTests(MovieAppTestCase):
+    def test_writes_coalesce_into_one_job(self):
+        self.add(self.movies[0], '2024-01-05', 8)
+        self.add(self.movies[1], '2024-01-06', 6)
+        self.assertEqual(SummaryJob.objects.filter(user_id='alice').count(), 1)
+        [job] = jobs.claim_summary_jobs(10)
+        self.assertTrue(jobs.run_summary_job(job))
+        self.assertFalse(SummaryJob.objects.exists())
+        self.assertEqual(summary_state('alice'), rebuilt_state('alice'))
+
+    def test_write_during_a_run_keeps_the_claim_and_reruns(self):
+        jobs.enqueue_summary_job('alice')
+        [job] = jobs.claim_summary_jobs(10)
+        jobs.enqueue_summary_job('alice')
+        # Still claimed: a second worker must not start the same recompute
+        self.assertEqual(SummaryJob.objects.get(pk='alice').claimed_at, job.claimed_at)
+        self.assertEqual(jobs.claim_summary_jobs(10), [])
+        self.assertTrue(jobs.run_summary_job(job))
+        [rerun] = jobs.claim_summary_jobs(10)
+        self.assertTrue(jobs.run_summary_job(rerun))
+        self.assertFalse(SummaryJob.objects.exists())
+
+    def test_failed_jobs_stop_until_retried(self):
+        jobs.enqueue_summary_job('alice')
+        with mock.patch.object(jobs, 'rebuild_wrapped_summary', side_effect=RuntimeError('boom')), \
+                self.assertLogs('movie_app.jobs', 'WARNING'):
+            for _ in range(2):
+                [job] = jobs.claim_summary_jobs(10)
+                self.assertFalse(jobs.run_summary_job(job))
+        self.assertEqual(jobs.claim_summary_jobs(10), [])
+        self.assertIn('boom', jobs.failed_summary_jobs().get().last_error)
+        self.assertEqual(jobs.retry_failed_summary_jobs(), 1)
+        self.assertEqual(len(jobs.claim_summary_jobs(10)), 1)
+
+
+class ImportWatchHistoryTests(MovieAppTestCase):
+    def import_history(self, name, text, *args):
+        out = StringIO()
+        call_command('import_watch_history', write_temp_file(self, name, text), *args, stdout=out)
+        return out.getvalue()
+
+    def test_loads_resolvable_rows_and_rebuilds_summaries(self):
+        self.add(self.movies[2], '2024-02-01', 5)
+        out = self.import_history('history.csv', (
+            "user_id,title,release_year,watch_date,rating,review\n"
+            "alice,Movie 0,2000,2024-03-01,8,great\n"
+            "alice,movie 1,,2024-03-02,6,\n"
+            "alice,Movie 9,2009,2024-03-03,7,\n"
+            "mallory,Movie 0,2000,2024-03-04,7,\n"
+            "alice,Movie 2,2002,2024-03-05,11,\n"
+        ))
+        self.assertIn("Loaded 2 rows", out)
+        for reason in ("title not in catalog", "unknown or missing user", "rating outside 1-10"):
+            self.assertIn(f"Skipped 1 rows: {reason}", out)
+        self.assertEqual(
+            sorted(WatchHistory.objects.filter(user_id='alice').values_list('movie__title', 'rating', 'review')),
+            [('Movie 0', 8, 'great'), ('Movie 1', 6, ''), ('Movie 2', 5, '')],
+        )
+        self.assertTrue(WrappedSummary.objects.get(user_id='alice').incremental_ready)
+        self.assertEqual(summary_state('alice'), rebuilt_state('alice'))
+
+    def test_jsonl_export_with_a_default_user_and_rating_scale(self):
+        self.import_history(
+            'ratings.jsonl',
+            '{"Name": "Movie 2", "Year": 2002, "Date": "2024-04-01", "Rating": 4.5}\n',
+            '--user', 'alice', '--rating-scale', '2',
+        )
+        self.assertEqual(WatchHistory.objects.get(user_id='alice').rating, 9)
+        self.assertEqual(WrappedSummary.objects.get(user_id='alice').total_movies_watched, 1)
+
+
+@skipUnless(connection.vendor == 'postgresql', "load_catalog needs PostgreSQL")
+class LoadCatalogTests(MovieAppTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # People ids are serials in the legacy schema; models.py declares them
+        # as plain integers, so the test database has no sequence to take from
+        with connection.cursor() as cursor:
+            for table, column in (('actors', 'actor_id'), ('directors', 'director_id')):
+                cursor.execute(f"CREATE SEQUENCE {table}_{column}_seq OWNED BY {table}.{column}")
+                cursor.execute(f"ALTER TABLE {table} ALTER {column} SET DEFAULT nextval('{table}_{column}_seq')")
+
+    def tsv(self, name, *rows):
+        return write_temp_file(self, name, ''.join('\t'.join(row) + '\n' for row in rows))
+
+    def test_dedups_movies_and_people_and_merges_credits(self):
+        basics = self.tsv(
+            'title.basics.tsv',
+            ('tconst', 'titleType', 'primaryTitle', 'startYear', 'runtimeMinutes'),
+            ('tt1', 'movie', 'New Film', '2010', '101'),
+            # A second tconst for the same (title, year) is the same movie
+            ('tt2', 'movie', 'new film', '2010', '\\N'),
+            ('tt3', 'tvSeries', 'Some Show', '2011', '30'),
+            ('tt4', 'movie', 'Movie 0', '2000', '90'),
+        )
+        principals = self.tsv(
+            'title.principals.tsv',
+            ('tconst', 'nconst', 'category'),
+            ('tt1', 'nm1', 'actress'),
+            ('tt2', 'nm2', 'actress'),
+            ('tt1', 'nm3', 'director'),
+            ('tt1', 'nm5', 'composer'),
+            ('tt3', 'nm1', 'actress'),
+            ('tt4', 'nm4', 'actor'),
+        )
+        names = self.tsv(
+            'name.basics.tsv',
+            ('nconst', 'primaryName', 'birthYear'),
+            ('nm1', 'Jane Doe', '1980'),
+            ('nm2', 'Jane Doe', '1980'),
+            ('nm3', 'New Director', '\\N'),
+            ('nm4', 'Actor 1', '1971'),
+            ('nm5', 'Some Composer', '1950'),
+        )
+        movies, actors, credits = Movie.objects.count(), Actor.objects.count(), MovieActor.objects.count()
+        call_command(
+            'load_catalog', '--basics', basics, '--principals', principals, '--names', names, stdout=StringIO(),
+        )
+
+        new_film = Movie.objects.get(title='New Film')
+        self.assertEqual((new_film.release_year, new_film.runtime), (2010, '101'))
+        self.assertEqual(Movie.objects.count(), movies + 1)
+        # Both Jane Doe nconsts are one person, credited once
+        self.assertEqual(Actor.objects.count(), actors + 1)
+        self.assertEqual(
+            list(MovieActor.objects.filter(movie=new_film).values_list('actor__name', flat=True)), ['Jane Doe'],
+        )
+        self.assertEqual(
+            list(MovieDirector.objects.filter(movie=new_film).values_list('director__name', 'director__birth_year')),
+            [('New Director', None)],
+        )
+        # Actor 1 already played in Movie 0
+        self.assertEqual(MovieActor.objects.count(), credits + 1)
+
+
+@skipUnless(connection.vendor == 'postgresql', "wrapped_summary_mv only exists on PostgreSQL")
+@override_settings(WRAPPED_SUMMARY_BACKEND='materialized')
+class MaterializedSummaryTests(MovieAppTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # Created WITH NO DATA, as migration 0010 leaves it
+        normalized_credits = import_module('movie_app.migrations.0012_normalized_credits')
+        with connection.schema_editor() as schema_editor:
+            normalized_credits._create_summary_view(schema_editor, 'movie_actors', populate=False)
+
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(summary, '_snapshot_seen_populated', False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def lifetime_summary(self):
+        return self.client.get(reverse('api_wrapped_summary')).json()['summary']
+
+    def refresh(self):
+        call_command('refresh_wrapped_summaries', stdout=StringIO())
+
+    def test_reads_the_table_until_the_first_refresh(self):
+        self.add(self.movies[0], '2024-01-01', 8)
+        self.assertEqual(self.lifetime_summary()['total_movies_watched'], 1)
+
+    def test_snapshot_lags_writes_until_the_next_refresh(self):
+        self.add(self.movies[0], '2024-01-01', 8)
+        self.refresh()
+        self.add(self.movies[1], '2024-01-02', 6)
+        self.assertEqual(self.lifetime_summary()['total_movies_watched'], 1)
+        # Now populated, so this refresh runs CONCURRENTLY
+        self.refresh()
+        self.assertEqual(self.lifetime_summary(), {
+            'total_movies_watched': 2, 'avg_rating': 7.0, 'highest_rated_movie': 'Movie 0', 'top_actor': 'Actor 2',
+        })
+
+
+def importable(*modules):
+    try:
+        for module in modules:
+            import_module(module)
+    except ImportError:
+        return False
+    return True
+
+
+@skipUnless(importable('numpy', 'scipy'), "build_recommendations needs numpy and scipy")
+class RecommendationTests(MovieAppTestCase):
+    def setUp(self):
+        super().setUp()
+        self.entry(date(2024, 1, 1), 8, movie=self.movies[0])
+        self.entry(date(2024, 1, 2), 6, movie=self.movies[1])
+        create_profile(AuthUser.objects.create_user('bob'), date(1990, 1, 1))
+        for movie, rating in ((self.movies[0], 9), (self.movies[2], 8)):
+            WatchHistory.objects.create(user_id='bob', movie=movie, watch_date=date(2024, 1, 3), rating=rating)
+
+    def recommended(self, username):
+        return list(Recommendation.objects.filter(user_id=username).order_by('rank').values_list('movie_id', flat=True))
+
+    def test_recommends_only_unwatched_movies(self):
+        # From an earlier build, before alice watched it
+        Recommendation.objects.create(
+            user_id='alice', rank=1, movie=self.movies[0], score=1, built_at=timezone.now(),
+        )
+        call_command('build_recommendations', stdout=StringIO())
+        self.assertEqual(self.recommended('alice'), [self.movies[2].pk])
+        self.assertEqual(self.recommended('bob'), [self.movies[1].pk])
+
+    def test_dashboard_lists_recommendations(self):
+        call_command('build_recommendations', stdout=StringIO())
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.context['recommended'], [self.movies[2]])
+
+
+@skipUnless(connection.vendor == 'postgresql', "partition_watch_history needs PostgreSQL")
+class PartitioningTests(MovieAppTestCase):
+    """The whole conversion is DDL, which the test's transaction rolls back."""
+
+    def setUp(self):
+        super().setUp()
+        # Tables can't be altered while deferred foreign key checks are pending,
+        # which within one transaction they would be; outside tests each step
+        # runs in its own
+        with connection.cursor() as cursor:
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+
+    def partition(self, *args):
+        out = StringIO()
+        call_command('partition_watch_history', *args, stdout=out)
+        return out.getvalue()
+
+    def state(self):
+        with connection.cursor() as cursor:
+            return partitioning.state(cursor)
+
+    def test_prepare_backfill_and_swap_keep_every_row(self):
+        entries = [self.entry(date(2024, 1, day), movie=self.movies[day % 3]) for day in range(1, 6)]
+        self.partition('--prepare', '--partitions', '4', '--batch-size', '2')
+        self.assertEqual(self.state(), 'prepared')
+        # Writes while both tables exist are mirrored by the trigger
+        added = self.entry(date(2024, 2, 1), review='mirrored')
+        entries[0].review = 'edited'
+        entries[0].save()
+        entries[1].delete()
+
+        out = self.partition('--verify', '--swap')
+        self.assertIn("Both tables hold 5 rows.", out)
+        self.assertEqual(self.state(), 'partitioned')
+        with connection.cursor() as cursor:
+            self.assertEqual(partitioning.leaf_partitions(cursor), 4)
+        self.assertEqual(
+            sorted(WatchHistory.objects.filter(user_id='alice').values_list('watched_id', 'review')),
+            sorted([(entry.pk, 'edited' if entry is entries[0] else '') for entry in entries if entry is not entries[1]]
+                   + [(added.pk, 'mirrored')]),
+        )
+        # The sequence moved with the table
+        self.assertGreater(self.entry(date(2024, 3, 1)).pk, added.pk)
+        self.assertEqual(summary_state('alice'), rebuilt_state('alice'))
+
+    def test_rows_without_a_user_stop_the_swap(self):
+        self.entry(date(2024, 1, 1))
+        with connection.cursor() as cursor:
+            # The legacy table allows them; models.py does not
+            cursor.execute("ALTER TABLE watch_history ALTER user_id DROP NOT NULL")
+            cursor.execute(
+                "INSERT INTO watch_history (user_id, movie_id, watch_date, rating, review) "
+                "VALUES (NULL, %s, '2024-01-02', 5, '')",
+                [self.movies[0].pk],
+            )
+        self.partition('--prepare', '--partitions', '2')
+        with self.assertRaisesMessage(CommandError, "1 rows without a user_id"):
+            self.partition('--swap')
+        self.assertEqual(self.state(), 'prepared')
+        self.partition('--abort')
+        self.assertEqual(self.state(), 'unprepared')
+
+
+@override_settings(QUERY_BUDGET_MODE='raise', SUMMARY_UPDATES='inline')
+class QueryBudgetTests(MovieAppFixtures, TransactionTestCase):
+    """Every budgeted view, within its @query_budget, from cold caches.
+
+    A TransactionTestCase, so a view's outermost atomic block commits as it
+    does in production instead of adding savepoint queries.
+    """
+
+    def setUp(self):
+        self.create_fixtures()
+        add_search_vectors()
+        self.addCleanup(drop_search_vectors)
+        super().setUp()
+
+    def request(self, method, name, *args, data=None):
+        for cache in caches.all():
+            cache.clear()
+        response = getattr(self.client, method)(reverse(name, args=args), data or {})
+        self.assertLess(response.status_code, 400)
+        return response
+
+    def test_reads(self):
+        entry = self.entry(date(2024, 1, 1), movie=self.movies[1], review='quiet')
+        for name, data in [
+            ('dashboard', None), ('watch_history', None), ('watch_history', {'stream': 1}),
+            ('wrapped_summary', None), ('wrapped_summary', {'year': 2024}),
+            ('add_movie', None), ('add_movies', None),
+            ('movie_search', {'q': 'Movie'}), ('search', {'q': 'quiet'}),
+            ('api_watch_history', None), ('api_wrapped_summary', None), ('api_wrapped_summary', {'year': 2024}),
+            ('api_movie_search', {'q': 'Movie'}),
+        ]:
+            with self.subTest(view=name, data=data):
+                self.request('get', name, data=data)
+        self.request('get', 'edit_watch_entry', entry.pk)
+
+    def test_writes(self):
+        self.request('post', 'add_movie', data={
+            'movie': self.movies[0].pk, 'watch_date': '2024-01-05', 'rating': 8, 'review': '',
+        })
+        self.request('post', 'add_movies', data={
+            'form-TOTAL_FORMS': '2', 'form-INITIAL_FORMS': '0', 'form-MIN_NUM_FORMS': '1', 'form-MAX_NUM_FORMS': '100',
+            'form-0-movie': self.movies[1].pk, 'form-0-watch_date': '2024-02-01', 'form-0-rating': 6, 'form-0-review': '',
+            'form-1-movie': self.movies[2].pk, 'form-1-watch_date': '2024-03-01', 'form-1-rating': 9, 'form-1-review': '',
+        })
+        entry = WatchHistory.objects.get(movie=self.movies[0])
+        self.request('post', 'edit_watch_entry', entry.pk, data={
+            'movie': self.movies[2].pk, 'watch_date': '2023-12-31', 'rating': 9.5, 'review': 'moved',
+        })
+        self.request('post', 'edit_watch_entry', entry.pk, data={'delete': '1'})
+
+    def test_first_write_of_a_legacy_user_rebuilds(self):
+        self.entry(date(2024, 1, 1), movie=self.movies[1])
+        self.entry(date(2024, 2, 1), movie=self.movies[2])
+        WrappedSummary.objects.filter(user_id='alice').update(incremental_ready=False)
+        self.request('post', 'add_movie', data={
+            'movie': self.movies[0].pk, 'watch_date': '2024-03-05', 'rating': 8, 'review': '',
+        })
+        WrappedSummary.objects.filter(user_id='alice').update(incremental_ready=False)
+        self.request('post', 'add_movies', data={
+            'form-TOTAL_FORMS': '1', 'form-INITIAL_FORMS': '0', 'form-MIN_NUM_FORMS': '1', 'form-MAX_NUM_FORMS': '100',
+            'form-0-movie': self.movies[1].pk, 'form-0-watch_date': '2024-04-01', 'form-0-rating': 6, 'form-0-review': '',
+        })
+        entry = WatchHistory.objects.get(movie=self.movies[0])
+        WrappedSummary.objects.filter(user_id='alice').update(incremental_ready=False)
+        self.request('post', 'edit_watch_entry', entry.pk, data={
+            'movie': self.movies[2].pk, 'watch_date': '2023-12-31', 'rating': 9.5, 'review': 'moved',
+        })
+        WrappedSummary.objects.filter(user_id='alice').update(incremental_ready=False)
+        self.request('post', 'edit_watch_entry', entry.pk, data={'delete': '1'})
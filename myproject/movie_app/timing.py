@@ -0,0 +1,238 @@
+"""Per-request SQL and latency instrumentation.
+
+RequestTimingMiddleware measures each request: total time, the number of
+queries and the time spent in them, queries repeated with the same SQL and
+parameters, and template render time. The numbers go to the
+'movie_app.timing' logger as one key=value line per request and, with
+SERVER_TIMING on, to a Server-Timing response header that browser dev tools
+display.
+
+Queries are counted by an execute wrapper that apps.py installs on every
+database connection as it opens. The wrapper records into the request that
+is current in its context, so the count includes queries that async views
+run through sync_to_async on other threads. Render time comes from the
+TimedDjangoTemplates backend. For streamed responses, everything is measured
+up to the first byte.
+
+Views can declare the most queries they should need with @query_budget(n).
+QUERY_BUDGET_MODE decides what happens when a request goes over: 'off'
+ignores it, 'log' logs a warning and 'raise' raises QueryBudgetExceeded,
+which fails a test that requests the view. Queries run inside unbudgeted(),
+such as one-off per-process checks, are timed but not held against it.
+"""
+import logging
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.template.backends.django import DjangoTemplates, Template
+
+
+logger = logging.getLogger('movie_app.timing')
+
+_current = ContextVar('movie_app_request_timings', default=None)
+_unbudgeted = ContextVar('movie_app_unbudgeted', default=False)
+
+# Characters of the most repeated statement kept in the log line
+SQL_PREVIEW_LENGTH = 200
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class RequestTimings:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        # Queries run inside unbudgeted()
+        self.unbudgeted = 0
+        self.db_seconds = 0.0
+        self.render_seconds = 0.0
+        self.statements = Counter()
+        self.executions = Counter()
+
+    @property
+    def duplicates(self):
+        """Queries that repeated an earlier one exactly, parameters included."""
+        return sum(n - 1 for n in self.executions.values())
+
+    def most_repeated(self):
+        """The (sql, count) run most often with any parameters, if it ran more than once."""
+        if not self.statements:
+            return None, 0
+        sql, count = self.statements.most_common(1)[0]
+        return (sql, count) if count > 1 else (None, 0)
+
+
+def record_query(execute, sql, params, many, context):
+    """Execute wrapper that adds each query to the current request's timings."""
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        timings.db_seconds += time.perf_counter() - started
+        timings.queries += 1
+        timings.unbudgeted += _unbudgeted.get()
+        timings.statements[sql] += 1
+        timings.executions[(sql, repr(params))] += 1
+
+
+@contextmanager
+def unbudgeted():
+    """Leave the queries run inside out of the current view's @query_budget."""
+    token = _unbudgeted.set(True)
+    try:
+        yield
+    finally:
+        _unbudgeted.reset(token)
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """connection_created receiver: wrap the connection's queries with record_query()."""
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+class TimedTemplate(Template):
+    def render(self, context=None, request=None):
+        timings = _current.get()
+        if timings is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            timings.render_seconds += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend, with render time added to the request's timings.
+
+    Includes and extends render inside their parent template, so a page is
+    only counted once.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code).template, self)
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name).template, self)
+
+
+def query_budget(queries):
+    """Declare the most queries a view should need per request, middleware included.
+
+    Budgets assume cold caches and the costliest path through the view,
+    such as a legacy user's first write, which rebuilds their summary
+    (QueryBudgetTests measures each view). Checks a process makes once, such
+    as the sequence check before its first insert into a table
+    (movie_app.sequences) or the rating column type, do not count.
+    """
+    def decorator(view):
+        view.query_budget = queries
+        return view
+    return decorator
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2)
+
+
+def _server_timing(timings, total):
+    return ', '.join([
+        f'total;dur={_ms(total)}',
+        f'db;dur={_ms(timings.db_seconds)};desc="{timings.queries} queries, {timings.duplicates} duplicate"',
+        f'render;dur={_ms(timings.render_seconds)}',
+    ])
+
+
+def _check_budget(request, timings, fields):
+    match = request.resolver_match
+    budget = getattr(match.func, 'query_budget', None) if match else None
+    mode = settings.QUERY_BUDGET_MODE
+    if budget is None or mode == 'off':
+        return
+    fields['budget'] = budget
+    counted = timings.queries - timings.unbudgeted
+    if counted <= budget:
+        return
+    sql, count = timings.most_repeated()
+    message = f'{match.view_name} ran {counted} queries, over its budget of {budget}'
+    if sql:
+        message += f'; ran {count} times: {sql[:SQL_PREVIEW_LENGTH]}'
+    if mode == 'raise':
+        raise QueryBudgetExceeded(message)
+    logger.warning(message, extra={'timing': fields})
+
+
+def _finish(request, response, timings):
+    total = time.perf_counter() - timings.started
+    match = request.resolver_match
+    fields = {
+        'method': request.method,
+        'path': request.path,
+        'view': match.view_name if match else None,
+        'status': response.status_code,
+        'total_ms': _ms(total),
+        'db_ms': _ms(timings.db_seconds),
+        'queries': timings.queries,
+        'duplicates': timings.duplicates,
+        'render_ms': _ms(timings.render_seconds),
+    }
+    if settings.SERVER_TIMING:
+        existing = response.headers.get('Server-Timing')
+        header = _server_timing(timings, total)
+        response.headers['Server-Timing'] = f'{existing}, {header}' if existing else header
+    _check_budget(request, timings, fields)
+    sql, count = timings.most_repeated()
+    if sql:
+        fields['most_repeated'] = count
+        fields['most_repeated_sql'] = sql[:SQL_PREVIEW_LENGTH]
+    logger.info(
+        ' '.join(f'{key}={value}' for key, value in fields.items() if key != 'most_repeated_sql'),
+        extra={'timing': fields},
+    )
+    return response
+
+
+class RequestTimingMiddleware:
+    """Time each request; list it first in MIDDLEWARE so it sees every query.
+
+    The RequestTimings are also left on request.timings, e.g. for
+    `manage.py benchmark_views`.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        request.timings = timings = RequestTimings()
+        token = _current.set(timings)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return _finish(request, response, timings)
+
+    async def __acall__(self, request):
+        request.timings = timings = RequestTimings()
+        token = _current.set(timings)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return _finish(request, response, timings)
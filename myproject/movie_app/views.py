@@ -1,63 +1,32 @@
+import asyncio
+
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.models import User
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Count, Avg
-from django.http import HttpResponse
-from datetime import date
-from decimal import Decimal
-from .models import WatchHistory, Movie, WrappedSummary, User as CustomUser, Actor
-from .forms import UserRegistrationForm, UserLoginForm, AddMovieForm
-
-
-def _recompute_wrapped_summary_for_user(custom_user):
-    """Recompute and persist WrappedSummary values for a given CustomUser."""
-    if not custom_user:
-        return
-    user_id = custom_user.user_id
-    # gather watch history
-    wh_qs = WatchHistory.objects.filter(user__user_id=user_id)
-    
-    avg = wh_qs.aggregate(Avg('rating'))['rating__avg']
-    avg_val = Decimal(round(avg, 2)) if avg is not None else None
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.template.loader import render_to_string
+from .models import WatchHistory, Movie, User as CustomUser
+from .forms import UserRegistrationForm, UserLoginForm, AddMovieForm, AddMoviesFormSet
+from . import rollups
+from .catalog import get_movie
+from .dashboard import aget_dashboard_data
+from .fulltext import highlight, search_movie_text, search_reviews
+from .fragments import ahistory_version
+from .identity import create_profile, profile_ref
+from .search import search_movies
+from .history import ahas_entries, ahistory_page, aiter_history_chunks, atotal_watched, iter_history_chunks
+from .sequences import ensure_sequences
+from .signals import entries_added
+from .timing import query_budget
+from .summary import aget_wrapped_summary, stored_rating
 
-    if wh_qs.exists():
-        top = wh_qs.order_by('-rating', '-watch_date').first()
-        top_title = top.movie.title if top else None
-        total_count = wh_qs.count()
-        
-        # Calculate top actor - find the actor that appears most in user's watched movies
-        top_actor_obj = (
-            Actor.objects
-            .filter(castcrew__movie__watchhistory__user__user_id=user_id)
-            .annotate(appearance_count=Count('castcrew'))
-            .order_by('-appearance_count')
-            .first()
-        )
-        top_actor = top_actor_obj.name if top_actor_obj else 'N/A'
-    else:
-        top_title = None
-        total_count = 0
-        top_actor = 'N/A'
-
-    # Try to get existing row, if not found create
-    try:
-        wrapped = WrappedSummary.objects.get(user=custom_user)
-        wrapped.avg_rating = avg_val
-        wrapped.highest_rated_movie = top_title
-        wrapped.total_movies_watched = total_count
-        wrapped.top_actor = top_actor
-        wrapped.save()
-    except WrappedSummary.DoesNotExist:
-        # Only create if doesn't exist
-        WrappedSummary.objects.create(
-            user=custom_user,
-            top_actor=top_actor,
-            total_movies_watched=total_count,
-            avg_rating=avg_val,
-            highest_rated_movie=top_title,
-        )
+# Placeholder the streaming mode of watch_history.html leaves inside <tbody>
+ROWS_MARKER = '<!--watch-history-rows-->'
 
 
 def index(request):
@@ -91,25 +60,10 @@ def register_view(request):
         if form.is_valid():
             user = form.save(commit=False)
             user.set_password(form.cleaned_data['password'])
-            user.save()
-            
-            # Create corresponding CustomUser entry
-            custom_user = CustomUser.objects.create(
-                user_id=user.username,
-                name=user.first_name or user.username,
-                birthday=form.cleaned_data['birthday'],
-                password=form.cleaned_data['password'],
-                profile_picture=''
-            )
-            
-            # Create default WrappedSummary entry with null/NA/0 values
-            WrappedSummary.objects.create(
-                user=custom_user,
-                top_actor='N/A',
-                total_movies_watched=0,
-                avg_rating=None,
-                highest_rated_movie=None
-            )
+            with transaction.atomic():
+                user.save()
+                # The profile row watch history points at, plus an empty summary
+                create_profile(user, form.cleaned_data['birthday'])
             
             messages.success(request, "Account created successfully! Please log in.")
             return redirect('login')
@@ -131,49 +85,86 @@ def logout_view(request):
     return redirect('login')
 
 
+def _arender(request, user, template_name, context):
+    """render() for async views.
+
+    Templates read {{ user }}; request.user would load it with a blocking
+    query, so hand them the user the view already awaited instead.
+    """
+    request.user = user
+    return render(request, template_name, context)
+
+
+@query_budget(10)
 @login_required(login_url='login')
-def dashboard(request):
+async def dashboard(request):
     """User dashboard"""
-    try:
-        custom_user = CustomUser.objects.get(user_id=request.user.username)
-    except CustomUser.DoesNotExist:
-        custom_user = None
-    
-    watch_history = WatchHistory.objects.filter(
-        user__user_id=request.user.username
-    ).order_by('-watch_date')[:5]  # Latest 5
-    
-    watch_count = WatchHistory.objects.filter(
-        user__user_id=request.user.username
-    ).count()
-    
-    avg_rating = WatchHistory.objects.filter(
-        user__user_id=request.user.username
-    ).aggregate(Avg('rating'))['rating__avg']
-    
-    context = {
-        'custom_user': custom_user,
-        'watch_history': watch_history,
-        'watch_count': watch_count or 0,
-        'avg_rating': round(avg_rating, 2) if avg_rating else 0,
-    }
-    return render(request, 'dashboard.html', context)
+    user = await request.auser()
+    context = await aget_dashboard_data(user.username)
+    return _arender(request, user, 'dashboard.html', context)
 
 
+@query_budget(6)
 @login_required(login_url='login')
-def watch_history(request):
-    """View full watch history"""
-    watch_history = WatchHistory.objects.filter(
-        user__user_id=request.user.username
-    ).order_by('-watch_date')
+async def watch_history(request):
+    """View full watch history, one keyset page at a time"""
+    user = await request.auser()
+    username = user.username
+    if request.GET.get('stream'):
+        request.user = user
+        total, has_entries = await asyncio.gather(atotal_watched(username), ahas_entries(username))
+        return _stream_watch_history(request, username, total, has_entries)
+
+    cursor = request.GET.get('cursor')
+    (entries, next_cursor), total, version = await asyncio.gather(
+        ahistory_page(username, cursor),
+        atotal_watched(username),
+        ahistory_version(username),
+    )
     
     context = {
-        'watch_history': watch_history,
-        'total_watched': watch_history.count(),
+        'watch_history': entries,
+        'total_watched': total,
+        'has_entries': bool(entries) or bool(cursor),
+        'cursor': cursor,
+        'next_cursor': next_cursor,
+        # Key for the cached rows fragment
+        'history_version': version,
+        'fragment_cache_timeout': settings.FRAGMENT_CACHE_TIMEOUT,
     }
-    return render(request, 'watch_history.html', context)
+    return _arender(request, user, 'watch_history.html', context)
+
+
+def _stream_watch_history(request, username, total, has_entries):
+    """Stream the whole history, rendering rows a chunk at a time"""
+    context = {'total_watched': total, 'has_entries': has_entries, 'streaming': True}
+    page = render_to_string('watch_history.html', context, request=request)
+    head, marker, tail = page.partition(ROWS_MARKER)
+
+    def render_chunk(chunk):
+        return render_to_string('watch_history_rows.html', {'watch_history': chunk}, request=request)
+
+    # Each server only streams its own kind of iterator; given the other,
+    # Django buffers the whole response first
+    if isinstance(request, ASGIRequest):
+        async def generate():
+            yield head
+            if marker:
+                async for chunk in aiter_history_chunks(username):
+                    yield render_chunk(chunk)
+            yield tail
+    else:
+        def generate():
+            yield head
+            if marker:
+                for chunk in iter_history_chunks(username):
+                    yield render_chunk(chunk)
+            yield tail
+
+    return StreamingHttpResponse(generate(), content_type='text/html; charset=utf-8')
 
 
+@query_budget(30)
 @login_required(login_url='login')
 def add_movie(request):
     """Add a movie to watch history"""
@@ -185,27 +176,17 @@ def add_movie(request):
             review = form.cleaned_data['review']
             watch_date = form.cleaned_data['watch_date']
 
-            # Get or create the custom user
-            custom_user, created = CustomUser.objects.get_or_create(
-                user_id=request.user.username,
-                defaults={
-                    'name': request.user.first_name or request.user.username,
-                    'birthday': date(2000, 1, 1),
-                    'password': 'temp',
-                    'profile_picture': ''
-                }
-            )
-
-            WatchHistory.objects.create(
-                user=custom_user,
-                movie=movie,
-                watch_date=watch_date,
-                rating=rating,
-                review=review
-            )
-            
-            # Recompute user's wrapped summary after adding an entry
-            _recompute_wrapped_summary_for_user(custom_user)
+            custom_user = profile_ref(request.user)
+
+            # The post_save receiver folds the entry into the user's summaries
+            with transaction.atomic():
+                WatchHistory.objects.create(
+                    user=custom_user,
+                    movie=movie,
+                    watch_date=watch_date,
+                    rating=rating,
+                    review=review
+                )
 
             messages.success(request, f"Added '{movie.title}' to your watch history!")
             return redirect('watch_history')
@@ -216,26 +197,82 @@ def add_movie(request):
     return render(request, 'add_movie.html', context)
 
 
+@query_budget(29)
+@login_required(login_url='login')
+def add_movies(request):
+    """Add several movies to watch history in one request"""
+    if request.method == 'POST':
+        formset = AddMoviesFormSet(request.POST)
+        if formset.is_valid():
+            custom_user = profile_ref(request.user)
+            entries = [
+                WatchHistory(
+                    user=custom_user,
+                    movie=form.cleaned_data['movie'],
+                    watch_date=form.cleaned_data['watch_date'],
+                    # bulk_create sends no pre_save, which rounds ratings as stored
+                    rating=stored_rating(form.cleaned_data['rating']),
+                    review=form.cleaned_data['review']
+                )
+                for form in formset if form.has_changed()
+            ]
+
+            with transaction.atomic():
+                # bulk_create sends no pre_save, so run the sequence guard here
+                ensure_sequences(WatchHistory, entries[0])
+                WatchHistory.objects.bulk_create(entries)
+                # One summary update and one cache invalidation for the batch
+                entries_added(custom_user.user_id, entries)
+
+            messages.success(request, f"Added {len(entries)} movies to your watch history!")
+            return redirect('watch_history')
+    else:
+        formset = AddMoviesFormSet()
+
+    context = {'formset': formset}
+    return render(request, 'add_movies.html', context)
+
+
+@query_budget(4)
+@login_required(login_url='login')
+def movie_search(request):
+    """JSON autocomplete endpoint for the movie picker"""
+    results = search_movies(request.GET.get('q', ''))
+    return JsonResponse({'results': results})
+
+
+@query_budget(6)
+@login_required(login_url='login')
+def search(request):
+    """Ranked full-text search over movie titles and plots, and the user's own reviews"""
+    query = request.GET.get('q', '').strip()
+    movies = [dict(movie, snippet=highlight(movie['snippet'])) for movie in search_movie_text(query)]
+    reviews = search_reviews(request.user.username, query)
+    for entry in reviews:
+        entry.snippet = highlight(entry.snippet)
+    return render(request, 'search.html', {'query': query, 'movies': movies, 'reviews': reviews})
+
+
+@query_budget(43)
 @login_required(login_url='login')
 def edit_watch_entry(request, entry_id):
     """Edit a watch history entry"""
-    watch_entry = get_object_or_404(WatchHistory, watched_id=entry_id, user__user_id=request.user.username)
+    watch_entry = get_object_or_404(WatchHistory, watched_id=entry_id, user_id=request.user.username)
     
     if request.method == 'POST':
         if 'delete' in request.POST:
-            movie_title = watch_entry.movie.title
-            custom_user = watch_entry.user
-            watch_entry.delete()
-            # Recompute summary after deletion
-            _recompute_wrapped_summary_for_user(custom_user)
+            movie_title = get_movie(watch_entry.movie_id).title
+            # The post_delete receiver removes the entry from the summaries
+            with transaction.atomic():
+                watch_entry.delete()
             messages.success(request, f"Deleted '{movie_title}' from your watch history!")
             return redirect('watch_history')
         else:
             form = AddMovieForm(request.POST, instance=watch_entry)
             if form.is_valid():
-                form.save()
-                # Recompute summary after edit
-                _recompute_wrapped_summary_for_user(watch_entry.user)
+                # The post_save receiver applies the edit to the summaries
+                with transaction.atomic():
+                    form.save()
                 messages.success(request, f"Updated watch history entry!")
                 return redirect('watch_history')
     else:
@@ -245,25 +282,30 @@ def edit_watch_entry(request, entry_id):
     return render(request, 'edit_watch_entry.html', context)
 
 
+@query_budget(10)
 @login_required(login_url='login')
-def wrapped_summary(request):
-    """Display user's movie wrapped summary"""
-    try:
-        custom_user = CustomUser.objects.get(user_id=request.user.username)
-        wrapped = WrappedSummary.objects.get(user=custom_user)
-    except (CustomUser.DoesNotExist, WrappedSummary.DoesNotExist):
-        return render(request, 'wrapped_summary.html', {'no_data': True, 'user_name': request.user.first_name or request.user.username})
-    
-    # Check if user has watch history
-    watch_history = WatchHistory.objects.filter(user__user_id=request.user.username)
+async def wrapped_summary(request):
+    """Display user's movie wrapped summary, lifetime or for one ?year="""
+    user = await request.auser()
+    user_name = user.first_name or user.username
+    year = rollups.parse_year(request.GET.get('year'))
+    if year is not None:
+        return await _wrapped_for_year(request, user, user_name, year)
+    # One indexed lookup, against either the maintained summary table or the
+    # materialized view, depending on WRAPPED_SUMMARY_BACKEND
+    wrapped, version, years = await asyncio.gather(
+        aget_wrapped_summary(user.username),
+        ahistory_version(user.username),
+        rollups.aactive_years(user.username),
+    )
     
-    if not watch_history.exists():
+    if wrapped is None or not wrapped.total_movies_watched:
         context = {
             'no_data': True,
-            'user_name': request.user.first_name or request.user.username,
+            'user_name': user_name,
         }
     else:
-        # Use persisted values from WrappedSummary
+        # Use persisted values from the summary
         total_movies = wrapped.total_movies_watched or 0
         avg_rating = float(wrapped.avg_rating) if wrapped.avg_rating else 0
         top_movie_title = wrapped.highest_rated_movie or "N/A"
@@ -275,7 +317,33 @@ def wrapped_summary(request):
             'avg_rating': round(avg_rating, 2) if avg_rating else 0,
             'top_movie': top_movie_title,
             'top_actor': top_actor,
-            'user_name': request.user.first_name or request.user.username,
+            'user_name': user_name,
+            'years': years,
+            'history_version': version,
+            'fragment_cache_timeout': settings.FRAGMENT_CACHE_TIMEOUT,
         }
     
-    return render(request, 'wrapped_summary.html', context)
\ No newline at end of file
+    return _arender(request, user, 'wrapped_summary.html', context)
+
+
+async def _wrapped_for_year(request, user, user_name, year):
+    """One calendar year, added up from at most 12 monthly rollups"""
+    summary, version, years = await asyncio.gather(
+        rollups.awindow_summary(user.username, *rollups.year_window(year)),
+        ahistory_version(user.username),
+        rollups.aactive_years(user.username),
+    )
+    context = {'user_name': user_name, 'year': year, 'years': years}
+    if summary is None:
+        context['no_data'] = True
+    else:
+        context.update({
+            'total_movies': summary['total_movies_watched'],
+            'avg_rating': summary['avg_rating'],
+            'top_movie': summary['highest_rated_movie'] or "N/A",
+            'top_actor': summary['top_actor'],
+            'top_director': summary['top_director'],
+            'history_version': version,
+            'fragment_cache_timeout': settings.FRAGMENT_CACHE_TIMEOUT,
+        })
+    return _arender(request, user, 'wrapped_summary.html', context)
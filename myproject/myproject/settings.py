@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 from decouple import config
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -42,6 +43,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so its query count and timings cover the whole request
+    'movie_app.timing.RequestTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -55,15 +58,23 @@ ROOT_URLCONF = 'myproject.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates, plus render time for the request timings
+        'BACKEND': 'movie_app.timing.TimedDjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # Compile each template once per process; in DEBUG the autoreloader
+            # still clears the cache when a template file changes
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
@@ -82,8 +93,159 @@ DATABASES = {
         'PASSWORD': config('DB_PASSWORD'),
         'HOST': config('DB_HOST'),
         'PORT': config('DB_PORT'),
+        # Reuse a connection across requests for this many seconds instead of
+        # reconnecting (TCP + auth) every time; health checks drop dead ones.
+        # Under ASGI set it to 0 and use DB_POOL=psycopg, since async requests
+        # do not run on long-lived threads that could keep a connection.
+        'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=60, cast=int),
+        'CONN_HEALTH_CHECKS': config('DB_CONN_HEALTH_CHECKS', default=True, cast=bool),
+        # The legacy tables come from DB_Final_Movie_Analysis.sql rather than
+        # migrations, so the test database is created from models.py instead
+        'TEST': {'MIGRATE': False},
+    }
+}
+
+# Connection pooling (PostgreSQL only):
+#   DB_POOL=psycopg    Django's in-process pool; needs psycopg 3
+#                      (pip install "psycopg[binary,pool]")
+#   DB_POOL=pgbouncer  connect through a transaction-mode pooler such as
+#                      pgbouncer; server-side cursors are turned off because
+#                      they cannot outlive the pooler's transaction
+DB_POOL = config('DB_POOL', default='')
+if DB_POOL == 'psycopg':
+    # The pool owns connection lifetime; Django refuses CONN_MAX_AGE with it
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': config('DB_POOL_MIN_SIZE', default=2, cast=int),
+            'max_size': config('DB_POOL_MAX_SIZE', default=10, cast=int),
+            'timeout': config('DB_POOL_TIMEOUT', default=10, cast=float),
+        },
+    }
+elif DB_POOL == 'pgbouncer':
+    DATABASES['default']['DISABLE_SERVER_SIDE_CURSORS'] = True
+elif DB_POOL:
+    raise ImproperlyConfigured(f"Unknown DB_POOL {DB_POOL!r}; use 'psycopg' or 'pgbouncer'.")
+
+# Caching
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+# The default cache holds state every process must agree on: the per-user
+# history versions behind cached fragment keys (movie_app.fragments), the
+# dashboard data (movie_app.dashboard) and which profiles exist
+# (movie_app.identity). A write bumps or drops them only in the cache it can
+# see, so with the in-process LocMemCache any other worker keeps serving what
+# it had. LocMemCache is therefore only fit for a single process; before
+# running more than one web worker, point CACHE_BACKEND at Redis or Memcached
+# (or FileBasedCache on a single host). WEB_CONCURRENCY, which gunicorn reads
+# as its worker count, is refused above 1 with LocMemCache.
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CACHE_LOCATION', default='movie-app'),
+    },
+    # Movies, actors and directors looked up by id (movie_app.catalog). The
+    # default is an in-process cache that evicts least recently used entries
+    # past MAX_ENTRIES; point it at FileBasedCache or a local Redis (configured
+    # with maxmemory-policy allkeys-lru) to share it between processes.
+    'catalog': {
+        'BACKEND': config('CATALOG_CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': config('CATALOG_CACHE_LOCATION', default='movie-catalog'),
+        'TIMEOUT': config('CATALOG_CACHE_TIMEOUT', default=86400, cast=int),
+    },
+}
+WEB_CONCURRENCY = config('WEB_CONCURRENCY', default=1, cast=int)
+if WEB_CONCURRENCY > 1 and CACHES['default']['BACKEND'].endswith('.LocMemCache'):
+    raise ImproperlyConfigured(
+        f"WEB_CONCURRENCY is {WEB_CONCURRENCY} but the default cache is per-process LocMemCache; "
+        "set CACHE_BACKEND to a cache the workers share."
+    )
+if 'redis' not in CACHES['catalog']['BACKEND']:
+    CACHES['catalog']['OPTIONS'] = {
+        'MAX_ENTRIES': config('CATALOG_CACHE_MAX_ENTRIES', default=50000, cast=int),
     }
+
+# Seconds a user's dashboard data stays cached; writes invalidate it early
+DASHBOARD_CACHE_TIMEOUT = config('DASHBOARD_CACHE_TIMEOUT', default=300, cast=int)
+
+# Seconds a rendered fragment (history rows, Wrapped card) stays cached;
+# writes to a user's watch history make their fragments unreachable sooner
+FRAGMENT_CACHE_TIMEOUT = config('FRAGMENT_CACHE_TIMEOUT', default=3600, cast=int)
+
+# Watch history keyset page size, and rows rendered per chunk in ?stream=1 mode
+WATCH_HISTORY_PAGE_SIZE = config('WATCH_HISTORY_PAGE_SIZE', default=50, cast=int)
+WATCH_HISTORY_STREAM_CHUNK_SIZE = config('WATCH_HISTORY_STREAM_CHUNK_SIZE', default=500, cast=int)
+
+# Most watch history entries the add-movies batch form accepts per request
+WATCH_BATCH_MAX_ENTRIES = config('WATCH_BATCH_MAX_ENTRIES', default=100, cast=int)
+
+# Largest ?page_size= the JSON API's watch history endpoint accepts
+API_MAX_PAGE_SIZE = config('API_MAX_PAGE_SIZE', default=200, cast=int)
+
+# Movie picker autocomplete: max results per query and seconds results stay cached
+MOVIE_SEARCH_LIMIT = config('MOVIE_SEARCH_LIMIT', default=10, cast=int)
+MOVIE_SEARCH_CACHE_TIMEOUT = config('MOVIE_SEARCH_CACHE_TIMEOUT', default=600, cast=int)
+
+# Full-text search page: matches ranked per query; beyond this many, the rest
+# are dropped unranked so very common terms stay fast
+FULLTEXT_MAX_CANDIDATES = config('FULLTEXT_MAX_CANDIDATES', default=1000, cast=int)
+
+# Admin changelists of big tables show Postgres' row estimate instead of an
+# exact COUNT(*) once the estimate reaches this many rows
+ADMIN_ESTIMATED_COUNT_THRESHOLD = config('ADMIN_ESTIMATED_COUNT_THRESHOLD', default=100000, cast=int)
+
+# Opt-in partitioning of watch_history (movie_app.partitioning): hash
+# partitions on user_id, 0 to leave the table alone, and whether each is split
+# again by watch_date year. Migration 0019 prepares the partitioned table;
+# `manage.py partition_watch_history` backfills it and swaps it in
+WATCH_HISTORY_PARTITIONS = config('WATCH_HISTORY_PARTITIONS', default=0, cast=int)
+WATCH_HISTORY_PARTITION_BY_YEAR = config('WATCH_HISTORY_PARTITION_BY_YEAR', default=False, cast=bool)
+
+# Where the Wrapped page reads from: 'incremental' (the wrapped_summary table,
+# maintained on every write) or 'materialized' (the wrapped_summary_mv view,
+# refreshed by `manage.py refresh_wrapped_summaries`)
+WRAPPED_SUMMARY_BACKEND = config('WRAPPED_SUMMARY_BACKEND', default='incremental')
+
+# How watch history writes reach wrapped_summary: 'inline' applies the change
+# inside the request, 'queue' only enqueues a SummaryJob for
+# `manage.py run_summary_worker`
+SUMMARY_UPDATES = config('SUMMARY_UPDATES', default='inline')
+# Seconds before a claimed job is considered abandoned, and failures allowed per job
+SUMMARY_JOB_CLAIM_TIMEOUT = config('SUMMARY_JOB_CLAIM_TIMEOUT', default=300, cast=int)
+SUMMARY_JOB_MAX_ATTEMPTS = config('SUMMARY_JOB_MAX_ATTEMPTS', default=5, cast=int)
+
+# Request timings (movie_app.timing): add a Server-Timing header to every
+# response, and what to do when a view runs more queries than its
+# @query_budget: 'off', 'log' (a warning) or 'raise' (QueryBudgetExceeded,
+# which fails the test that made the request)
+SERVER_TIMING = config('SERVER_TIMING', default=DEBUG, cast=bool)
+QUERY_BUDGET_MODE = config('QUERY_BUDGET_MODE', default='log')
+if QUERY_BUDGET_MODE not in ('off', 'log', 'raise'):
+    raise ImproperlyConfigured(f"Unknown QUERY_BUDGET_MODE {QUERY_BUDGET_MODE!r}; use 'off', 'log' or 'raise'.")
+
+# One key=value line per request from movie_app.timing; set
+# REQUEST_LOG_LEVEL=WARNING to keep only the over-budget warnings
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'movie_app.timing': {
+            'handlers': ['console'],
+            'level': config('REQUEST_LOG_LEVEL', default='INFO'),
+            'propagate': False,
+        },
+        # Summary worker progress and failed jobs
+        'movie_app.jobs': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+    },
 }
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
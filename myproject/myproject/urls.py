@@ -16,7 +16,7 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path
-from movie_app import views
+from movie_app import api, views
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -27,6 +27,12 @@ urlpatterns = [
     path('register/', views.register_view, name='register'),
     path('watch-history/', views.watch_history, name='watch_history'),
     path('add-movie/', views.add_movie, name='add_movie'),
+    path('add-movies/', views.add_movies, name='add_movies'),
+    path('movies/search/', views.movie_search, name='movie_search'),
+    path('search/', views.search, name='search'),
     path('edit-entry/<int:entry_id>/', views.edit_watch_entry, name='edit_watch_entry'),
     path('wrapped/', views.wrapped_summary, name='wrapped_summary'),
+    path('api/v1/history/', api.watch_history, name='api_watch_history'),
+    path('api/v1/wrapped/', api.wrapped_summary, name='api_wrapped_summary'),
+    path('api/v1/movies/search/', api.movie_search, name='api_movie_search'),
 ]